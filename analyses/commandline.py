@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+# cppstats is a suite of analyses for measuring C preprocessor-based
+# variability in software product lines.
+# Copyright (C) 2014-2015 University of Passau, Germany
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+'''
+The command-line options of the analyses. The analysis modules build their
+grammars when they are imported, so their options are kept here, where they
+can be added to the command line (e.g., for --help) without importing the
+analyses; cppstats/analysis.py imports an analysis only when it is run.
+'''
+
+
+##################################################
+# output files named in the options
+
+disciplinePerFileOutputFile = "cppstats_discipline_files.csv"
+interactionKwayOutputFile = "cppstats_interaction_kway.csv"
+
+
+##################################################
+# options of the analyses
+
+def addProgressOptions(optionparser):
+    optionparser.add_argument("--progressInterval", type=float, dest="progressInterval", default=None, metavar="SECONDS",
+                              help="report the progress of each preparation and analysis every SECONDS\n"
+                                   "[default: 0.5 on a terminal, 10 otherwise; 0=no progress reports]\n"
+                                   "(if the output is no terminal, the reports are PROGRESS lines of key=value pairs)")
+
+
+def addFilenameOptions(optionparser):
+    # constants for the choices of '--filenames' are added in method 'addFilenameConstants'
+    optionparser.add_argument("--filenames", type=int, choices=[0, 1], dest="filenames", default=0,
+                              help="determines the file paths to print [default: %(default)s]\n"
+                                   "(0=paths to srcML files, 1=paths to source files)")
+    optionparser.add_argument("--filenamesRelative", action="store_true", dest="filenamesRelative", default=False,
+                              help="print relative file names [default: %(default)s]\n"
+                                   "e.g., '/projects/apache/_cppstats/afile.c.xml' becomes 'afile.c.xml'.")
+
+
+def addFilenameConstants(options):
+    # --filenames
+    options.FILENAME_SRCML = 0
+    options.FILENAME_SOURCE = 1
+
+
+def addAccountingOptions(optionparser):
+    # budgets and report of the files of an analysis (see lib/accounting.py)
+    optionparser.add_argument("--fileCpuBudget", type=float, dest="fileCpuBudget", metavar="SECONDS", default=0,
+                              help="skip files whose analysis takes more than SECONDS of CPU time and list them\n"
+                                   "in cppstats_skipped.json of the project (0 = no budget) [default: %(default)s]")
+    optionparser.add_argument("--fileMemoryBudget", type=float, dest="fileMemoryBudget", metavar="MB", default=0,
+                              help="skip files whose analysis grows the memory by more than MB megabytes\n"
+                                   "(0 = no budget) [default: %(default)s]\n"
+                                   "Both budgets measure the whole process and are checked at the end of each stage\n"
+                                   "of a file; no results of a skipped file are kept.")
+    optionparser.add_argument("--fileReport", type=int, dest="fileReport", metavar="N", default=5,
+                              help="print the N slowest and largest files of each analysis with their longest stages\n"
+                                   "(0 = no report) [default: %(default)s]")
+
+
+def addGeneralOptions(optionparser):
+    # TODO implement CSP solving?
+    # optionparser.add_option("--csp", dest="csp", action="store_true",
+    # default=False, help="make use of csp solver to check " \
+    # "feature expression equality [default=False]")
+    # optionparser.add_option("--str", dest="str", action="store_true",
+    #     default=True, help="make use of simple string comparision " \
+    #     "for checking feature expression equality [default=True]")
+    pass
+
+
+def addGeneralValuesOptions(optionparser):
+    # TODO implement CSP solving?
+    # optionparser.add_option("--csp", dest="csp", action="store_true",
+    # default=False, help="make use of csp solver to check " \
+    # "feature expression equality [default=False]")
+    # optionparser.add_option("--str", dest="str", action="store_true",
+    #     default=True, help="make use of simple string comparision " \
+    #     "for checking feature expression equality [default=True]")
+    optionparser.add_argument("--norewriteifdefs", dest="rewriteifdefs",
+                              action="store_false", default=True,
+                              help="rewrite nested #ifdefs and #elifs as a conjunction of "
+                                   "inner and outer expressions [default=%(default)s]\n"
+                                   "(exception are #else tags, which ARE rewritten as "
+                                   "negation of the #if branch! see also --norewriteelse "
+                                   "of analysis GENERALVALUES)")
+    #FIXME add command line function to remove #else too!
+
+
+def addDisciplineOptions(optionparser):
+    optionparser.description = 'This analysis counts the number of the disciplined CPP usage in software projects. \n' \
+            'To this end, it checks xml representations of header and source ' \
+            'files and returns the number of disciplined ifdefs in those. \n'
+            # TODO what are the disciplined ones
+            #'Disciplined annotations are:'
+
+    optionparser.add_argument('-l', '--log', dest='log', action="store_true",
+            default=True, help='log to stdout [default=%(default)s]')
+    optionparser.add_argument('-v', '--verbose', dest='verbose', action="store_true",
+            default=False, help='verbose output [default=%(default)s]')
+    optionparser.add_argument('--check', dest='check', type=int,
+            default=1, help='CHECK sets the patterns that are checked [default=%(default)s].\n'
+            'Supply sum of wanted patterns:\n'
+            '(1) check top level siblings (compilation unit) \n'
+            '(2) check sibling (excludes check top level siblings; NOT CLASSIFIED) \n'
+            '(4) check if-then enframement (wrapper) \n'
+            '(8) check case enframement (conditional) \n'
+            '(16) check else-if enframement (conditional) \n'
+            '(32) check param/argument enframement (parameter) \n'
+            '(64) check expression enframement (expression) \n'
+            '(128) check else enframement (NOT CLASSIFIED) \n'
+    )
+    optionparser.add_argument('--dall', dest='disc_all', action="store_true",
+                              default=True, help='check all patterns [default=%(default)s] \n(overrides --check)')
+    optionparser.add_argument('--disciplineJobs', dest='disc_jobs', type=int,
+            default=1, help='number of worker processes checking files in parallel [default=%(default)s]')
+    optionparser.add_argument('--perfile', dest='disc_perfile', action="store_true",
+            default=False, help='additionally write one result row per file to \n'
+            '\'' + disciplinePerFileOutputFile + '\' [default=%(default)s]')
+
+
+def addFeatureLocationsOptions(optionparser):
+    pass
+
+
+def addDerivativeOptions(optionparser):
+    # TODO implement CSP solving?
+    # optionparser.add_argument("--csp", dest="csp", action="store_true",
+    #         default=False, help="make use of csp solver to check " \
+    #         "feature expression equality  [default: %(default)s]")
+    # optionparser.add_argument("--str", dest="str", action="store_true",
+    #         default=True, help="make use of simple string comparision " \
+    #         "for checking feature expression equality  [default: %(default)s]")
+    pass
+
+
+def addInteractionOptions(optionparser):
+    # TODO implement CSP solving?
+    # optionparser.add_argument("--csp", dest="csp", action="store_true",
+    #         default=False, help="make use of csp solver to check " \
+    #         "feature expression equality [default=False]")
+    # optionparser.add_argument("--str", dest="str", action="store_true",
+    #         default=True, help="make use of simple string comparision " \
+    #         "for checking feature expression equality [default=True]")
+    optionparser.add_argument("--kway", dest="interaction_kway", action="store_true",
+            default=False, help="additionally mine all combinations of features (of any size k)\n"
+            "used together in annotations; written to '" + interactionKwayOutputFile + "' [default=%(default)s]")
+    optionparser.add_argument("--minsupport", dest="interaction_minsupport", type=int,
+            default=2, help="minimum number of annotations a combination of features\n"
+            "has to occur in to be reported by --kway [default=%(default)s]")
+    optionparser.add_argument("--maxk", dest="interaction_maxk", type=int,
+            default=0, help="maximum size of combinations reported by --kway\n"
+            "(0=unlimited) [default=%(default)s]")
@@ -31,6 +31,7 @@ import re
 import sys
 import xmlrpclib
 from argparse import ArgumentParser, RawTextHelpFormatter
+from collections import OrderedDict
 
 # #################################################
 # path adjustments, so that all imports can be done relative to these paths
@@ -38,7 +39,13 @@ from argparse import ArgumentParser, RawTextHelpFormatter
 __lib_subfolder = "lib"
 sys.path.append(os.path.abspath(__lib_subfolder))  # lib subfolder
 
-from lib.cppstatsutils import logParseProgress
+from analyses import commandline
+from lib import tracing
+from lib.accounting import FileAccounting
+from lib.analysiscontext import AnalysisContext, parseString
+from lib.manifest import returnFileNames
+from lib.progress import Progress
+from lib.srcmlutils import decodeTag, iterConditionals
 
 # #################################################
 # external modules
@@ -70,7 +77,6 @@ __errormatch = []
 # namespace-constant for src2srcml
 __cppnscpp = 'http://www.srcML.org/srcML/cpp'
 __cppnsdef = 'http://www.srcML.org/srcML/src'
-__cpprens = re.compile('{(.+)}(.+)')
 
 # conditionals - necessary for parsing the right tags
 __conditionals = ['if', 'ifdef', 'ifndef']
@@ -80,11 +86,6 @@ __conditionals_endif = ['endif']
 __conditionals_all = __conditionals + __conditionals_elif + \
         __conditionals_else
 __macro_define = ['define']
-__macrofuncs = {}       # functional macros like: "GLIBVERSION(2,3,4)",
-                        # used as "GLIBVERSION(x,y,z) 100*x+10*y+z"
-__curfile = ''          # current processed xml-file
-__defset = set()        # macro-objects
-__defsetf = dict()      # macro-objects per file
 
 # collected statistics
 class __statsorder(Enum):
@@ -99,33 +100,6 @@ class __statsorder(Enum):
 
 ##################################################
 # helper functions, constants and errors
-def returnFileNames(folder, extfilt = ['.xml']):
-    '''This function returns all files of the input folder <folder>
-    and its subfolders.'''
-    filesfound = list()
-
-    if os.path.isdir(folder):
-        wqueue = [os.path.abspath(folder)]
-
-        while wqueue:
-            currentfolder = wqueue[0]
-            wqueue = wqueue[1:]
-            foldercontent = os.listdir(currentfolder)
-            tmpfiles = filter(lambda n: os.path.isfile(
-                    os.path.join(currentfolder, n)), foldercontent)
-            tmpfiles = filter(lambda n: os.path.splitext(n)[1] in extfilt,
-                    tmpfiles)
-            tmpfiles = map(lambda n: os.path.join(currentfolder, n),
-                    tmpfiles)
-            filesfound += tmpfiles
-            tmpfolders = filter(lambda n: os.path.isdir(
-                    os.path.join(currentfolder, n)), foldercontent)
-            tmpfolders = map(lambda n: os.path.join(currentfolder, n),
-                    tmpfolders)
-            wqueue += tmpfolders
-
-    return filesfound
-
 def uniqueItems(l):
     l = sorted(l)
     return list(k for k, _ in itertools.groupby(l))
@@ -147,20 +121,6 @@ def _flatten(l):
     return l
 
 
-def _collectDefines(d):
-    """This functions adds all defines to a set.
-    e.g. #define FEAT_WIN
-    also #define FEAT_WIN 12
-    but not #define GLIBCVER(x,y,z) ...
-    """
-    __defset.add(d[0])
-    if __defsetf.has_key(__curfile):
-        __defsetf[__curfile].add(d[0])
-    else:
-        __defsetf[__curfile] = set([d[0]])
-    return d
-
-
 # possible operands:
 #   - hexadecimal number
 #   - decimal number
@@ -223,6 +183,7 @@ def _collapseSubElementsToList(node):
 
 
 
+@tracing.traced(category="derivative")
 def _parseFeatureSignature(sig):
     """This function parses a given feature-signature."""
     mal = set()
@@ -232,7 +193,7 @@ def _parseFeatureSignature(sig):
     def _addIdentifier2Mal(p): mal.add(p[0])
 
     operand = __string | __hexadec | __function | __integer | \
-    __identifier.setParseAction(_addIdentifier2Mal)
+    __identifier.copy().setParseAction(_addIdentifier2Mal)
     compoperator = pypa.oneOf('< > <= >= == !=')
     calcoperator = pypa.oneOf('+ - * / % & | << >>')
     expr = pypa.operatorPrecedence(operand, [
@@ -245,7 +206,7 @@ def _parseFeatureSignature(sig):
     ])
 
     try:
-        rsig = expr.parseString(sig)[0]
+        rsig = parseString(expr, sig)[0]
     except pypa.ParseException, e:
         print 'ERROR (parse): cannot parse sig (%s) -- (%s)' % (sig, e.col,)
         return sig
@@ -270,7 +231,7 @@ def _getMacroSignature(ifdefnode):
     # see the srcml.dtd for more information
     nexpr = []
     res = ''
-    _, tag = __cpprens.match(ifdefnode.tag).groups()
+    _, tag = decodeTag(ifdefnode.tag)
 
     # get either the expr or the name tag,
     # which is always the second descendant
@@ -298,10 +259,11 @@ def _countNestedIfdefs(root):
     within the source-file."""
     cncur = 0
     cnlist = []
-    elements = [it for it in root.iterdescendants()]
+    elements = iterConditionals(root, __conditionals + __conditionals_endif,
+            __cppnscpp)
 
     for elem in elements:
-        ns, tag = __cpprens.match(elem.tag).groups()
+        ns, tag = decodeTag(elem.tag)
         if ((tag in __conditionals_endif)
                 and (ns == __cppnscpp)): cncur -= 1
         if ((tag in __conditionals)
@@ -364,7 +326,7 @@ def _getASTHistory(node):
     asth = []
 
     for anc in ancs:
-        _, tag = __cpprens.match(anc.tag).groups()
+        _, tag = decodeTag(anc.tag)
         asth.append(tag)
     return asth
 
@@ -381,12 +343,12 @@ def _getASTFuture(node):
 
     desh = []
     for des in dess:
-        _, tag = __cpprens.match(des.tag).groups()
+        _, tag = decodeTag(des.tag)
         desh.append(tag)
     return desh
 
 
-def _parseAndAddDefine(node):
+def _parseAndAddDefine(ctx, node):
     """This function extracts the identifier and the corresponding
     expansion from define macros. Later on these are used in conditionals
     in order to make them comparable."""
@@ -397,17 +359,18 @@ def _parseAndAddDefine(node):
     macrodef = pypa.Literal('#define').suppress() + __function + anytext
 
     try:
-        res = macrodef.parseString(define)
+        res = parseString(macrodef, define)
     except pypa.ParseException:
         return
 
     iden = ''.join(map(str, res[0]))
     expn = res[-1]
     para = res[1:-1]
-    __macrofuncs[iden] = (para, expn)
+    ctx.defineMacroFunction(iden, (para, expn))
 
 
-def _getFeatures(root):
+@tracing.traced(category="derivative")
+def _getFeatures(ctx, root):
     """This function returns all features in the source-file.
     A feature is defined as an enframement of soure-code. The frame
     consists of an ifdef (conditional) and an endif-macro. The function
@@ -480,7 +443,7 @@ def _getFeatures(root):
 
     # iterate over all tags separately <start>- and <end>-tag
     for event, elem in etree.iterwalk(root, events=("start", "end")):
-        ns, tag = __cpprens.match(elem.tag).groups()
+        ns, tag = decodeTag(elem.tag)
 
         # handling conditionals
         # hitting on conditional-macro
@@ -524,7 +487,7 @@ def _getFeatures(root):
         if ((tag in __macro_define) \
                 and (event == 'end') \
                 and (ns == __cppnscpp)):
-            _parseAndAddDefine(elem)
+            _parseAndAddDefine(ctx, elem)
 
         # iterateting in subtree of conditional-node
         if parcon:
@@ -787,6 +750,7 @@ def _getFeaturesDepthOne(features):
     return nof1
 
 
+@tracing.traced(category="derivative")
 def _distinguishFeatures(features):
     """This function returns a tuple with dicts, each holding
     one type of feature. The determination is according to the
@@ -853,7 +817,7 @@ def _distinguishFeatures(features):
     return (scode, deriv, desc, het, hom, hethom)
 
 
-def _getNumOfDefines(defset):
+def _getNumOfDefines(ctx, defset):
     """This method returns the number of defines, that have the following
     structure:
     #define FEAT_A
@@ -863,15 +827,16 @@ def _getNumOfDefines(defset):
     #define CHECKVERSION(x,y,z) x*100+y*10+z
     All determined elements are derived from the ifdef macros.
     """
-    # basic operation of this function is to check __defset against
-    # __macrofuncs
-    funcmacros = __macrofuncs.keys()
+    # basic operation of this function is to check the defines against
+    # the macro functions
+    funcmacros = ctx.macrofuncs.keys()
     funcmacros = map(lambda n: n.split('(')[0], funcmacros)
     funcmacros = set(funcmacros)
 
     return len((defset - funcmacros))
 
 
+@tracing.traced(category="derivative")
 def _getScatteringTanglingDegrees(sigs, defines):
     """This method returns the mean and the standard-deviation of
     defines according to the given mapping of a define to occurances
@@ -981,95 +946,114 @@ def _checkForEquivalentSig(l, sig):
     raise NoEquivalentSigError()
 
 
-def prettyPrintSet(s):
-    h = s.pop()
-    r = str(h)
-
-    for e in s: r += ','+str(e)
-    return r
-
-
-def resetModule() :
-    global __macrofuncs, __defset, __defsetf
-    __macrofuncs = {}       # functional macros like: "GLIBVERSION(2,3,4)",
-                            # used as "GLIBVERSION(x,y,z) 100*x+10*y+z"
-    __defset = set()        # macro-objects
-    __defsetf = dict()      # macro-objects per file
-
-
-def apply(folder):
+def apply(folder, stream, options):
     """This function applies the analysis to all xml-files in that
     directory and take the results and joins them together. Results
-    are getting written into the fdcsv-file."""
+    are getting written into the fdcsv-file and, if given, to the
+    ResultStream <stream>; <options> give the budgets of the files
+    (see lib/accounting.py)."""
     # overall status variables
-    resetModule()
+    ctx = AnalysisContext()
 
     sigmap = {}                # {<converted sig>: [<equivalent sigs>]}
-    afeatures = {}            # identified features; {<sig>: ([flag], depth, [code])}
-
-    def _mergeFeatures(ffeatures):
+    afeatures = {}            # identified features; {<sig>: (<feature ids>, depth, <has code>)}
+    featureids = {}           # {<feature name>: <feature id>}
+    featurenames = []         # [<feature name>]; feature id -> feature name
+
+    def _encodeFeatures(mal):
+        """This function returns the sorted tuple of feature ids for the
+        given set of feature names; new names get the next free id."""
+        for name in mal:
+            if name not in featureids:
+                featureids[name] = len(featurenames)
+                featurenames.append(name)
+        return tuple(sorted(featureids[name] for name in mal))
+
+    def _parseFeatures(ffeatures):
+        """This function parses the signatures of the, with the parameter
+        given dictionary (ffeatures) for _mergeFeatures; returns a list of
+        (sig, mal, psig, depth, code)."""
+        return [(sig,) + _parseFeatureSignature(sig) + (depth, code)
+                for (sig, (depth, code)) in ffeatures.iteritems()]
+
+    @tracing.traced("merge", "derivative")
+    def _mergeFeatures(pfeatures):
         """This function merges the, with the parameter given
-        dictionary (ffeatures) to the afeatures (overall-features)."""
-        for (sig, (depth, code)) in ffeatures.iteritems():
-            (mal, psig) = _parseFeatureSignature(sig)
-
+        list of parsed features (see _parseFeatures) to the afeatures
+        (overall-features). Only the information needed for the output
+        is kept: the code of a feature is reduced to the flag whether
+        there is any c-code."""
+        for (sig, mal, psig, depth, code) in pfeatures:
             try:
                 sigmatch = _checkForEquivalentSig(sigmap.keys(), psig)
-                (tmpflag, tmpdepth, tmpcode) = \
+                (tmpflag, tmpdepth, _) = \
                     afeatures[sigmap[sigmatch][0]]
                 tmpdepth = min(tmpdepth, depth)
-                tmpcode += code
+                # merged features have at least two pieces of code
                 afeatures[sigmap[sigmatch][0]] = \
-                    (tmpflag, tmpdepth, tmpcode)
+                    (tmpflag, tmpdepth, True)
                 sigmap[sigmatch].append(sig)
             except NoEquivalentSigError:
                 # mergedfeatures get the depth of minus one
                 # so this way need to make less amount of changes here
-                afeatures[sig] = (mal, depth, list(code))
+                afeatures[sig] = (_encodeFeatures(mal), depth, code != [''])
                 sigmap[psig] = [sig]
 
     # outputfile
     # fd, fdcsv = _prologCSV(folder)
 
-    global __curfile
     fcount = 0
     files = returnFileNames(folder, ['.xml'])
     fstats = [None]*len(__statsorder)
-    ftotal = len(files)
 
     # get statistics for all files; write results into csv
     # and merge the features
-    for file in files:
-        __curfile = file
-        fcount += 1
-        try:
-            tree = etree.parse(file)
-        except etree.XMLSyntaxError:
-            print("ERROR: cannot parse (%s). Skipping this file." %
-                os.path.join(folder, file))
-            continue
+    progress = Progress("derivative", files, folder, options.progressInterval)
+    accounting = FileAccounting("derivative", folder, options)
+    for file in tracing.spans(progress.iterate(files), "file", "derivative"):
+        # analyze the file; its results are merged only if it stays
+        # within its budget (see lib/accounting.py)
+        with accounting.account(file, ctx.rollbackFile) as account:
+            ctx.startFile(file)
+            try:
+                with tracing.span("parse", "derivative"):
+                    tree = etree.parse(file)
+            except etree.XMLSyntaxError:
+                print("ERROR: cannot parse (%s). Skipping this file." %
+                    os.path.join(folder, file))
+                progress.count("errors")
+                continue
 
-        logParseProgress(fcount, ftotal, folder, file)
 
-        root = tree.getroot()
-        try:
-            (features, _, featuresgrouter) = _getFeatures(root)
-        except IfdefEndifMismatchError:
-            print("ERROR: ifdef-endif mismatch in file (%s)" %
-                (os.path.join(folder, file)))
+            root = tree.getroot()
+            try:
+                (features, _, featuresgrouter) = _getFeatures(ctx, root)
+            except IfdefEndifMismatchError:
+                print("ERROR: ifdef-endif mismatch in file (%s)" %
+                    (os.path.join(folder, file)))
+                progress.count("errors")
+                continue
+            pfeatures = _parseFeatures(features)
+
+        if account.skipped:
             continue
-        _mergeFeatures(features)
+
+        fcount += 1
+        _mergeFeatures(pfeatures)
+
+        if stream:
+            stream.fileResult(file, OrderedDict([("annotations", len(features))]))
+
+    progress.finish()
+    accounting.report()
+
 
     # filter annotations that do not have any c-code
     # filter annotations with less than 2 features
-    afeatureitems = filter(lambda (a, (f, d, c)):
-            c != [''], afeatures.items())
-    annotations = map(lambda (a, (f, b, c)): (a, f), afeatureitems)
-    annotations2andmore = filter(lambda (a, f): len(f) > 1, annotations)
-    annotationmap = dict()
-    for (a, f) in annotations2andmore: annotationmap[a] = f
-
-    annotations2andmore = map(lambda s: set(s), annotationmap.values())
+    def _getAnnotations():
+        for (a, (f, _, hascode)) in afeatures.iteritems():
+            if hascode and len(f) > 1:
+                yield (a, f)
 
     projectpath = os.path.dirname(folder)
     fd = open(
@@ -1079,13 +1063,25 @@ def apply(folder):
         )
         , 'w')
 
-    featurenames = reduce(set.union, annotations2andmore, set([]))
-    for i in featurenames:
-        fd.write(i + '\n')
-    for (a,f) in annotationmap.iteritems():
-        fd.write(prettyPrintSet(f)+';'+a+'\n')
+    # the used feature names come first, so collect their ids beforehand
+    usedfeatures = set()
+    for (_, f) in _getAnnotations():
+        usedfeatures.update(f)
+    for i in sorted(usedfeatures):
+        fd.write(featurenames[i] + '\n')
+
+    # stream the annotations to the file
+    numannotations = 0
+    for (a, f) in _getAnnotations():
+        fd.write(','.join([featurenames[i] for i in f]) + ';' + a + '\n')
+        numannotations += 1
     fd.close()
 
+    if stream:
+        stream.projectResult(OrderedDict([
+            ("features", sorted(featurenames[i] for i in usedfeatures)),
+            ("annotations", numannotations)]))
+
 
 # ##################################################
 # add command line options
@@ -1094,17 +1090,12 @@ def addCommandLineOptionsMain(optionparser):
     ''' add command line options for a direct call of this script'''
     optionparser.add_argument("--folder", dest="folder",
             help="input folder [default: %(default)s]", default=".")
+    commandline.addAccountingOptions(optionparser)
+    commandline.addProgressOptions(optionparser)
 
 
-def addCommandLineOptions(optionparser) :
-    # TODO implement CSP solving?
-    # optionparser.add_argument("--csp", dest="csp", action="store_true",
-    #         default=False, help="make use of csp solver to check " \
-    #         "feature expression equality  [default: %(default)s]")
-    # optionparser.add_argument("--str", dest="str", action="store_true",
-    #         default=True, help="make use of simple string comparision " \
-    #         "for checking feature expression equality  [default: %(default)s]")
-    pass
+def addCommandLineOptions(optionparser):
+    commandline.addDerivativeOptions(optionparser)
 
 
 # ################################################
@@ -1114,6 +1105,11 @@ def getResultsFile():
     return __outputfile
 
 
+def getResultsFiles(options):
+    '''all files written by the analysis (in the project folder)'''
+    return [__outputfile]
+
+
 ##################################################
 if __name__ == '__main__':
 
@@ -1130,7 +1126,7 @@ if __name__ == '__main__':
 
     folder = os.path.abspath(options.folder)
     if (os.path.isdir(folder)):
-        apply(folder)
+        apply(folder, None, options)
     else:
         sys.exit(-1)
 
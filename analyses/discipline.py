@@ -24,10 +24,11 @@
 
 
 # modules from the std-library
+import itertools
 import os
-import re
 import sys
 from argparse import ArgumentParser, RawTextHelpFormatter
+from collections import OrderedDict
 
 
 # #################################################
@@ -36,33 +37,106 @@ from argparse import ArgumentParser, RawTextHelpFormatter
  # python-lxml module
 from lxml import etree
 
+# #################################################
+# path adjustments, so that all imports can be done relative to these paths
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from analyses import commandline
+from lib import tracing
+from lib.manifest import returnFileNames
+from lib.progress import Progress
+from lib.srcmlutils import decodeTag, iterConditionals
+
+
+class _DirectiveIndex:
+    '''This class indexes the conditional directives of one file: their
+    parents and their positions in document order. Two directives with the
+    same parent are siblings, and the later one in document order is a
+    following sibling of the earlier one; so sibling checks become lookups
+    instead of scans over all siblings.'''
+
+    def __init__(self, treeifdefs):
+        self.__parents = dict()
+        self.__positions = dict()
+        self.__parenttags = dict()
+        for position, directive in enumerate(treeifdefs):
+            self.__parents[directive] = directive.getparent()
+            self.__positions[directive] = position
+
+    def getParent(self, directive):
+        return self.__parents[directive]
+
+    def getParentTag(self, directive):
+        try:
+            return self.__parenttags[directive]
+        except KeyError:
+            tag = decodeTag(self.__parents[directive].tag)[1]
+            self.__parenttags[directive] = tag
+            return tag
+
+    def areSiblings(self, directive, others):
+        '''This method returns whether all others are following siblings
+        of the given directive.'''
+        parent = self.__parents[directive]
+        position = self.__positions[directive]
+        for other in others:
+            if self.__parents[other] != parent \
+                    or self.__positions[other] <= position:
+                return False
+        return True
+
+
+class DisciplineCounters:
+    '''This class holds the counters of the discipline analysis for a single
+    file or a whole project. The counters are plain integers, so the records
+    of several files (e.g., computed by different worker processes) are
+    merged by adding them up.'''
+
+    # counters in the order of the columns of the output files
+    columns = ['loc', 'compilationunit', 'functiontype', 'siblings', 'wrapperif',
+               'conditionalcase', 'conditionalelif', 'parameter', 'expression',
+               'undisciplinedknown', 'undisciplinedunknown']
+    # counters without own column
+    others = ['overallblocks', 'disciplined', 'wrapperfor', 'wrapperwhile']
+
+    def __init__(self):
+        for counter in DisciplineCounters.columns + DisciplineCounters.others:
+            setattr(self, counter, 0)
+
+    def __iadd__(self, other):
+        for counter in DisciplineCounters.columns + DisciplineCounters.others:
+            setattr(self, counter, getattr(self, counter) + getattr(other, counter))
+        return self
+
+    def getRatio(self):
+        ratio = 0
+        if (self.overallblocks > 0):
+            ratio = self.disciplined/(0.0 + self.overallblocks)
+        return ratio
+
+    @staticmethod
+    def getHeader(name):
+        return ";".join([name] + DisciplineCounters.columns
+                + ["disciplined/overallblocks", "overallblocks"]) + "\n"
 
-def returnFileNames(folder, extfilt = ['.xml']):
-    '''This function returns all files of the input folder <folder>
-    and its subfolders.'''
-    filesfound = list()
+    def getRow(self, name):
+        values = [str(getattr(self, counter)) for counter in DisciplineCounters.columns]
+        return ";".join([name] + values
+                + [str(self.getRatio()), str(self.overallblocks)]) + "\n"
 
-    if os.path.isdir(folder):
-        wqueue = [os.path.abspath(folder)]
+    def getResults(self):
+        '''This method returns the counters as dict, in the order of the
+        columns of the output files.'''
+        return OrderedDict([(counter, getattr(self, counter)) for counter in DisciplineCounters.columns]
+                + [("disciplined/overallblocks", self.getRatio()), ("overallblocks", self.overallblocks)])
 
-        while wqueue:
-            currentfolder = wqueue[0]
-            wqueue = wqueue[1:]
-            foldercontent = os.listdir(currentfolder)
-            tmpfiles = filter(lambda n: os.path.isfile(
-                    os.path.join(currentfolder, n)), foldercontent)
-            tmpfiles = filter(lambda n: os.path.splitext(n)[1] in extfilt,
-                    tmpfiles)
-            tmpfiles = map(lambda n: os.path.join(currentfolder, n),
-                    tmpfiles)
-            filesfound += tmpfiles
-            tmpfolders = filter(lambda n: os.path.isdir(
-                    os.path.join(currentfolder, n)), foldercontent)
-            tmpfolders = map(lambda n: os.path.join(currentfolder, n),
-                    tmpfolders)
-            wqueue += tmpfolders
 
-    return filesfound
+def _checkFileInWorker(args):
+    '''This function classifies a single file in a worker process and
+    returns its counters.'''
+    (file, options) = args
+    return DisciplinedAnnotations(None, options).checkFile(file)
 
 
 class DisciplinedAnnotations:
@@ -70,54 +144,33 @@ class DisciplinedAnnotations:
     # constants:
     __cppnscpp = 'http://www.srcML.org/srcML/cpp'
     __cppnsdef = 'http://www.srcML.org/srcML/src'
-    __cpprens = re.compile('{(.+)}(.+)')
     __conditionals = ['if', 'ifdef', 'ifndef', 'else', 'elif', 'endif']
     __conditions   = ['if', 'ifdef', 'ifndef']
     outputfile = "cppstats_discipline.csv"
+    perfileoutputfile = commandline.disciplinePerFileOutputFile
     ##################################################
 
-    def __init__(self, folder, options):
+    def __init__(self, folder, options, stream=None):
 
         self.opts = options
+        self.stream = stream
+        self.counters = DisciplineCounters()
+
+        # worker processes only check single files (see checkFile)
+        if folder is None:
+            return
+
         self.opts.dir = os.path.abspath(folder)
 
         print self.opts.dir
 
-        if not self.opts.dir:
-            oparser.print_help()
-            sys.exit(-1)
-
-        self.overallblocks = 0
-        self.disciplined = 0
-        self.undisciplinedknown = 0
-        self.undisciplinedunknown = 0
-        self.compilationunit = 0
-        self.functiontype = 0
-        self.siblings = 0
-        self.wrapperif = 0
-        self.wrapperfor = 0
-        self.wrapperwhile = 0
-        self.conditionalcase = 0
-        self.conditionalelif = 0
-        self.parameter = 0
-        self.expression = 0
-        self.loc = 0
         self.checkFiles()
 
     def __getIfdefAnnotations__(self, root):
         '''This method returns all nodes of the xml which are ifdef
         annotations in the source code.'''
-        treeifdefs = list()
-
-        for _, elem in etree.iterwalk(root):
-            ns, tag = DisciplinedAnnotations.__cpprens.match(elem.tag).\
-                    groups()
-
-            if ns == DisciplinedAnnotations.__cppnscpp \
-                    and tag in DisciplinedAnnotations.__conditionals:
-                treeifdefs.append(elem)
-
-        return treeifdefs
+        return list(iterConditionals(root, DisciplinedAnnotations.__conditionals,
+                DisciplinedAnnotations.__cppnscpp))
 
     def __createListFromTreeifdefs__(self, treeifdefs):
         '''This method returns a list representation for the input treeifdefs
@@ -128,7 +181,7 @@ class DisciplinedAnnotations:
         listifdefs = list()
         workerlist = list()
         for nifdef in treeifdefs:
-            tag = nifdef.tag.split('}')[1]
+            tag = decodeTag(nifdef.tag)[1]
             if tag in ['if', 'ifdef', 'ifndef']:
                 workerlist.append(list())
                 workerlist[-1].append(nifdef)
@@ -160,62 +213,27 @@ class DisciplinedAnnotations:
 
 
     PATTLS = 0 # 1 << 0 => 1
-    def __checkStrictTLSFDPattern__(self, listifdefs):
+    def __checkStrictTLSFDPattern__(self, listcorifdef, index):
         '''like sibling pattern, but only top level and statement elements are
         considered disciplined'''
-        listundisciplinedknown = list()
-        listundisciplinedunknown = list()
-
-        for listcorifdef in listifdefs:
-            nodeifdef = listcorifdef[0]
-            nodeifdefsibs = [sib for sib in nodeifdef.itersiblings()]
-
-            error=0
-            for corifdef in listcorifdef[1:]:
-                if not corifdef in nodeifdefsibs:
-                    error=1
-
-            if error==0:
-                parenttag = self.__getParentTag__(nodeifdef)
-                if not parenttag in ['block','public']:
-                    error=1
-            if error==1:
-                listundisciplinedunknown.append(listcorifdef)
-            else:
-                listundisciplinedknown.append(listcorifdef)
+        nodeifdef = listcorifdef[0]
 
-        return (listundisciplinedknown, listundisciplinedunknown)
+        if not index.areSiblings(nodeifdef, listcorifdef[1:]):
+            return False
+        return index.getParentTag(nodeifdef) in ['block','public']
 
 
-    def __checkStrictTLSCUPattern__(self, listifdefs):
+    def __checkStrictTLSCUPattern__(self, listcorifdef, index):
         '''This method checks all patterns, if they occur right under the root element
         of the grammer, here unit.'''
-        listundisciplinedknown = list()
-        listundisciplinedunknown = list()
+        nodeifdef = listcorifdef[0]
 
-        for listcorifdef in listifdefs:
-            nodeifdef = listcorifdef[0]
-            nodeifdefsibs = [sib for sib in nodeifdef.itersiblings()]
-
-            error=0
-            for corifdef in listcorifdef[1:]:
-                if not corifdef in nodeifdefsibs:
-                    error=1
-
-            if error==0:
-                parenttag = self.__getParentTag__(nodeifdef)
-                if not parenttag in ['unit']:
-                    error=1
-            if error==1:
-                listundisciplinedunknown.append(listcorifdef)
-            else:
-                listundisciplinedknown.append(listcorifdef)
-
-        assert len(listifdefs) == len(listundisciplinedknown)+len(listundisciplinedunknown)
-        return (listundisciplinedknown, listundisciplinedunknown)
+        if not index.areSiblings(nodeifdef, listcorifdef[1:]):
+            return False
+        return index.getParentTag(nodeifdef) in ['unit']
 
 
-    def __checkStrictPattern__(self, listifdefs):
+    def __checkStrictPattern__(self, listcorifdef, index):
         '''This pattern checks the annotation of functions, where the XML markup
         of src2srcml is ill-formed. TODO might be fixed in future versions of
         src2srcml. Example is:
@@ -225,290 +243,167 @@ class DisciplinedAnnotations:
         // some lines of code
         }
         '''
-        listundisciplinedknown = list()
-        listundisciplinedunknown = list()
-
-        for listcorifdef in listifdefs:
-            if len(listcorifdef) != 2:
-                listundisciplinedunknown.append(listcorifdef)
-                continue
-
-            nodeifdef = listcorifdef[0]
-            nodeendif = listcorifdef[1]
-            func = nodeendif.getparent()
+        if len(listcorifdef) != 2:
+            return False
 
-            if func != None and func.tag.split('}')[1] == 'function':
-                nodefuncsibs = [sib for sib in func.itersiblings(preceding=True)]
-                if nodeifdef == nodefuncsibs[0]:
-                    if self.opts.verbose:
-                        print('[INFO] ill-formed compilation unit pattern occured in line (%4s).' % nodeifdef.sourceline)
-                    listundisciplinedknown.append(listcorifdef)
-                    continue
+        nodeifdef = listcorifdef[0]
+        nodeendif = listcorifdef[1]
+        func = index.getParent(nodeendif)
 
-            listundisciplinedunknown.append(listcorifdef)
+        if func != None and decodeTag(func.tag)[1] == 'function':
+            if nodeifdef == func.getprevious():
+                if self.opts.verbose:
+                    print('[INFO] ill-formed compilation unit pattern occured in line (%4s).' % nodeifdef.sourceline)
+                return True
 
-        assert len(listifdefs) == len(listundisciplinedknown)+len(listundisciplinedunknown)
-        return (listundisciplinedknown, listundisciplinedunknown)
+        return False
 
 
     PATSIB = 1 # 1 << 1 => 2
-    def __checkSiblingPattern__(self, listifdefs):
-        '''This method returns a tuple with (listdisciplined,
-        listundisciplined) #ifdef elements. The pattern works on the basis
-        of the sibling pattern. If the xml elements of #if-#elif-#else-#endif
-        are siblings, we determine them as disciplined.'''
-        listundisciplinedknown = list()
-        listundisciplinedunknown = list()
-
-        for listcorifdef in listifdefs:
-            nodeifdef = listcorifdef[0]
-            nodeifdefsibs = [sib for sib in nodeifdef.itersiblings()]
-
-            error=0;
-            for corifdef in listcorifdef[1:]:
-                if not corifdef in nodeifdefsibs:
-                    error=1
-            if error==1:
-                listundisciplinedunknown.append(listcorifdef)
-            else:
-                listundisciplinedknown.append(listcorifdef)
-
-        assert len(listifdefs) == len(listundisciplinedknown)+len(listundisciplinedunknown)
-        return (listundisciplinedknown, listundisciplinedunknown)
-
-
-    def __getParentTag__(self, tag):
-        parent = tag.getparent()
-        return parent.tag.split('}')[1]
+    def __checkSiblingPattern__(self, listcorifdef, index):
+        '''This method checks the sibling pattern. If the xml elements of
+        #if-#elif-#else-#endif are siblings, we determine them as
+        disciplined.'''
+        return index.areSiblings(listcorifdef[0], listcorifdef[1:])
 
 
     PATIFTHEN = 2 # 1 << 2 => 4
-    def __checkIfThenPattern__(self, listifdefs):
-        '''This method returns a tuple with (listdisciplined,
-        listundisciplined) #ifdef elements. The pattern matches the following
-        situation. The if-then in C is enframed by #if-#endif. The else part of
-        the if-then in C is not enframed. The sibling pattern does not work here
-        since the annatation cannot work properly here.'''
-        listundisciplinedknown = list()
-        listundisciplinedunknown = list()
-
-        for listcorifdef in listifdefs:
-            if len(listcorifdef) != 2:
-                listundisciplinedunknown.append(listcorifdef)
-                continue
-
-            # check that the endif is the first child of its parent and the parent
-            # is an else
-            ifdef = listcorifdef[0]
-            ifdefsibs = [sib for sib in ifdef.itersiblings()]
-
-            # first sibling of starting ifdef must be an if
-            if len(ifdefsibs) == 0 or ifdefsibs[0].tag.split('}')[1] != 'if':
-                listundisciplinedunknown.append(listcorifdef)
-                continue
-
-            # parent of endif must be either an else or an then (if)
-            endif = listcorifdef[1]
-            poselse = endif.getparent()
-            poselsetag = poselse.tag.split('}')[1]
-            if poselsetag in ['else', 'then']:
-                if self.opts.verbose:
-                    print('[INFO] if-then pattern occured in line (%4s).' % poselse.sourceline)
-                listundisciplinedknown.append(listcorifdef)
-            else:
-                listundisciplinedunknown.append(listcorifdef)
-
-        assert len(listifdefs) == len(listundisciplinedknown)+len(listundisciplinedunknown)
-        return (listundisciplinedknown, listundisciplinedunknown)
+    def __checkIfThenPattern__(self, listcorifdef, index):
+        '''This method checks the following situation. The if-then in C is
+        enframed by #if-#endif. The else part of the if-then in C is not
+        enframed. The sibling pattern does not work here since the annatation
+        cannot work properly here.'''
+        if len(listcorifdef) != 2:
+            return False
+
+        # first sibling of starting ifdef must be an if
+        ifdefsib = listcorifdef[0].getnext()
+        if ifdefsib is None or decodeTag(ifdefsib.tag)[1] != 'if':
+            return False
+
+        # parent of endif must be either an else or an then (if)
+        endif = listcorifdef[1]
+        poselse = index.getParent(endif)
+        if index.getParentTag(endif) in ['else', 'then']:
+            if self.opts.verbose:
+                print('[INFO] if-then pattern occured in line (%4s).' % poselse.sourceline)
+            return True
+        return False
 
     #TODO
-    def __checkForWrapperPattern__(self, listifdefs):
-        '''This method returns a tuple with (listdisciplined,
-        listundisciplined) #ifdef elements. The pattern matches the following
-        situation. The for in C is enframed by #if-#endif.'''
-        listundisciplinedknown = list()
-        listundisciplinedunknown = list()
-
-        for listcorifdef in listifdefs:
-            if len(listcorifdef) != 2:
-                listundisciplinedunknown.append(listcorifdef)
-                continue
-
-            # check that the endif is the first child of its parent and the parent
-            # is an else
-            ifdef = listcorifdef[0]
-            ifdefsibs = [sib for sib in ifdef.itersiblings()]
-
-            # first sibling of starting ifdef must be an for
-            if len(ifdefsibs) == 0 or ifdefsibs[0].tag.split('}')[1] != 'for':
-                listundisciplinedunknown.append(listcorifdef)
-                continue
-
-            # parent of endif must be either an else or an then (if)
-            endif = listcorifdef[1]
-            poselse = endif.getparent()
-            poselsetag = poselse.tag.split('}')[1]
-            if poselsetag in ['else', 'then']:
-                if self.opts.verbose:
-                    print('[INFO] if-then pattern occured in line (%4s).' % poselse.sourceline)
-                listundisciplinedknown.append(listcorifdef)
-            else:
-                listundisciplinedunknown.append(listcorifdef)
-
-        assert len(listifdefs) == len(listundisciplinedknown)+len(listundisciplinedunknown)
-        return (listundisciplinedknown, listundisciplinedunknown)
+    def __checkForWrapperPattern__(self, listcorifdef, index):
+        '''This method checks the following situation. The for in C is
+        enframed by #if-#endif.'''
+        if len(listcorifdef) != 2:
+            return False
+
+        # first sibling of starting ifdef must be an for
+        ifdefsib = listcorifdef[0].getnext()
+        if ifdefsib is None or decodeTag(ifdefsib.tag)[1] != 'for':
+            return False
+
+        # parent of endif must be either an else or an then (if)
+        endif = listcorifdef[1]
+        poselse = index.getParent(endif)
+        if index.getParentTag(endif) in ['else', 'then']:
+            if self.opts.verbose:
+                print('[INFO] if-then pattern occured in line (%4s).' % poselse.sourceline)
+            return True
+        return False
 
 
     PATCASE = 3 # 1 << 3 => 8
-    def __checkCasePattern__(self, listifdefs):
+    def __checkCasePattern__(self, listcorifdef, index):
         '''The method checks the case-block pattern; the #ifdef enframes a case block
         of a switch case.'''
-        listundisciplinedknown = list()
-        listundisciplinedunknown = list()
-
-        for listcorifdef in listifdefs:
-            # pattern works only for #if-#endif combinations
-            if len(listcorifdef) > 2:
-                listundisciplinedunknown.append(listcorifdef)
-                continue
-
-            # get endif and check whether parent is a case
-            nodeendif = listcorifdef[-1]
-            parenttag = self.__getParentTag__(nodeendif)
-            if parenttag in ['case']:
-                if self.opts.verbose:
-                    print('[INFO] case pattern occured in line (%4s).' % nodeendif.sourceline)
-                listundisciplinedknown.append(listcorifdef)
-            else:
-                listundisciplinedunknown.append(listcorifdef)
-
-        assert len(listifdefs) == len(listundisciplinedknown)+len(listundisciplinedunknown)
-        return (listundisciplinedknown, listundisciplinedunknown)
+        # pattern works only for #if-#endif combinations
+        if len(listcorifdef) > 2:
+            return False
+
+        # get endif and check whether parent is a case
+        nodeendif = listcorifdef[-1]
+        if index.getParentTag(nodeendif) in ['case']:
+            if self.opts.verbose:
+                print('[INFO] case pattern occured in line (%4s).' % nodeendif.sourceline)
+            return True
+        return False
 
     PATELSEIF = 4 # 1 << 4 => 16
-    def __checkElseIfPattern__(self, listifdefs):
+    def __checkElseIfPattern__(self, listcorifdef, index):
         '''The method check the elseif-block pattern; the #ifdef enframes an elseif
         block in an if-then-else.'''
-        listundisciplinedknown = list()
-        listundisciplinedunknown = list()
-
-        for listcorifdef in listifdefs:
-            # pattern works only for #if-#endif combinations
-            if len(listcorifdef) > 2:
-                listundisciplinedunknown.append(listcorifdef)
-                continue
-
-            # get the endif
-            # endif parent -> then
-            # then parent -> if
-            # if parent -> else
-            # else parent -> #ifdef
-            nodeendif = listcorifdef[-1]
-            thensib = nodeendif.getprevious()
-            if thensib == None:
-                listundisciplinedunknown.append(listcorifdef)
-                continue
-            if thensib.tag.split('}')[1] not in ['then']:
-                listundisciplinedunknown.append(listcorifdef)
-                continue
-            ifparent = thensib.getparent()
-            if ifparent.tag.split('}')[1] not in ['if']:
-                listundisciplinedunknown.append(listcorifdef)
-                continue
-            elseparent = ifparent.getparent()
-            if elseparent.tag.split('}')[1] not in ['else']:
-                listundisciplinedunknown.append(listcorifdef)
-                continue
-            ifdefsib = elseparent.getprevious()
-
-            if ifdefsib != listcorifdef[0]:
-                if self.opts.verbose:
-                    print('[INFO] else-if pattern occured in line (%4s).' % ifdefsib.sourceline)
-                listundisciplinedunknown.append(listcorifdef)
-            else:
-                listundisciplinedknown.append(listcorifdef)
-
-        assert len(listifdefs) == len(listundisciplinedknown)+len(listundisciplinedunknown)
-        return (listundisciplinedknown, listundisciplinedunknown)
+        # pattern works only for #if-#endif combinations
+        if len(listcorifdef) > 2:
+            return False
+
+        # get the endif
+        # endif parent -> then
+        # then parent -> if
+        # if parent -> else
+        # else parent -> #ifdef
+        nodeendif = listcorifdef[-1]
+        thensib = nodeendif.getprevious()
+        if thensib == None:
+            return False
+        if decodeTag(thensib.tag)[1] not in ['then']:
+            return False
+        ifparent = thensib.getparent()
+        if decodeTag(ifparent.tag)[1] not in ['if']:
+            return False
+        elseparent = ifparent.getparent()
+        if decodeTag(elseparent.tag)[1] not in ['else']:
+            return False
+        ifdefsib = elseparent.getprevious()
+
+        if ifdefsib != listcorifdef[0]:
+            if self.opts.verbose:
+                print('[INFO] else-if pattern occured in line (%4s).' % ifdefsib.sourceline)
+            return False
+        return True
 
     PATPARAM = 5 # 1 << 5 => 32
-    def __checkParameter__(self, listifdefs):
+    def __checkParameter__(self, listcorifdef, index):
         '''The method checks whether an #ifdef enframes a parameter of a function;
         includes function definitions and function calls.'''
-        listundisciplinedknown = list()
-        listundisciplinedunknown = list()
+        # pattern works only for #if-#endif combinations
+        if len(listcorifdef) > 2:
+            return False
 
-        for listcorifdef in listifdefs:
-            # pattern works only for #if-#endif combinations
-            if len(listcorifdef) > 2:
-                listundisciplinedunknown.append(listcorifdef)
-                continue
-
-            nodeifdef = listcorifdef[0]
-            nodeifdefsibs = [sib for sib in nodeifdef.itersiblings()]
-
-            error = 0
-            for corifdef in listcorifdef[1:]:
-                if not corifdef in nodeifdefsibs:
-                    error = 1
-
-            if error == 0:
-                # check whether node is an argument or parameter
-                parenttag = self.__getParentTag__(nodeifdef)
-                if not parenttag in ['argument_list','parameter_list']:
-                    error = 1
-
-                firstsib = nodeifdefsibs[0]
-                if firstsib.tag.split('}')[1] not in ['argument', 'param']:
-                    error = 1
-            if error == 1:
-                listundisciplinedunknown.append(listcorifdef)
-            else:
-                if self.opts.verbose:
-                    print('[INFO] param/argument pattern occured in line (%4s).' % nodeifdef.sourceline)
-                listundisciplinedknown.append(listcorifdef)
+        nodeifdef = listcorifdef[0]
+        if not index.areSiblings(nodeifdef, listcorifdef[1:]):
+            return False
+
+        # check whether node is an argument or parameter
+        if not index.getParentTag(nodeifdef) in ['argument_list','parameter_list']:
+            return False
+        if decodeTag(nodeifdef.getnext().tag)[1] not in ['argument', 'param']:
+            return False
 
-        assert len(listifdefs) == len(listundisciplinedknown)+len(listundisciplinedunknown)
-        return (listundisciplinedknown, listundisciplinedunknown)
+        if self.opts.verbose:
+            print('[INFO] param/argument pattern occured in line (%4s).' % nodeifdef.sourceline)
+        return True
 
     PATEXP = 6 # 1 << 5 => 64
-    def __checkExpression__(self, listifdefs):
+    def __checkExpression__(self, listcorifdef, index):
         '''The method checks whether an #ifdef enframes an expression of a condition.'''
-        listundisciplinedknown = list()
-        listundisciplinedunknown = list()
-
-        for listcorifdef in listifdefs:
-            # pattern works only for #if-#endif combinations
-            if len(listcorifdef) > 2:
-                listundisciplinedunknown.append(listcorifdef)
-                continue
-
-            error = 0
-            nodeifdef = listcorifdef[0]
-
-            # get parent and check whether its tag is expr
-            exppar = nodeifdef.getparent()
-            exppartag = exppar.tag.split('}')[1]
-
-            if not exppartag == 'expr':
-                error = 1
+        # pattern works only for #if-#endif combinations
+        if len(listcorifdef) > 2:
+            return False
 
-            if error == 0:
-                conpar = exppar.getparent()
-                conpartag = conpar.tag.split('}')[1]
+        nodeifdef = listcorifdef[0]
 
-                if not conpartag == 'condition':
-                    error = 1
+        # get parent and check whether its tag is expr
+        if not index.getParentTag(nodeifdef) == 'expr':
+            return False
 
-            if error == 1:
-                listundisciplinedunknown.append(listcorifdef)
-            else:
-                if self.opts.verbose:
-                    print('[INFO] expression pattern occured in line (%4s).' % nodeifdef.sourceline)
-                listundisciplinedknown.append(listcorifdef)
+        # get grandparent and check whether its tag is condition
+        conpar = index.getParent(nodeifdef).getparent()
+        if not decodeTag(conpar.tag)[1] == 'condition':
+            return False
 
-        assert len(listifdefs) == len(listundisciplinedknown)+len(listundisciplinedunknown)
-        return (listundisciplinedknown, listundisciplinedunknown)
+        if self.opts.verbose:
+            print('[INFO] expression pattern occured in line (%4s).' % nodeifdef.sourceline)
+        return True
 
 
     def __iterateUnknownPatterns__(self, listifdefs, file):
@@ -519,158 +414,152 @@ class DisciplinedAnnotations:
                 print('[INFO] Unknown pattern in file (%s) and line (%s)' % \
                         (file, ifdef[0].sourceline))
 
-    def __checkDiscipline__(self, treeifdefs, file):
-        '''This method checks a number of patterns in the given treeifdefs.
-        The checks are in that order, that ifdef patterns not recognized
-        are passed to the next pattern.'''
-        listundisciplined = self.__createListFromTreeifdefs__(treeifdefs)
-        listundisciplined = self.__filterConditionalPreprocessorDirectives(listundisciplined)
-        if (listundisciplined == -1):
+    def __getEnabledChecks__(self):
+        '''This method returns the list of enabled pattern checks in the order
+        they are applied: (check, counter, disciplined).
+        An ifdef pattern not recognized by a check is passed to the next one.'''
+        checks = [
+            # check TLS pattern, subset of sibling pattern
+            (DisciplinedAnnotations.PATTLS, self.__checkStrictTLSCUPattern__, 'compilationunit', True),
+            # checking fd pattern (part of tls)
+            (DisciplinedAnnotations.PATTLS, self.__checkStrictTLSFDPattern__, 'functiontype', True),
+            # checking ill-formed compilation unit pattern
+            (DisciplinedAnnotations.PATTLS, self.__checkStrictPattern__, 'compilationunit', True),
+            # check if-then pattern
+            (DisciplinedAnnotations.PATIFTHEN, self.__checkIfThenPattern__, 'wrapperif', False),
+            # check case pattern
+            (DisciplinedAnnotations.PATCASE, self.__checkCasePattern__, 'conditionalcase', False),
+            # check else-if pattern
+            (DisciplinedAnnotations.PATELSEIF, self.__checkElseIfPattern__, 'conditionalelif', False),
+            # check param pattern
+            (DisciplinedAnnotations.PATPARAM, self.__checkParameter__, 'parameter', False),
+            # check expression pattern
+            (DisciplinedAnnotations.PATEXP, self.__checkExpression__, 'expression', False),
+            # check sibling pattern; check this late because pattern might match for others as well
+            (DisciplinedAnnotations.PATSIB, self.__checkSiblingPattern__, 'siblings', True),
+        ]
+        return [(check, counter, disciplined) for (pattern, check, counter, disciplined) in checks
+                if self.opts.disc_all or self.opts.check & (1 << pattern)]
+
+    def __checkDiscipline__(self, treeifdefs, file, counters):
+        '''This method assigns each #if-#endif group in the given treeifdefs
+        to the first enabled pattern matching it and updates the given
+        counters. All checks share one parent index of the file, so each
+        group is classified in one pass.'''
+        listifdefs = self.__createListFromTreeifdefs__(treeifdefs)
+        if (listifdefs == -1):
             print('[ERROR] Too many #endifs in file (%s)' % file)
             return
-        if (listundisciplined == -2):
+        if (listifdefs == -2):
             print('[ERROR] Not enough #endifs in file (%s)' % file)
             return
-        self.overallblocks += len(listundisciplined)
-
-        # check TLS pattern, subset of sibling pattern
-        if (self.opts.disc_all or self.opts.check & (1 << DisciplinedAnnotations.PATTLS)):
-            listifdefs = list(listundisciplined)
-            (listdisciplined, listundisciplined) = \
-                    self.__checkStrictTLSCUPattern__(listifdefs)
-            self.compilationunit += len(listdisciplined)
-            self.disciplined += len(listdisciplined)
+        listifdefs = self.__filterConditionalPreprocessorDirectives(listifdefs)
+        counters.overallblocks += len(listifdefs)
 
-            # checking fd pattern (part of tls)
-            listifdefs = list(listundisciplined)
-            (listdisciplined, listundisciplined) = \
-                    self.__checkStrictTLSFDPattern__(listifdefs)
-            self.functiontype += len(listdisciplined)
-            self.disciplined += len(listdisciplined)
+        index = _DirectiveIndex(treeifdefs)
+        checks = self.__getEnabledChecks__()
+        listundisciplined = list()
 
-            # checking ill-formed compilation unit pattern
-            listifdefs = list(listundisciplined)
-            (listdisciplined, listundisciplined) = \
-                    self.__checkStrictPattern__(listifdefs)
-            self.compilationunit += len(listdisciplined)
-            self.disciplined += len(listdisciplined)
-
-        # check if-then pattern
-        if (self.opts.disc_all or self.opts.check & (1 << DisciplinedAnnotations.PATIFTHEN)):
-            listifdefs = list(listundisciplined)
-            (listdisciplined, listundisciplined) = \
-                    self.__checkIfThenPattern__(listifdefs)
-            self.wrapperif += len(listdisciplined)
-            self.undisciplinedknown += len(listdisciplined)
-
-        # check case pattern
-        if (self.opts.disc_all or self.opts.check & (1 << DisciplinedAnnotations.PATCASE)):
-            listifdefs = list(listundisciplined)
-            (listdisciplined, listundisciplined) = \
-                    self.__checkCasePattern__(listifdefs)
-            self.conditionalcase += len(listdisciplined)
-            self.undisciplinedknown += len(listdisciplined)
-
-        # check else-if pattern
-        if (self.opts.disc_all or self.opts.check & (1 << DisciplinedAnnotations.PATELSEIF)):
-            listifdefs = list(listundisciplined)
-            (listdisciplined, listundisciplined) = \
-                    self.__checkElseIfPattern__(listifdefs)
-            self.conditionalelif += len(listdisciplined)
-            self.undisciplinedknown += len(listdisciplined)
-
-        # check param pattern
-        if (self.opts.disc_all or self.opts.check & (1 << DisciplinedAnnotations.PATPARAM)):
-            listifdefs = list(listundisciplined)
-            (listdisciplined, listundisciplined) = \
-                    self.__checkParameter__(listifdefs)
-            self.parameter += len(listdisciplined)
-            self.undisciplinedknown += len(listdisciplined)
-
-        # check expression pattern
-        if (self.opts.disc_all or self.opts.check & (1 << DisciplinedAnnotations.PATEXP)):
-            listifdefs = list(listundisciplined)
-            (listdisciplined, listundisciplined) = \
-                    self.__checkExpression__(listifdefs)
-            self.expression += len(listdisciplined)
-            self.undisciplinedknown += len(listdisciplined)
-
-        # check sibling pattern; check this late because pattern might match for others as well
-        if (self.opts.disc_all or self.opts.check & (1 << DisciplinedAnnotations.PATSIB)):
-            listifdefs = list(listundisciplined)
-            (listdisciplined, listundisciplined) = \
-                    self.__checkSiblingPattern__(listifdefs)
-            self.siblings += len(listdisciplined)
-            self.disciplined += len(listdisciplined)
+        for listcorifdef in listifdefs:
+            for (check, counter, disciplined) in checks:
+                if check(listcorifdef, index):
+                    setattr(counters, counter, getattr(counters, counter) + 1)
+                    if disciplined:
+                        counters.disciplined += 1
+                    else:
+                        counters.undisciplinedknown += 1
+                    break
+            else:
+                listundisciplined.append(listcorifdef)
 
         # wrap up listundisciplined
         self.__iterateUnknownPatterns__(listundisciplined, file)
-        self.undisciplinedunknown += len(listundisciplined)
+        counters.undisciplinedunknown += len(listundisciplined)
 
     def checkFile(self, file):
+        '''This method checks the given file and returns its counters.'''
+        counters = DisciplineCounters()
+
         try:
-            tree = etree.parse(file)
-            f = open(file, 'r')
+            with tracing.span("parse", "discipline"):
+                tree = etree.parse(file)
         except etree.XMLSyntaxError:
             print('ERROR: file (%s) is not valid. Skipping it.' % file)
-            return
+            return counters
 
         # get LOC
-        self.loc += len(f.readlines())-2;
+        with open(file, 'r') as f:
+            counters.loc += len(f.readlines())-2;
 
         # get root of the xml and iterate over it
         root = tree.getroot()
         treeifdefs = self.__getIfdefAnnotations__(root)
         try:
-            self.__checkDiscipline__(treeifdefs, file)
+            with tracing.span("check", "discipline"):
+                self.__checkDiscipline__(treeifdefs, file, counters)
         except:
             print('[ERROR]: file (%s) is not valid. Skipping it.' % file)
-            return
+        return counters
+
+    def __getPrintedFileName__(self, file):
+        '''This method adjusts the file name for the per-file output as the
+        other analyses do (see --filenames and --filenamesRelative).'''
+        if self.opts.filenamesRelative:
+            file = os.path.relpath(file, self.opts.dir)
+        if self.opts.filenames == self.opts.FILENAME_SOURCE:
+            file = file.replace(".xml", "").replace("/_cppstats_discipline/", "/source/", 1)
+        return file
+
+    def __mergeCounters__(self, xmlfiles, filecounters):
+        '''This method merges the counters of all files, as soon as they
+        are computed, and returns them as list. The trace span of a file
+        covers its check (or the wait for the worker process checking it).'''
+        result = list()
+        progress = Progress("discipline", xmlfiles, self.opts.dir, self.opts.progressInterval)
+        for (xmlfile, counters) in itertools.izip(tracing.spans(progress.iterate(xmlfiles), "file", "discipline"),
+                                                  filecounters):
+            self.counters += counters
+            if self.stream:
+                self.stream.fileResult(self.__getPrintedFileName__(xmlfile), counters.getResults())
+            result.append(counters)
+        progress.finish()
+        return result
 
     def checkFiles(self):
         xmlfiles = returnFileNames(self.opts.dir, ['.xml'])
-        for xmlfile in  xmlfiles:
-            print('[INFO] checking file %s' % xmlfile)
-            self.checkFile(xmlfile)
+
+        # classify files, in parallel if wanted; results keep the file order
+        jobs = self.opts.disc_jobs
+        if jobs > 1 and len(xmlfiles) > 1:
+            from multiprocessing import Pool
+            pool = Pool(min(jobs, len(xmlfiles)))
+            try:
+                filecounters = self.__mergeCounters__(xmlfiles, pool.imap(_checkFileInWorker,
+                        [(xmlfile, self.opts) for xmlfile in xmlfiles], chunksize=1))
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            filecounters = self.__mergeCounters__(xmlfiles, itertools.imap(self.checkFile, xmlfiles))
+
         projectpath = os.path.dirname(self.opts.dir)
         projectname = os.path.basename(projectpath)
-        fd = open(
-            os.path.join(
-                projectpath,
-                DisciplinedAnnotations.outputfile
-            ), 'w')
 
-        ratio = 0
-        if (self.overallblocks > 0):
-            ratio = self.disciplined/(0.0 + self.overallblocks)
-        fd.write("projectname"
-                +";"+"loc"
-                +";"+"compilationunit"
-                +";"+"functiontype"
-                +";"+"siblings"
-                +";"+"wrapperif"
-                +";"+"conditionalcase"
-                +";"+"conditionalelif"
-                +";"+"parameter"
-                +";"+"expression"
-                +";"+"undisciplinedknown"
-                +";"+"undisciplinedunknown"
-                +";"+"disciplined/overallblocks"
-                +";"+"overallblocks"+"\n")
-        fd.write(projectname
-                +";"+str(self.loc)
-                +";"+str(self.compilationunit)
-                +";"+str(self.functiontype)
-                +";"+str(self.siblings)
-                +";"+str(self.wrapperif)
-                +";"+str(self.conditionalcase)
-                +";"+str(self.conditionalelif)
-                +";"+str(self.parameter)
-                +";"+str(self.expression)
-                +";"+str(self.undisciplinedknown)
-                +";"+str(self.undisciplinedunknown)
-                +";"+str(ratio)
-                +";"+str(self.overallblocks)+"\n")
+        fd = open(os.path.join(projectpath, DisciplinedAnnotations.outputfile), 'w')
+        fd.write(DisciplineCounters.getHeader("projectname"))
+        fd.write(self.counters.getRow(projectname))
+        fd.close()
+
+        if self.stream:
+            self.stream.projectResult(self.counters.getResults())
+
+        # write one row per file, if wanted
+        if self.opts.disc_perfile:
+            fd = open(os.path.join(projectpath, DisciplinedAnnotations.perfileoutputfile), 'w')
+            fd.write(DisciplineCounters.getHeader("filename"))
+            for (xmlfile, counters) in zip(xmlfiles, filecounters):
+                fd.write(counters.getRow(self.__getPrintedFileName__(xmlfile)))
+            fd.close()
 
 
 # ##################################################
@@ -680,33 +569,12 @@ def addCommandLineOptionsMain(optionparser):
     ''' add command line options for a direct call of this script'''
     optionparser.add_argument('-d', '--dir', '--folder', dest='dir',
             help='input directory (mandatory)')
+    commandline.addFilenameOptions(optionparser)
+    commandline.addProgressOptions(optionparser)
 
 
-def addCommandLineOptions(optionparser) :
-    optionparser.description = 'This analysis counts the number of the disciplined CPP usage in software projects. \n' \
-            'To this end, it checks xml representations of header and source ' \
-            'files and returns the number of disciplined ifdefs in those. \n'
-            # TODO what are the disciplined ones
-            #'Disciplined annotations are:'
-
-    optionparser.add_argument('-l', '--log', dest='log', action="store_true",
-            default=True, help='log to stdout [default=%(default)s]')
-    optionparser.add_argument('-v', '--verbose', dest='verbose', action="store_true",
-            default=False, help='verbose output [default=%(default)s]')
-    optionparser.add_argument('--check', dest='check', type=int,
-            default=1, help='CHECK sets the patterns that are checked [default=%(default)s].\n'
-            'Supply sum of wanted patterns:\n'
-            '(1) check top level siblings (compilation unit) \n'
-            '(2) check sibling (excludes check top level siblings; NOT CLASSIFIED) \n'
-            '(4) check if-then enframement (wrapper) \n'
-            '(8) check case enframement (conditional) \n'
-            '(16) check else-if enframement (conditional) \n'
-            '(32) check param/argument enframement (parameter) \n'
-            '(64) check expression enframement (expression) \n'
-            '(128) check else enframement (NOT CLASSIFIED) \n'
-    )
-    optionparser.add_argument('--dall', dest='disc_all', action="store_true",
-                              default=True, help='check all patterns [default=%(default)s] \n(overrides --check)')
+def addCommandLineOptions(optionparser):
+    commandline.addDisciplineOptions(optionparser)
 
 
 # ################################################
@@ -716,6 +584,13 @@ def getResultsFile():
     return DisciplinedAnnotations.outputfile
 
 
+def getResultsFiles(options):
+    '''all files written by the analysis (in the project folder)'''
+    if options.disc_perfile:
+        return [DisciplinedAnnotations.outputfile, DisciplinedAnnotations.perfileoutputfile]
+    return [DisciplinedAnnotations.outputfile]
+
+
 ##################################################
 if __name__ == '__main__':
 
@@ -726,6 +601,7 @@ if __name__ == '__main__':
     addCommandLineOptions(parser)
 
     options = parser.parse_args()
+    commandline.addFilenameConstants(options)
 
     # main
     DisciplinedAnnotations(options.dir, options)
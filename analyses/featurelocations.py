@@ -29,6 +29,7 @@ import re
 import sys
 import xmlrpclib
 from argparse import ArgumentParser, RawTextHelpFormatter
+from collections import OrderedDict
 
 def handle_cygwinlike_path(cygwin_path_like):
     cygwin_path_like = cygwin_path_like.replace("/cygdrive/c/","")
@@ -42,7 +43,13 @@ def handle_cygwinlike_path(cygwin_path_like):
 __lib_subfolder = "lib"
 sys.path.append(os.path.abspath(__lib_subfolder))  # lib subfolder
 
-from lib.cppstatsutils import logParseProgress
+from analyses import commandline
+from lib import tracing
+from lib.accounting import FileAccounting
+from lib.analysiscontext import AnalysisContext, parseString
+from lib.manifest import returnFileNames
+from lib.progress import Progress
+from lib.srcmlutils import decodeTag
 
 # #################################################
 # external modules
@@ -69,7 +76,6 @@ __listoffeaturesfile = "listoffeatures.csv"
 # namespace-constant for src2srcml
 _cppnscpp = 'http://www.srcML.org/srcML/cpp'
 __cppnsdef = 'http://www.srcML.org/srcML/src'
-__cpprens = re.compile('{(.+)}(.+)')
 
 # conditionals - necessary for parsing the right tags
 __conditionals = ['if', 'ifdef', 'ifndef']
@@ -79,11 +85,6 @@ __conditionals_endif = ['endif']
 __conditionals_all = __conditionals + __conditionals_elif + \
                      __conditionals_else
 __macro_define = ['define']
-__macrofuncs = {}  # functional macros like: "GLIBVERSION(2,3,4)",
-# used as "GLIBVERSION(x,y,z) 100*x+10*y+z"
-__curfile = ''  # current processed xml-file
-__defset = set()  # macro-objects
-__defsetf = dict()  # macro-objects per file
 
 # collected statistics
 class __statsorder(Enum):
@@ -157,52 +158,10 @@ class FeatureLocation:
 # helper functions, constants and errors
 
 
-def returnFileNames(folder, extfilt=['.xml']):
-    '''This function returns all files of the input folder <folder>
-    and its subfolders.'''
-    filesfound = list()
-
-    if os.path.isdir(folder):
-        wqueue = [os.path.abspath(folder)]
-
-        while wqueue:
-            currentfolder = wqueue[0]
-            wqueue = wqueue[1:]
-            foldercontent = os.listdir(currentfolder)
-            tmpfiles = filter(lambda n: os.path.isfile(
-                os.path.join(currentfolder, n)), foldercontent)
-            tmpfiles = filter(lambda n: os.path.splitext(n)[1] in extfilt,
-                              tmpfiles)
-            tmpfiles = map(lambda n: os.path.join(currentfolder, n),
-                           tmpfiles)
-            filesfound += tmpfiles
-            tmpfolders = filter(lambda n: os.path.isdir(
-                os.path.join(currentfolder, n)), foldercontent)
-            tmpfolders = map(lambda n: os.path.join(currentfolder, n),
-                             tmpfolders)
-            wqueue += tmpfolders
-
-    return filesfound
-
-
 ##################################################
 # parsing methods
 
 
-def _collectDefines(d):
-    """This functions adds all defines to a set.
-    e.g. #define FEAT_WIN
-    also #define FEAT_WIN 12
-    but not #define GLIBCVER(x,y,z) ...
-    """
-    __defset.add(d[0])
-    if __defsetf.has_key(__curfile):
-        __defsetf[__curfile].add(d[0])
-    else:
-        __defsetf[__curfile] = set([d[0]])
-    return d
-
-
 # possible operands:
 #   - hexadecimal number
 #   - decimal number
@@ -229,8 +188,10 @@ __integer = \
     pypa.Optional(pypa.Suppress(pypa.Literal('L'))) + \
     pypa.Optional(pypa.Suppress(pypa.Literal('L')))
 
+# the defines are collected by a copy of __identifier per run
+# (see AnalysisContext.identifier)
 __identifier = \
-    pypa.Word(pypa.alphanums + '_' + '-' + '@' + '$').setParseAction(_collectDefines)
+    pypa.Word(pypa.alphanums + '_' + '-' + '@' + '$')
 __arg = pypa.Word(pypa.alphanums + '_')
 __args = __arg + pypa.ZeroOrMore(pypa.Literal(',').suppress() + \
                                  __arg)
@@ -252,7 +213,8 @@ class IfdefEndifMismatchError(Exception):
         return ("Ifdef and endif do not match!")
 
 
-def _parseFeatureSignatureAndRewrite(sig):
+@tracing.traced(category="featurelocations")
+def _parseFeatureSignatureAndRewrite(ctx, sig):
     """This function parses a given feature-signature and rewrites
     the signature according to the given __pt mapping.
     """
@@ -311,7 +273,7 @@ def _parseFeatureSignatureAndRewrite(sig):
         return ret
 
     operand = __string | __hexadec | __integer | \
-              __function | __identifier
+              __function | ctx.identifier(__identifier)
     compoperator = pypa.oneOf('< > <= >= == !=')
     calcoperator = pypa.oneOf('+ - * / & | << >> %')
     expr = pypa.operatorPrecedence(operand, [
@@ -324,7 +286,7 @@ def _parseFeatureSignatureAndRewrite(sig):
     ])
 
     try:
-        rsig = expr.parseString(sig)[0]
+        rsig = parseString(expr, sig)[0]
     except pypa.ParseException, e:
         print('ERROR (parse): cannot parse sig (%s) -- (%s)' %
               (sig, e.col))
@@ -348,7 +310,7 @@ def _collapseSubElementsToList(node):
     return ''.join([it for it in itdesc])
 
 
-def _parseAndAddDefine(node):
+def _parseAndAddDefine(ctx, node):
     """This function extracts the identifier and the corresponding
     expansion from define macros. Later on these are used in conditionals
     in order to make them comparable."""
@@ -360,14 +322,14 @@ def _parseAndAddDefine(node):
     macrodef = pypa.Literal('#define').suppress() + __function + anytext
 
     try:
-        res = macrodef.parseString(define)
+        res = parseString(macrodef, define)
     except pypa.ParseException:
         return
 
     iden = ''.join(map(str, res[0]))
     expn = res[-1]
     para = res[1:-1]
-    __macrofuncs[iden] = (para, expn)
+    ctx.defineMacroFunction(iden, (para, expn))
 
 
 ##################################################
@@ -386,7 +348,7 @@ def _getMacroSignature(ifdefnode):
     # see the srcml.dtd for more information
     nexpr = []
     res = ''
-    _, tag = __cpprens.match(ifdefnode.tag).groups()
+    _, tag = decodeTag(ifdefnode.tag)
 
     # get either the expr or the name tag,
     # which is always the second descendant
@@ -435,7 +397,8 @@ def _getFeatureSignature(condinhist):
     return fsig
 
 
-def _getFeatures(root, featlocations):
+@tracing.traced(category="featurelocations")
+def _getFeatures(ctx, root, featlocations):
     """This function returns all features in the source-file.
     A feature is defined as an enframement of soure-code. The frame
     consists of an ifdef (conditional) and an endif-macro. The function
@@ -514,7 +477,7 @@ def _getFeatures(root, featlocations):
 
     # iterate over all tags separately <start>- and <end>-tag
     for event, elem in etree.iterwalk(root, events=("start", "end")):
-        ns, tag = __cpprens.match(elem.tag).groups()
+        ns, tag = decodeTag(elem.tag)
 
         # handling conditionals
         # hitting on conditional-macro
@@ -560,7 +523,7 @@ def _getFeatures(root, featlocations):
         if ((tag in __macro_define) \
                     and (event == 'end') \
                     and (ns == _cppnscpp)):
-            _parseAndAddDefine(elem)
+            _parseAndAddDefine(ctx, elem)
 
         # iterateting in subtree of conditional-node
         if parcon:
@@ -587,7 +550,7 @@ def _getFeatures(root, featlocations):
 
             # transform feature locations and append them to global list
             for (asig, aselem, aeelem) in featuresgrouter:
-                floc = FeatureLocation(__curfile, aselem.sourceline - 1, aeelem.sourceline - 1,
+                floc = FeatureLocation(ctx.curfile, aselem.sourceline - 1, aeelem.sourceline - 1,
                                        aselem.tag, asig)
                 featlocations.add(floc)
 
@@ -646,20 +609,25 @@ def _prologCSV(folder, file, headings):
 ##################################################
 # main method
 
-def resetModule() :
-    global __macrofuncs, __defset, __defsetf
-    __macrofuncs = {}       # functional macros like: "GLIBVERSION(2,3,4)",
-                            # used as "GLIBVERSION(x,y,z) 100*x+10*y+z"
-    __defset = set()        # macro-objects
-    __defsetf = dict()      # macro-objects per file
+def _getPrintedFileName(file, folder, options):
+    """This function adjusts the file name for the output, if wanted."""
+    if options.filenamesRelative : # relative file name (root is project folder (not included in path))
+        file = os.path.relpath(file, folder)
 
+    if options.filenames == options.FILENAME_SRCML : # cppstats file names
+        pass # nothing to do here, as the file path is the cppstats path by default
+    if options.filenames == options.FILENAME_SOURCE : # source file name
+        file = file.replace(".xml", "").replace("/_cppstats/", "/source/", 1)
+    return file
 
-def apply(folder, options):
+
+def apply(folder, options, stream=None):
     """This function applies the analysis to all xml-files in that
     directory and take the results and joins them together. Results
-    are getting written into the fdcsv-file."""
+    are getting written into the fdcsv-file and, if given, to the
+    ResultStream <stream>."""
     # overall status variables
-    resetModule()
+    ctx = AnalysisContext()
 
     featlocations = set()  # list of feature locations of class FeatureLocation
 
@@ -672,64 +640,79 @@ def apply(folder, options):
     loffhandle, loffwriter = _prologCSV(os.path.join(folder, os.pardir), __listoffeaturesfile, loffheadings)
 
     # preparations for file-loop
-    global __curfile
     files = returnFileNames(folder, ['.xml'])
     files.sort()
     fcount = 0
-    ftotal = len(files)
 
     #TODO rewrite comment! get statistics for all files; write results into csv
     # and merge the features
-    for file in files:
-        if file.startswith("/cygdrive"):
-            file = handle_cygwinlike_path(file)
-
-        __curfile = file
-
-        try:
-            tree = etree.parse(file)
-        except etree.XMLSyntaxError:
-            print("ERROR: cannot parse (%s). Skipping this file." % os.path.join(folder, file))
-            continue
-
-        root = tree.getroot()
-        try:
-            (features, _, _) = _getFeatures(root, featlocations)
-        except IfdefEndifMismatchError:
-            print("ERROR: ifdef-endif mismatch in file (%s)" % (os.path.join(folder, file)))
+    progress = Progress("featurelocations", files, folder, options.progressInterval)
+    accounting = FileAccounting("featurelocations", folder, options)
+    for file in tracing.spans(progress.iterate(files), "file", "featurelocations"):
+        # analyze the file; its results are merged only if it stays
+        # within its budget (see lib/accounting.py)
+        with accounting.account(file, ctx.rollbackFile) as account:
+            if file.startswith("/cygdrive"):
+                file = handle_cygwinlike_path(file)
+
+            ctx.startFile(file)
+
+            try:
+                with tracing.span("parse", "featurelocations"):
+                    tree = etree.parse(file)
+            except etree.XMLSyntaxError:
+                print("ERROR: cannot parse (%s). Skipping this file." % os.path.join(folder, file))
+                progress.count("errors")
+                continue
+
+            root = tree.getroot()
+            flocations = set()  # feature locations of the file
+            try:
+                (features, _, _) = _getFeatures(ctx, root, flocations)
+            except IfdefEndifMismatchError:
+                print("ERROR: ifdef-endif mismatch in file (%s)" % (os.path.join(folder, file)))
+                progress.count("errors")
+                continue
+
+            # parse features and get all defined configuration constants
+            for (sig, (depth, code)) in features.iteritems():
+                psig = _parseFeatureSignatureAndRewrite(ctx, sig)
+
+        if account.skipped:
             continue
 
-        # parse features and get all defined configuration constants
-        for (sig, (depth, code)) in features.iteritems():
-            psig = _parseFeatureSignatureAndRewrite(sig)
+        nlocations = len(featlocations)
+        featlocations |= flocations
 
         # file successfully parsed
         fcount += 1
-        logParseProgress(fcount, ftotal, folder, file)
 
         # print features for this file to list-of-features file
-        featureslist = list(__defsetf[__curfile]) \
-            if __defsetf.has_key(__curfile) else '' # list of features within the current file
+        featureslist = list(ctx.defsetf[ctx.curfile]) \
+            if ctx.defsetf.has_key(ctx.curfile) else '' # list of features within the current file
         listoffeaturesstring = ';'.join(sorted(featureslist)) # sort and join
-        loffwriter.writerow([__curfile, listoffeaturesstring]) # write row to file
+        loffwriter.writerow([ctx.curfile, listoffeaturesstring]) # write row to file
+
+        if stream:
+            stream.fileResult(_getPrintedFileName(ctx.curfile, folder, options), OrderedDict([
+                ("CONSTANTS", sorted(featureslist)),
+                ("locations", len(featlocations) - nlocations)]))
+
+    progress.finish()
+    accounting.report()
+
 
 
     # collect feature locations and consisting used features
     featurelocations = list(featlocations)
     featurelocations.sort(key=lambda x: (x.filename, x.startline))
-    _getFeaturesAtLocations(featurelocations, list(__defset))
+    _getFeaturesAtLocations(featurelocations, list(ctx.defset))
 
     # print each feature location as one line into output file
     for floc in featurelocations:
 
         #adjust file name if wanted
-        if options.filenamesRelative : # relative file name (root is project folder (not included in path))
-            floc.filename = os.path.relpath(floc.filename, folder)
-
-        if options.filenames == options.FILENAME_SRCML : # cppstats file names
-            pass # nothing to do here, as the file path is the cppstats path by default
-        if options.filenames == options.FILENAME_SOURCE : # source file name
-            floc.filename = floc.filename.replace(".xml", "").replace("/_cppstats/", "/source/", 1)
+        floc.filename = _getPrintedFileName(floc.filename, folder, options)
 
         # print floc information to CSV file
         row = floc.getCSVList()
@@ -739,6 +722,11 @@ def apply(folder, options):
     fd.close() # __outputfile
     loffhandle.close() # __listoffeaturesfile
 
+    if stream:
+        stream.projectResult(OrderedDict([
+            ("CONSTANTS", sorted(ctx.defset)),
+            ("locations", len(featurelocations))]))
+
 
 
 # ##################################################
@@ -748,10 +736,12 @@ def addCommandLineOptionsMain(optionparser):
     ''' add command line options for a direct call of this script'''
     optionparser.add_argument("--folder", dest="folder",
                   help="input folder [default=.]", default=".")
+    commandline.addAccountingOptions(optionparser)
+    commandline.addProgressOptions(optionparser)
 
 
 def addCommandLineOptions(optionparser):
-    pass
+    commandline.addFeatureLocationsOptions(optionparser)
 
 
 # ################################################
@@ -761,6 +751,11 @@ def getResultsFile():
     return __outputfile
 
 
+def getResultsFiles(options):
+    '''all files written by the analysis (in the project folder)'''
+    return [__outputfile, __listoffeaturesfile]
+
+
 ##################################################
 if __name__ == '__main__':
 
@@ -30,6 +30,7 @@ import re
 import sys
 import xmlrpclib
 from argparse import ArgumentParser, RawTextHelpFormatter
+from collections import OrderedDict
 
 def handle_cygwinlike_path(cygwin_path_like):
     cygwin_path_like = cygwin_path_like.replace("/cygdrive/c/","")
@@ -44,7 +45,13 @@ def handle_cygwinlike_path(cygwin_path_like):
 __lib_subfolder = "lib"
 sys.path.append(os.path.abspath(__lib_subfolder))  # lib subfolder
 
-from lib.cppstatsutils import logParseProgress
+from analyses import commandline
+from lib import tracing
+from lib.accounting import FileAccounting
+from lib.analysiscontext import AnalysisContext, parseString
+from lib.manifest import returnFileNames
+from lib.progress import Progress
+from lib.srcmlutils import decodeTag, iterConditionals
 
 # #################################################
 # external modules
@@ -77,7 +84,6 @@ __errormatch = []
 # namespace-constant for src2srcml
 __cppnscpp = 'http://www.srcML.org/srcML/cpp'
 __cppnsdef = 'http://www.srcML.org/srcML/src'
-__cpprens = re.compile('{(.+)}(.+)')
 
 # conditionals - necessary for parsing the right tags
 __conditionals = ['if', 'ifdef', 'ifndef']
@@ -87,11 +93,6 @@ __conditionals_endif = ['endif']
 __conditionals_all = __conditionals + __conditionals_elif + \
         __conditionals_else
 __macro_define = ['define']
-__macrofuncs = {}       # functional macros like: "GLIBVERSION(2,3,4)",
-                        # used as "GLIBVERSION(x,y,z) 100*x+10*y+z"
-__curfile = ''          # current processed xml-file
-__defset = set()        # macro-objects
-__defsetf = dict()      # macro-objects per file
 
 # collected statistics
 class __statsorder(Enum):
@@ -128,33 +129,6 @@ class __statsorder(Enum):
 
 ##################################################
 # helper functions, constants and errors
-def returnFileNames(folder, extfilt = ['.xml']):
-    '''This function returns all files of the input folder <folder>
-    and its subfolders.'''
-    filesfound = list()
-
-    if os.path.isdir(folder):
-        wqueue = [os.path.abspath(folder)]
-
-        while wqueue:
-            currentfolder = wqueue[0]
-            wqueue = wqueue[1:]
-            foldercontent = os.listdir(currentfolder)
-            tmpfiles = filter(lambda n: os.path.isfile(
-                    os.path.join(currentfolder, n)), foldercontent)
-            tmpfiles = filter(lambda n: os.path.splitext(n)[1] in extfilt,
-                    tmpfiles)
-            tmpfiles = map(lambda n: os.path.join(currentfolder, n),
-                    tmpfiles)
-            filesfound += tmpfiles
-            tmpfolders = filter(lambda n: os.path.isdir(
-                    os.path.join(currentfolder, n)), foldercontent)
-            tmpfolders = map(lambda n: os.path.join(currentfolder, n),
-                    tmpfolders)
-            wqueue += tmpfolders
-
-    return filesfound
-
 def _flatten(l):
     """This function takes a list as input and returns a flatten version
     of the list. So all nested lists are unpacked and moved up to the
@@ -184,18 +158,21 @@ def dictinvert(d):
     return inv
 
 
-def _collectDefines(d):
-    """This functions adds all defines to a set.
-    e.g. #define FEAT_WIN
-    also #define FEAT_WIN 12
-    but not #define GLIBCVER(x,y,z) ...
-    """
-    __defset.add(d[0])
-    if __defsetf.has_key(__curfile):
-        __defsetf[__curfile].add(d[0])
-    else:
-        __defsetf[__curfile] = set([d[0]])
-    return d
+class _GeneralContext(AnalysisContext):
+    '''The state of one run of the analysis (see AnalysisContext).'''
+
+    def __init__(self):
+        AnalysisContext.__init__(self)
+        self.nestedIfdefsLevels = []
+        self.nestedIfdefsLevelsAtStart = 0
+
+    def startFile(self, curfile):
+        AnalysisContext.startFile(self, curfile)
+        self.nestedIfdefsLevelsAtStart = len(self.nestedIfdefsLevels)
+
+    def rollbackFile(self):
+        AnalysisContext.rollbackFile(self)
+        del self.nestedIfdefsLevels[self.nestedIfdefsLevelsAtStart:]
 
 
 # possible operands:
@@ -224,8 +201,10 @@ __integer = \
         pypa.Optional(pypa.Suppress(pypa.Literal('L'))) + \
         pypa.Optional(pypa.Suppress(pypa.Literal('L')))
 
+# the defines are collected by a copy of __identifier per run
+# (see AnalysisContext.identifier)
 __identifier = \
-        pypa.Word(pypa.alphanums+'_'+'-'+'@'+'$').setParseAction(_collectDefines)
+        pypa.Word(pypa.alphanums+'_'+'-'+'@'+'$')
 __arg = pypa.Word(pypa.alphanums+'_')
 __args = __arg + pypa.ZeroOrMore(pypa.Literal(',').suppress() + \
         __arg)
@@ -259,7 +238,7 @@ def _collapseSubElementsToList(node):
     return ''.join([it for it in itdesc])
 
 
-def _parseFeatureSignatureAndRewriteCSP(sig):
+def _parseFeatureSignatureAndRewriteCSP(ctx, sig):
     """This function parses a given feature-expresson and
     rewrites the expression according to the given __pt mapping.
     This one is used to make use of a csp solver without using
@@ -306,7 +285,7 @@ def _parseFeatureSignatureAndRewriteCSP(sig):
         return ret
 
     operand = __hexadec | __integer | __string | \
-            __function | __identifier
+            __function | ctx.identifier(__identifier)
     compoperator = pypa.oneOf('< > <= >= == !=')
     calcoperator = pypa.oneOf('+ - * / & | << >> %')
     expr = pypa.operatorPrecedence(operand, [
@@ -319,7 +298,7 @@ def _parseFeatureSignatureAndRewriteCSP(sig):
     ])
 
     try:
-        rsig = expr.parseString(sig)[0]
+        rsig = parseString(expr, sig)[0]
     except pypa.ParseException, e:
         print >> sys.stderr, 'ERROR (parse): cannot parse sig (%s) -- (%s)' \
             % (sig, e.col)
@@ -330,7 +309,8 @@ def _parseFeatureSignatureAndRewriteCSP(sig):
     return (mal, ''.join(rsig))
 
 
-def _parseFeatureSignatureAndRewrite(sig):
+@tracing.traced(category="general")
+def _parseFeatureSignatureAndRewrite(ctx, sig):
     """This function parses a given feature-signature and rewrites
     the signature according to the given __pt mapping.
     """
@@ -389,7 +369,7 @@ def _parseFeatureSignatureAndRewrite(sig):
         return ret
 
     operand = __string | __hexadec | __integer | \
-            __function | __identifier
+            __function | ctx.identifier(__identifier)
     compoperator = pypa.oneOf('< > <= >= == !=')
     calcoperator = pypa.oneOf('+ - * / & | << >> %')
     expr = pypa.operatorPrecedence(operand, [
@@ -402,7 +382,7 @@ def _parseFeatureSignatureAndRewrite(sig):
     ])
 
     try:
-        rsig = expr.parseString(sig)[0]
+        rsig = parseString(expr, sig)[0]
     except pypa.ParseException, e:
         print 'ERROR (parse): cannot parse sig (%s) -- (%s)' % (sig, e.col,)
         return sig
@@ -427,7 +407,7 @@ def _getMacroSignature(ifdefnode):
     # see the srcml.dtd for more information
     nexpr = []
     res = ''
-    _, tag = __cpprens.match(ifdefnode.tag).groups()
+    _, tag = decodeTag(ifdefnode.tag)
 
     # get either the expr or the name tag,
     # which is always the second descendant
@@ -451,16 +431,16 @@ def _prologCSV(folder, file, headings, delimiter = ","):
     return (fd, fdcsv)
 
 
-__nestedIfdefsLevels = []
-def _countNestedIfdefs(root):
+def _countNestedIfdefs(ctx, root):
     """This function counts the number of nested ifdefs (conditionals)
     within the source-file."""
     cncur = 0
     cnlist = []
-    elements = [it for it in root.iterdescendants()]
+    elements = iterConditionals(root, __conditionals + __conditionals_endif,
+            __cppnscpp)
 
     for elem in elements:
-        ns, tag = __cpprens.match(elem.tag).groups()
+        ns, tag = decodeTag(elem.tag)
         if ((tag in __conditionals_endif)
                 and (ns == __cppnscpp)): cncur -= 1
         if ((tag in __conditionals)
@@ -471,7 +451,7 @@ def _countNestedIfdefs(root):
     if (len(cnlist) > 0):
         nnimax = max(cnlist)
         nnitmp = filter(lambda n: n > 0, cnlist)
-        __nestedIfdefsLevels.append(nnitmp)
+        ctx.nestedIfdefsLevels.append(nnitmp)
         nnimean = pstat.stats.lmean(nnitmp)
     else:
         nnimax = 0
@@ -524,7 +504,7 @@ def _getASTHistory(node):
     asth = []
 
     for anc in ancs:
-        _, tag = __cpprens.match(anc.tag).groups()
+        _, tag = decodeTag(anc.tag)
         asth.append(tag)
     return asth
 
@@ -541,12 +521,12 @@ def _getASTFuture(node):
 
     desh = []
     for des in dess:
-        _, tag = __cpprens.match(des.tag).groups()
+        _, tag = decodeTag(des.tag)
         desh.append(tag)
     return desh
 
 
-def _parseAndAddDefine(node):
+def _parseAndAddDefine(ctx, node):
     """This function extracts the identifier and the corresponding
     expansion from define macros. Later on these are used in conditionals
     in order to make them comparable."""
@@ -557,17 +537,18 @@ def _parseAndAddDefine(node):
     macrodef = pypa.Literal('#define').suppress() + __function + anytext
 
     try:
-        res = macrodef.parseString(define)
+        res = parseString(macrodef, define)
     except pypa.ParseException:
         return
 
     iden = ''.join(map(str, res[0]))
     expn = res[-1]
     para = res[1:-1]
-    __macrofuncs[iden] = (para, expn)
+    ctx.defineMacroFunction(iden, (para, expn))
 
 
-def _getFeatures(root, options):
+@tracing.traced(category="general")
+def _getFeatures(ctx, root, options):
     """This function returns all features in the source-file.
     A feature is defined as an enframement of soure-code. The frame
     consists of an ifdef (conditional) and an endif-macro. The function
@@ -640,7 +621,7 @@ def _getFeatures(root, options):
 
     # iterate over all tags separately <start>- and <end>-tag
     for event, elem in etree.iterwalk(root, events=("start", "end")):
-        ns, tag = __cpprens.match(elem.tag).groups()
+        ns, tag = decodeTag(elem.tag)
 
         # handling conditionals
         # hitting on conditional-macro
@@ -684,7 +665,7 @@ def _getFeatures(root, options):
         if ((tag in __macro_define) \
                 and (event == 'end') \
                 and (ns == __cppnscpp)):
-            _parseAndAddDefine(elem)
+            _parseAndAddDefine(ctx, elem)
 
         # iterateting in subtree of conditional-node
         if parcon:
@@ -947,6 +928,7 @@ def _getFeaturesDepthOne(features):
     return nof1
 
 
+@tracing.traced(category="general")
 def _distinguishFeatures(features):
     """This function returns a tuple with dicts, each holding
     one type of feature. The determination is according to the
@@ -1013,7 +995,7 @@ def _distinguishFeatures(features):
     return (scode, deriv, desc, het, hom, hethom)
 
 
-def _getNumOfDefines(defset):
+def _getNumOfDefines(ctx, defset):
     """This method returns the number of defines, that have the following
     structure:
     #define FEAT_A
@@ -1023,15 +1005,16 @@ def _getNumOfDefines(defset):
     #define CHECKVERSION(x,y,z) x*100+y*10+z
     All determined elements are derived from the ifdef macros.
     """
-    # basic operation of this function is to check __defset against
-    # __macrofuncs
-    funcmacros = __macrofuncs.keys()
+    # basic operation of this function is to check the defines against
+    # the macro functions
+    funcmacros = ctx.macrofuncs.keys()
     funcmacros = map(lambda n: n.split('(')[0], funcmacros)
     funcmacros = set(funcmacros)
 
     return len((defset - funcmacros))
 
 
+@tracing.traced(category="general")
 def _getScatteringTanglingDegrees(sigs, defines):
     """This method returns the mean and the standard-deviation of
     defines according to the given mapping of a define to occurances
@@ -1135,6 +1118,14 @@ def __getNumOfFilesPerFeatureStats(filetofeatureconstants):
     return (numbersmean,numbersstd)
 
 
+def _getStatsResults(stats):
+    """This function returns the given row of statistics as dict for the
+    result stream; columns without a value are left out."""
+    return OrderedDict((name, value) for (name, value)
+            in zip(__statsorder.__members__.keys(), stats)
+            if name != __statsorder.FILENAME.name and value is not None)
+
+
 def _checkForEquivalentSig(l, sig):
     """This method takes a list of signatures and checks sig for an
     equivalent signature. If no equivalent signature is found this
@@ -1158,31 +1149,30 @@ def _checkForEquivalentSig(l, sig):
     raise NoEquivalentSigError()
 
 
-def resetModule() :
-    global __macrofuncs, __defset, __defsetf, __nestedIfdefsLevels
-    __macrofuncs = {}       # functional macros like: "GLIBVERSION(2,3,4)",
-                            # used as "GLIBVERSION(x,y,z) 100*x+10*y+z"
-    __defset = set()        # macro-objects
-    __defsetf = dict()      # macro-objects per file
-    __nestedIfdefsLevels = []
-
-
-def apply(folder, options):
+def apply(folder, options, stream=None):
     """This function applies the analysis to all xml-files in that
     directory and take the results and joins them together. Results
-    are getting written into the fdcsv-file."""
+    are getting written into the fdcsv-file and, if given, to the
+    ResultStream <stream>."""
     # overall status variables
-    resetModule()
+    ctx = _GeneralContext()
 
     sigmap = {}                # {<converted sig>: [<equivalent sigs>]}
     afeatures = {}            # identified features; {<sig>: (depth, [code])}
 
-    def _mergeFeatures(ffeatures):
-        """This function merges the, with the parameter given
-        dictionary (ffeatures) to the afeatures (overall-features)."""
-        for (sig, (depth, code)) in ffeatures.iteritems():
-            psig = _parseFeatureSignatureAndRewrite(sig)
+    def _parseFeatures(ffeatures):
+        """This function parses the signatures of the, with the parameter
+        given dictionary (ffeatures) for _mergeFeatures; returns a list of
+        (sig, psig, depth, code)."""
+        return [(sig, _parseFeatureSignatureAndRewrite(ctx, sig), depth, code)
+                for (sig, (depth, code)) in ffeatures.iteritems()]
 
+    @tracing.traced("merge", "general")
+    def _mergeFeatures(pfeatures):
+        """This function merges the, with the parameter given
+        list of parsed features (see _parseFeatures) to the afeatures
+        (overall-features)."""
+        for (sig, psig, depth, code) in pfeatures:
             try:
                 sigmatch = _checkForEquivalentSig(sigmap.keys(), psig)
                 (tmpdepth, tmpcode) = afeatures[sigmap[sigmatch][0]]
@@ -1203,91 +1193,107 @@ def apply(folder, options):
     fd, fdcsv = _prologCSV(os.path.join(folder, os.pardir), __outputfile, __statsorder.__members__.keys())
     # fdfeat = open(os.path.join(folder, __outputfexp), 'w')
 
-    global __curfile
     fcount = 0
     files = returnFileNames(folder, ['.xml'])
     files.sort()
     fstats = [None]*len(__statsorder)
-    ftotal = len(files)
 
     # get statistics for all files; write results into csv
     # and merge the features
-    for file in files:
-        if file.startswith("/cygdrive"):
-            file = handle_cygwinlike_path(file)
+    progress = Progress("general", files, folder, options.progressInterval)
+    accounting = FileAccounting("general", folder, options)
+    for file in tracing.spans(progress.iterate(files), "file", "general"):
+        # analyze the file; its results are merged only if it stays
+        # within its budget (see lib/accounting.py)
+        with accounting.account(file, ctx.rollbackFile) as account:
+            if file.startswith("/cygdrive"):
+                file = handle_cygwinlike_path(file)
 
-        __curfile = file
+            ctx.startFile(file)
 
 
-        try:
-            tree = etree.parse(file)
-        except etree.XMLSyntaxError:
-            print("ERROR: cannot parse (%s). Skipping this file." % os.path.join(folder, file))
-            continue
+            try:
+                with tracing.span("parse", "general"):
+                    tree = etree.parse(file)
+            except etree.XMLSyntaxError:
+                print("ERROR: cannot parse (%s). Skipping this file." % os.path.join(folder, file))
+                progress.count("errors")
+                continue
+
+            root = tree.getroot()
+            try:
+                (features, _, featuresgrouter) = _getFeatures(ctx, root, options)
+            except IfdefEndifMismatchError:
+                print("ERROR: ifdef-endif mismatch in file (%s)" % (os.path.join(folder, file)))
+                progress.count("errors")
+                continue
+
+            pfeatures = _parseFeatures(features)
+
+            # granularity stats
+            grouter = _getOuterGranularity(featuresgrouter)
+            (gotopbgr, gofunbgr, gostrbrl, gostrbrg,
+            goinnbgr, goexpbgr, gostmbgr, gopambgr, goerror) = \
+                    _getOuterGranularityStats(grouter)
+            fstats[__statsorder.GRANGL.value] = gotopbgr
+            fstats[__statsorder.GRANFL.value] = gofunbgr+gostrbrl+gostrbrg
+            fstats[__statsorder.GRANBL.value] = goinnbgr
+            fstats[__statsorder.GRANEL.value] = goexpbgr
+            fstats[__statsorder.GRANSL.value] = gostmbgr
+            fstats[__statsorder.GRANML.value] = gopambgr
+            fstats[__statsorder.GRANERR.value] = goerror
+
+            #adjust file name if wanted
+            if options.filenamesRelative : # relative file name (root is project folder (not included in path))
+                file = os.path.relpath(file, folder)
+
+            if options.filenames == options.FILENAME_SRCML : # cppstats file names
+                pass # nothing to do here, as the file path is the cppstats path by default
+            if options.filenames == options.FILENAME_SOURCE : # source file name
+                file = file.replace(".xml", "").replace("/_cppstats/", "/source/", 1)
+
+            # general stats
+            fstats[__statsorder.FILENAME.value] = file
+            (ndmax, andavg, andstdev) = _countNestedIfdefs(ctx, root)
+            fstats[__statsorder.ANDAVG.value] = andavg
+            fstats[__statsorder.ANDSTDEV.value] = andstdev
+            fstats[__statsorder.NDMAX.value] = ndmax
+            tmp = [it for it in root.iterdescendants()]
+
+            if (len(tmp)): floc = tmp[-1].sourceline
+            else: floc = 0
+
+            fstats[__statsorder.LOC.value] = floc
+
+            # feature-amount
+            (_, _, lof, _, _, _, _) = \
+                    _getFeatureStats(features)
+            if ctx.defsetf.has_key(ctx.curfile):
+                fstats[__statsorder.NOFC.value] = \
+                        _getNumOfDefines(ctx, ctx.defsetf[ctx.curfile])
+            else:
+                fstats[__statsorder.NOFC.value] = 0
+            fstats[__statsorder.LOF.value] = lof
+
+            # scattering and tangling
+            # not useful to compute the scattering per file, since a feature names
+            # may be defined later
 
-        root = tree.getroot()
-        try:
-            (features, _, featuresgrouter) = _getFeatures(root, options)
-        except IfdefEndifMismatchError:
-            print("ERROR: ifdef-endif mismatch in file (%s)" % (os.path.join(folder, file)))
+        if account.skipped:
             continue
 
-        _mergeFeatures(features)
+        _mergeFeatures(pfeatures)
 
         # file successfully parsed
         fcount += 1
-        logParseProgress(fcount, ftotal, folder, file)
-
-        # granularity stats
-        grouter = _getOuterGranularity(featuresgrouter)
-        (gotopbgr, gofunbgr, gostrbrl, gostrbrg,
-        goinnbgr, goexpbgr, gostmbgr, gopambgr, goerror) = \
-                _getOuterGranularityStats(grouter)
-        fstats[__statsorder.GRANGL.value] = gotopbgr
-        fstats[__statsorder.GRANFL.value] = gofunbgr+gostrbrl+gostrbrg
-        fstats[__statsorder.GRANBL.value] = goinnbgr
-        fstats[__statsorder.GRANEL.value] = goexpbgr
-        fstats[__statsorder.GRANSL.value] = gostmbgr
-        fstats[__statsorder.GRANML.value] = gopambgr
-        fstats[__statsorder.GRANERR.value] = goerror
-
-        #adjust file name if wanted
-        if options.filenamesRelative : # relative file name (root is project folder (not included in path))
-            file = os.path.relpath(file, folder)
-
-        if options.filenames == options.FILENAME_SRCML : # cppstats file names
-            pass # nothing to do here, as the file path is the cppstats path by default
-        if options.filenames == options.FILENAME_SOURCE : # source file name
-            file = file.replace(".xml", "").replace("/_cppstats/", "/source/", 1)
-
-        # general stats
-        fstats[__statsorder.FILENAME.value] = file
-        (ndmax, andavg, andstdev) = _countNestedIfdefs(root)
-        fstats[__statsorder.ANDAVG.value] = andavg
-        fstats[__statsorder.ANDSTDEV.value] = andstdev
-        fstats[__statsorder.NDMAX.value] = ndmax
-        tmp = [it for it in root.iterdescendants()]
-
-        if (len(tmp)): floc = tmp[-1].sourceline
-        else: floc = 0
-
-        fstats[__statsorder.LOC.value] = floc
-
-        # feature-amount
-        (_, _, lof, _, _, _, _) = \
-                _getFeatureStats(features)
-        if __defsetf.has_key(__curfile):
-            fstats[__statsorder.NOFC.value] = \
-                    _getNumOfDefines(__defsetf[__curfile])
-        else:
-            fstats[__statsorder.NOFC.value] = 0
-        fstats[__statsorder.LOF.value] = lof
-
-        # scattering and tangling
-        # not useful to compute the scattering per file, since a feature names
-        # may be defined later
 
         fdcsv.writerow(fstats)
+        if stream:
+            stream.fileResult(file, _getStatsResults(fstats))
+
+    progress.finish()
+    accounting.report()
+
 
 
     # writing convinience functions
@@ -1355,12 +1361,12 @@ def apply(folder, options):
 
     # SDEG + TDEG
     sigs = _flatten(sigmap.values())
-    defs = list(__defset)
+    defs = list(ctx.defset)
     (sdegmean, sdegstd, tdegmean, tdegstd) = \
         _getScatteringTanglingDegrees(sigs,defs)
 
     # ANDAVG + ANDSTDEV
-    nestedIfdefsLevels = _flatten(__nestedIfdefsLevels)
+    nestedIfdefsLevels = _flatten(ctx.nestedIfdefsLevels)
     if (len(nestedIfdefsLevels)):
         nnimean = pstat.stats.lmean(nestedIfdefsLevels)
     else:
@@ -1374,11 +1380,11 @@ def apply(folder, options):
     (_, _, _, het, hom, hethom) = _distinguishFeatures(afeatures)
 
     # NOFPFCMEAN, NOFPFCSTD
-    (nofpfcmean, nofpfcstd) = __getNumOfFilesPerFeatureStats(__defsetf)
+    (nofpfcmean, nofpfcstd) = __getNumOfFilesPerFeatureStats(ctx.defsetf)
 
     # write data
     astats[__statsorder.FILENAME.value] = "ALL - MERGED"
-    astats[__statsorder.NOFC.value] = _getNumOfDefines(__defset)
+    astats[__statsorder.NOFC.value] = _getNumOfDefines(ctx, ctx.defset)
     astats[__statsorder.LOF.value] = lof
     astats[__statsorder.ANDAVG.value] = nnimean
     astats[__statsorder.ANDSTDEV.value] = nnistd
@@ -1395,6 +1401,9 @@ def apply(folder, options):
     fdcsv.writerow(astats)
     fd.close()
 
+    if stream:
+        stream.projectResult(_getStatsResults(astats))
+
 
 # ##################################################
 # add command line options
@@ -1403,17 +1412,12 @@ def addCommandLineOptionsMain(optionparser):
     ''' add command line options for a direct call of this script'''
     optionparser.add_argument("--folder", dest="folder",
         help="input folder [default=%(default)s]", default=".")
+    commandline.addAccountingOptions(optionparser)
+    commandline.addProgressOptions(optionparser)
 
 
-def addCommandLineOptions(optionparser) :
-    # TODO implement CSP solving?
-    # optionparser.add_option("--csp", dest="csp", action="store_true",
-    # default=False, help="make use of csp solver to check " \
-    # "feature expression equality [default=False]")
-    # optionparser.add_option("--str", dest="str", action="store_true",
-    #     default=True, help="make use of simple string comparision " \
-    #     "for checking feature expression equality [default=True]")
-    pass
+def addCommandLineOptions(optionparser):
+    commandline.addGeneralOptions(optionparser)
 
 
 # ################################################
@@ -1423,6 +1427,11 @@ def getResultsFile():
     return __outputfile
 
 
+def getResultsFiles(options):
+    '''all files written by the analysis (in the project folder)'''
+    return [__outputfile]
+
+
 ##################################################
 if __name__ == '__main__':
 
@@ -38,7 +38,13 @@ from collections import OrderedDict
 __lib_subfolder = "lib"
 sys.path.append(os.path.abspath(__lib_subfolder))  # lib subfolder
 
-from lib.cppstatsutils import logParseProgress
+from analyses import commandline
+from lib import tracing
+from lib.accounting import FileAccounting
+from lib.analysiscontext import AnalysisContext, parseString
+from lib.manifest import returnFileNames
+from lib.progress import Progress
+from lib.srcmlutils import decodeTag, iterConditionals
 
 # #################################################
 # external modules
@@ -69,7 +75,6 @@ __errormatch = []
 # namespace-constant for src2srcml
 __cppnscpp = 'http://www.srcML.org/srcML/cpp'
 __cppnsdef = 'http://www.srcML.org/srcML/src'
-__cpprens = re.compile('{(.+)}(.+)')
 
 # conditionals - necessary for parsing the right tags
 __conditionals = ['if', 'ifdef', 'ifndef']
@@ -81,11 +86,6 @@ __conditionals_all = __conditionals + __conditionals_elif + \
 __conditionals_ending = __conditionals_elif + __conditionals_else + \
                         __conditionals_endif
 __macro_define = ['define']
-__macrofuncs = {}       # functional macros like: "GLIBVERSION(2,3,4)",
-                        # used as "GLIBVERSION(x,y,z) 100*x+10*y+z"
-__curfile = ''          # current processed xml-file
-__defset = set()        # macro-objects
-__defsetf = dict()      # macro-objects per file
 
 ##################################################
 
@@ -93,34 +93,6 @@ __defsetf = dict()      # macro-objects per file
 
 ##################################################
 # helper functions, constants and errors
-def returnFileNames(folder, extfilt = ['.xml']):
-    '''This function returns all files of the input folder <folder>
-    and its subfolders.'''
-    filesfound = list()
-
-    if os.path.isdir(folder):
-        wqueue = [os.path.abspath(folder)]
-
-        while wqueue:
-            currentfolder = wqueue[0]
-            wqueue = wqueue[1:]
-            foldercontent = os.listdir(currentfolder)
-            tmpfiles = filter(lambda n: os.path.isfile(
-                    os.path.join(currentfolder, n)), foldercontent)
-            tmpfiles = filter(lambda n: os.path.splitext(n)[1] in extfilt,
-                    tmpfiles)
-            tmpfiles = map(lambda n: os.path.join(currentfolder, n),
-                    tmpfiles)
-            filesfound += tmpfiles
-            tmpfolders = filter(lambda n: os.path.isdir(
-                    os.path.join(currentfolder, n)), foldercontent)
-            tmpfolders = map(lambda n: os.path.join(currentfolder, n),
-                    tmpfolders)
-            wqueue += tmpfolders
-
-    return filesfound
-
-
 def _prologCSV(folder, file, headings, delimiter = ","):
     """prolog of the CSV-output file
     no corresponding _epilogCSV."""
@@ -148,18 +120,24 @@ def _flatten(l):
     return l
 
 
-def _collectDefines(d):
-    """This functions adds all defines to a set.
-    e.g. #define FEAT_WIN
-    also #define FEAT_WIN 12
-    but not #define GLIBCVER(x,y,z) ...
-    """
-    __defset.add(d[0])
-    if __defsetf.has_key(__curfile):
-        __defsetf[__curfile].add(d[0])
-    else:
-        __defsetf[__curfile] = set([d[0]])
-    return d
+class _GeneralValuesContext(AnalysisContext):
+    '''The state of one run of the analysis (see AnalysisContext).'''
+
+    def __init__(self):
+        AnalysisContext.__init__(self)
+        self.nestedIfdefsLevels = []
+        self.nestingDepthsOfBranches = []
+        self.lengthsAtStart = (0, 0)
+
+    def startFile(self, curfile):
+        AnalysisContext.startFile(self, curfile)
+        self.lengthsAtStart = (len(self.nestedIfdefsLevels), len(self.nestingDepthsOfBranches))
+
+    def rollbackFile(self):
+        AnalysisContext.rollbackFile(self)
+        (nlevels, nbranches) = self.lengthsAtStart
+        del self.nestedIfdefsLevels[nlevels:]
+        del self.nestingDepthsOfBranches[nbranches:]
 
 
 # possible operands:
@@ -188,8 +166,10 @@ __integer = \
         pypa.Optional(pypa.Suppress(pypa.Literal('L'))) + \
         pypa.Optional(pypa.Suppress(pypa.Literal('L')))
 
+# the defines are collected by a copy of __identifier per run
+# (see AnalysisContext.identifier)
 __identifier = \
-        pypa.Word(pypa.alphanums+'_'+'-'+'@'+'$').setParseAction(_collectDefines)
+        pypa.Word(pypa.alphanums+'_'+'-'+'@'+'$')
 __arg = pypa.Word(pypa.alphanums+'_')
 __args = __arg + pypa.ZeroOrMore(pypa.Literal(',').suppress() + \
         __arg)
@@ -223,7 +203,8 @@ def _collapseSubElementsToList(node):
     return ''.join([it for it in itdesc])
 
 
-def _parseFeatureSignatureAndRewrite(sig):
+@tracing.traced(category="generalvalues")
+def _parseFeatureSignatureAndRewrite(ctx, sig):
     """This function parses a given feature-signature and rewrites
     the signature according to the given __pt mapping.
     """
@@ -282,7 +263,7 @@ def _parseFeatureSignatureAndRewrite(sig):
         return ret
 
     operand = __string | __hexadec | __integer | \
-            __function | __identifier
+            __function | ctx.identifier(__identifier)
     compoperator = pypa.oneOf('< > <= >= == !=')
     calcoperator = pypa.oneOf('+ - * / & | << >> %')
     expr = pypa.operatorPrecedence(operand, [
@@ -295,7 +276,7 @@ def _parseFeatureSignatureAndRewrite(sig):
     ])
 
     try:
-        rsig = expr.parseString(sig)[0]
+        rsig = parseString(expr, sig)[0]
     except pypa.ParseException, e:
         print 'ERROR (parse): cannot parse sig (%s) -- (%s)' % (sig, e.col,)
         return sig
@@ -320,7 +301,7 @@ def _getMacroSignature(ifdefnode):
     # see the srcml.dtd for more information
     nexpr = []
     res = ''
-    _, tag = __cpprens.match(ifdefnode.tag).groups()
+    _, tag = decodeTag(ifdefnode.tag)
 
     # get either the expr or the name tag,
     # which is always the second descendant
@@ -377,7 +358,7 @@ def _getFeatureSignature(condinhist, options):
     return fsig
 
 
-def _parseAndAddDefine(node):
+def _parseAndAddDefine(ctx, node):
     """This function extracts the identifier and the corresponding
     expansion from define macros. Later on these are used in conditionals
     in order to make them comparable."""
@@ -388,17 +369,18 @@ def _parseAndAddDefine(node):
     macrodef = pypa.Literal('#define').suppress() + __function + anytext
 
     try:
-        res = macrodef.parseString(define)
+        res = parseString(macrodef, define)
     except pypa.ParseException:
         return
 
     iden = ''.join(map(str, res[0]))
     expn = res[-1]
     para = res[1:-1]
-    __macrofuncs[iden] = (para, expn)
+    ctx.defineMacroFunction(iden, (para, expn))
 
 
-def _getFeatures(root, options):
+@tracing.traced(category="generalvalues")
+def _getFeatures(ctx, root, options):
     """This function returns all features in the source-file.
     A feature is defined as an enframement of soure-code. The frame
     consists of an ifdef (conditional) and an endif-macro. The function
@@ -474,7 +456,7 @@ def _getFeatures(root, options):
 
     # iterate over all tags separately <start>- and <end>-tag
     for event, elem in etree.iterwalk(root, events=("start", "end")):
-        ns, tag = __cpprens.match(elem.tag).groups()
+        ns, tag = decodeTag(elem.tag)
 
         # handling conditionals
         # hitting on conditional-macro
@@ -525,7 +507,7 @@ def _getFeatures(root, options):
         if ((tag in __macro_define) \
                 and (event == 'end') \
                 and (ns == __cppnscpp)):
-            _parseAndAddDefine(elem)
+            _parseAndAddDefine(ctx, elem)
 
         # iterateting in subtree of conditional-node
         if parcon:
@@ -577,20 +559,17 @@ def _getFeatures(root, options):
     return (features, featuresgrinner, featuresgrouter, elses)
 
 
-__nestedIfdefsLevels = []
-__nestingDepthsOfBranches = []
-def _getNestingDepths(root):
+def _getNestingDepths(ctx, root):
     """This function counts the number of nested ifdefs (conditionals)
     within the source-file in two different ways.
      1) the nesting depth of each #ifdef block (nested or not nested, one value for #if/#elif/#else branches)
-        __nestedIfdefsLevels = [int]
+        ctx.nestedIfdefsLevels = [int]
      2) the nesting depth of each top-level (non-nested) branch (#if/#elif/#else) separately
-        __nestingDepthsOfBranches = [(file path, xml element, feature signature, maximum nesting of this element)]
+        ctx.nestingDepthsOfBranches = [(file path, xml element, feature signature, maximum nesting of this element)]
     """
 
-    global __curfile, __nestedIfdefsLevels, __nestingDepthsOfBranches
-
-    elements = [it for it in root.iterdescendants()]
+    elements = iterConditionals(root, __conditionals_all + __conditionals_endif,
+            __cppnscpp)
 
     cncur = 0
     cnmax = -1
@@ -602,7 +581,7 @@ def _getNestingDepths(root):
     sighist = []
 
     for elem in elements:
-        ns, tag = __cpprens.match(elem.tag).groups()
+        ns, tag = decodeTag(elem.tag)
 
         # if a branch ends somehow
         if ((tag in __conditionals_ending)
@@ -646,11 +625,11 @@ def _getNestingDepths(root):
                     #FIXME how to do this if rewriting is enabled?!
 
                     newsig = ['!(' + xsig + ')' for (_, _, xsig, _) in sigblockhist]
-                    sigblockhist.append((__curfile, elem, " && ".join(newsig), -1))
+                    sigblockhist.append((ctx.curfile, elem, " && ".join(newsig), -1))
 
                 else:
 
-                    sigblockhist.append((__curfile, elem, _getMacroSignature(elem), -1))
+                    sigblockhist.append((ctx.curfile, elem, _getMacroSignature(elem), -1))
 
             # calculate current max of this branch
             cnmax = max(cnmax, cncur)
@@ -660,11 +639,12 @@ def _getNestingDepths(root):
 
     if (len(cnlist) > 0):
         nnitmp = filter(lambda n: n > 0, cnlist)
-        __nestedIfdefsLevels += nnitmp
+        ctx.nestedIfdefsLevels += nnitmp
 
-    __nestingDepthsOfBranches += sighist
+    ctx.nestingDepthsOfBranches += sighist
 
 
+@tracing.traced(category="generalvalues")
 def _getScatteringTanglingValues(sigs, defines):
     """This method returns the scattering and tangling VALUES of
     defines according to the given mapping of a define to occurances
@@ -716,33 +696,43 @@ def _checkForEquivalentSig(l, sig):
     raise NoEquivalentSigError()
 
 
-def resetModule() :
-    global __macrofuncs, __defset, __defsetf, __nestedIfdefsLevels, __nestingDepthsOfBranches
-    __macrofuncs = {}       # functional macros like: "GLIBVERSION(2,3,4)",
-                            # used as "GLIBVERSION(x,y,z) 100*x+10*y+z"
-    __defset = set()        # macro-objects
-    __defsetf = dict()      # macro-objects per file
-    __nestedIfdefsLevels = []
-    __nestingDepthsOfBranches = []
+def _getPrintedFileName(file, folder, options):
+    """This function adjusts the file name for the output, if wanted."""
+    if options.filenamesRelative : # relative file name (root is project folder (not included in path))
+        file = os.path.relpath(file, folder)
+
+    if options.filenames == options.FILENAME_SRCML : # cppstats file names
+        pass # nothing to do here, as the file path is the cppstats path by default
+    if options.filenames == options.FILENAME_SOURCE : # source file name
+        file = file.replace(".xml", "").replace("/_cppstats/", "/source/", 1)
+    return file
 
 
-def apply(folder, options):
+def apply(folder, options, stream=None):
 
     """This function applies the analysis to all xml-files in that
     directory and take the results and joins them together. Results
-    are getting written into the fdcsv-file."""
+    are getting written into the fdcsv-file and, if given, to the
+    ResultStream <stream>."""
     # overall status variables
-    resetModule()
+    ctx = _GeneralValuesContext()
 
     sigmap = {}                # {<converted sig>: [<equivalent sigs>]}
     afeatures = {}            # identified features; {<sig>: (depth, [code])}
 
-    def _mergeFeatures(ffeatures):
-        """This function merges the, with the parameter given
-        dictionary (ffeatures) to the afeatures (overall-features)."""
-        for (sig, (depth, code)) in ffeatures.iteritems():
-            psig = _parseFeatureSignatureAndRewrite(sig)
+    def _parseFeatures(ffeatures):
+        """This function parses the signatures of the, with the parameter
+        given dictionary (ffeatures) for _mergeFeatures; returns a list of
+        (sig, psig, depth, code)."""
+        return [(sig, _parseFeatureSignatureAndRewrite(ctx, sig), depth, code)
+                for (sig, (depth, code)) in ffeatures.iteritems()]
 
+    @tracing.traced("merge", "generalvalues")
+    def _mergeFeatures(pfeatures):
+        """This function merges the, with the parameter given
+        list of parsed features (see _parseFeatures) to the afeatures
+        (overall-features)."""
+        for (sig, psig, depth, code) in pfeatures:
             try:
                 sigmatch = _checkForEquivalentSig(sigmap.keys(), psig)
                 (tmpdepth, tmpcode) = afeatures[sigmap[sigmatch][0]]
@@ -760,49 +750,70 @@ def apply(folder, options):
                 sigmap[psig] = [sig]
 
 
-    global __curfile
     fcount = 0
     files = returnFileNames(folder, ['.xml'])
     files.sort()
-    ftotal = len(files)
 
     # get statistics for all files
     # and merge the features
-    for file in files:
-        __curfile = file
-
-        try:
-            tree = etree.parse(file)
-        except etree.XMLSyntaxError:
-            print("ERROR: cannot parse (%s). Skipping this file." % os.path.join(folder, file))
-            continue
+    progress = Progress("generalvalues", files, folder, options.progressInterval)
+    accounting = FileAccounting("generalvalues", folder, options)
+    for file in tracing.spans(progress.iterate(files), "file", "generalvalues"):
+        # analyze the file; its results are merged only if it stays
+        # within its budget (see lib/accounting.py)
+        with accounting.account(file, ctx.rollbackFile) as account:
+            ctx.startFile(file)
 
-        root = tree.getroot()
-        try:
-            (features, _, featuresgrouter, elses) = _getFeatures(root, options)
-        except IfdefEndifMismatchError:
-            print("ERROR: ifdef-endif mismatch in file (%s)" % (os.path.join(folder, file)))
+            try:
+                with tracing.span("parse", "generalvalues"):
+                    tree = etree.parse(file)
+            except etree.XMLSyntaxError:
+                print("ERROR: cannot parse (%s). Skipping this file." % os.path.join(folder, file))
+                progress.count("errors")
+                continue
+
+            root = tree.getroot()
+            try:
+                (features, _, featuresgrouter, elses) = _getFeatures(ctx, root, options)
+            except IfdefEndifMismatchError:
+                print("ERROR: ifdef-endif mismatch in file (%s)" % (os.path.join(folder, file)))
+                progress.count("errors")
+                continue
+
+            # remove #else branches from list of features as there is no existing signature in the source code!
+            if not options.rewriteifdefs:
+                features = OrderedDict((sig, value)
+                                       for sig, value in features.iteritems()
+                                       if not sig.startswith(_elsePrefix))
+
+            pfeatures = _parseFeatures(features)
+
+            # calculate nesting depths (per block and per branch)
+            nlevels = len(ctx.nestedIfdefsLevels)
+            nbranches = len(ctx.nestingDepthsOfBranches)
+            _getNestingDepths(ctx, root)
+
+        if account.skipped:
             continue
 
-        # remove #else branches from list of features as there is no existing signature in the source code!
-        if not options.rewriteifdefs:
-            features = OrderedDict((sig, value)
-                                   for sig, value in features.iteritems()
-                                   if not sig.startswith(_elsePrefix))
-
         # merge features of file in the global list of features
-        _mergeFeatures(features)
-
-        # calculate nesting depths (per block and per branch)
-        _getNestingDepths(root)
+        _mergeFeatures(pfeatures)
 
         # file successfully parsed
         fcount += 1
-        logParseProgress(fcount, ftotal, folder, file)
+
+        if stream:
+            stream.fileResult(_getPrintedFileName(file, folder, options), OrderedDict([
+                ("nestedIfdefsLevels", ctx.nestedIfdefsLevels[nlevels:]),
+                ("ND", [(sig, depth) for (_, _, sig, depth) in ctx.nestingDepthsOfBranches[nbranches:]])]))
+
+    progress.finish()
+    accounting.report()
+
 
     # get signatures and defines
     sigs = _flatten(sigmap.values())
-    defs = list(__defset)
+    defs = list(ctx.defset)
 
     # preparation: opn file for writing
     stfheadings = ['name', 'values']
@@ -829,7 +840,7 @@ def apply(folder, options):
     # nesting values
 
     stfrow[0] = "nestedIfdefsLevels"
-    ndstring = ';'.join(map(str, __nestedIfdefsLevels))
+    ndstring = ';'.join(map(str, ctx.nestedIfdefsLevels))
     stfrow[1] = ndstring
     stfwriter.writerow(stfrow)
 
@@ -852,21 +863,20 @@ def apply(folder, options):
     td.close()
 
     nd, ndcsv = _prologCSV(os.path.join(folder, os.pardir), "nesting_degrees_toplevel_branches.csv", ["file", "signature", "ND"], delimiter=",") # , "linenumber"
-    for (file, elem, sig, depth) in __nestingDepthsOfBranches:
-
-        #adjust file name if wanted
-        if options.filenamesRelative : # relative file name (root is project folder (not included in path))
-            file = os.path.relpath(file, folder)
-
-        if options.filenames == options.FILENAME_SRCML : # cppstats file names
-            pass # nothing to do here, as the file path is the cppstats path by default
-        if options.filenames == options.FILENAME_SOURCE : # source file name
-            file = file.replace(".xml", "").replace("/_cppstats/", "/source/", 1)
+    for (file, elem, sig, depth) in ctx.nestingDepthsOfBranches:
 
         # print information to file
-        ndcsv.writerow([file, sig, depth]) # , elem.sourceline - 1
+        ndcsv.writerow([_getPrintedFileName(file, folder, options), sig, depth]) # , elem.sourceline - 1
     nd.close()
 
+    if stream:
+        stream.projectResult(OrderedDict([
+            ("tangling", tangs),
+            ("scattering", scats),
+            ("nestedIfdefsLevels", ctx.nestedIfdefsLevels),
+            ("SD", OrderedDict(scatvalues_merged)),
+            ("TD", OrderedDict(tangvalues_merged))]))
+
 
 # ##################################################
 # add command line options
@@ -875,24 +885,12 @@ def addCommandLineOptionsMain(optionparser):
     ''' add command line options for a direct call of this script'''
     optionparser.add_argument("--folder", dest="folder",
         help="input folder [default=%(default)s]", default=".")
+    commandline.addAccountingOptions(optionparser)
+    commandline.addProgressOptions(optionparser)
 
 
-def addCommandLineOptions(optionparser) :
-    # TODO implement CSP solving?
-    # optionparser.add_option("--csp", dest="csp", action="store_true",
-    # default=False, help="make use of csp solver to check " \
-    # "feature expression equality [default=False]")
-    # optionparser.add_option("--str", dest="str", action="store_true",
-    #     default=True, help="make use of simple string comparision " \
-    #     "for checking feature expression equality [default=True]")
-    optionparser.add_argument("--norewriteifdefs", dest="rewriteifdefs",
-                              action="store_false", default=True,
-                              help="rewrite nested #ifdefs and #elifs as a conjunction of "
-                                   "inner and outer expressions [default=%(default)s]\n"
-                                   "(exception are #else tags, which ARE rewritten as "
-                                   "negation of the #if branch! see also --norewriteelse "
-                                   "of analysis GENERALVALUES)")
-    #FIXME add command line function to remove #else too!
+def addCommandLineOptions(optionparser):
+    commandline.addGeneralValuesOptions(optionparser)
 
 
 # ################################################
@@ -902,6 +900,12 @@ def getResultsFile():
     return __outputfile
 
 
+def getResultsFiles(options):
+    '''all files written by the analysis (in the project folder)'''
+    return [__metricvaluesfile, "merged_scattering_degrees.csv",
+            "merged_tangling_degrees.csv", "nesting_degrees_toplevel_branches.csv"]
+
+
 ##################################################
 if __name__ == '__main__':
 
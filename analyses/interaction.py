@@ -31,6 +31,8 @@ import re
 import sys
 import xmlrpclib
 from argparse import ArgumentParser, RawTextHelpFormatter
+from binascii import hexlify
+from collections import OrderedDict
 
 # #################################################
 # path adjustments, so that all imports can be done relative to these paths
@@ -38,7 +40,13 @@ from argparse import ArgumentParser, RawTextHelpFormatter
 __lib_subfolder = "lib"
 sys.path.append(os.path.abspath(__lib_subfolder))  # lib subfolder
 
-from lib.cppstatsutils import logParseProgress
+from analyses import commandline
+from lib import tracing
+from lib.accounting import FileAccounting
+from lib.analysiscontext import AnalysisContext, parseString
+from lib.manifest import returnFileNames
+from lib.progress import Progress
+from lib.srcmlutils import decodeTag, iterConditionals
 
 # #################################################
 # external modules
@@ -58,6 +66,7 @@ sys.setrecursionlimit(8000)        # handle larger expressions
 ##################################################
 # config:
 __outputfile = "cppstats_interaction.csv"
+__kwayoutputfile = commandline.interactionKwayOutputFile
 
 # error numbers:
 __errorfexp = 0
@@ -70,7 +79,6 @@ __errormatch = []
 # namespace-constant for src2srcml
 __cppnscpp = 'http://www.srcML.org/srcML/cpp'
 __cppnsdef = 'http://www.srcML.org/srcML/src'
-__cpprens = re.compile('{(.+)}(.+)')
 
 # conditionals - necessary for parsing the right tags
 __conditionals = ['if', 'ifdef', 'ifndef']
@@ -80,11 +88,6 @@ __conditionals_endif = ['endif']
 __conditionals_all = __conditionals + __conditionals_elif + \
         __conditionals_else
 __macro_define = ['define']
-__macrofuncs = {}       # functional macros like: "GLIBVERSION(2,3,4)",
-                        # used as "GLIBVERSION(x,y,z) 100*x+10*y+z"
-__curfile = ''          # current processed xml-file
-__defset = set()        # macro-objects
-__defsetf = dict()      # macro-objects per file
 
 # collected statistics
 class __statsorder(Enum):
@@ -100,36 +103,235 @@ class __statsorder(Enum):
 
 ##################################################
 # helper functions, constants and errors
-def returnFileNames(folder, extfilt = ['.xml']):
-    '''This function returns all files of the input folder <folder>
-    and its subfolders.'''
-    filesfound = list()
-
-    if os.path.isdir(folder):
-        wqueue = [os.path.abspath(folder)]
-
-        while wqueue:
-            currentfolder = wqueue[0]
-            wqueue = wqueue[1:]
-            foldercontent = os.listdir(currentfolder)
-            tmpfiles = filter(lambda n: os.path.isfile(
-                    os.path.join(currentfolder, n)), foldercontent)
-            tmpfiles = filter(lambda n: os.path.splitext(n)[1] in extfilt,
-                    tmpfiles)
-            tmpfiles = map(lambda n: os.path.join(currentfolder, n),
-                    tmpfiles)
-            filesfound += tmpfiles
-            tmpfolders = filter(lambda n: os.path.isdir(
-                    os.path.join(currentfolder, n)), foldercontent)
-            tmpfolders = map(lambda n: os.path.join(currentfolder, n),
-                    tmpfolders)
-            wqueue += tmpfolders
-
-    return filesfound
-
-def uniqueItems(l):
-    l = sorted(l)
-    return list(k for k, _ in itertools.groupby(l))
+class _AnnotationIndex:
+    """This class holds the feature sets of annotations in a compact,
+    dictionary-encoded form. Each feature name gets a number and each
+    annotation becomes an integer bitset with one bit per feature. All
+    distinct annotations are kept in a hash index, so that checking
+    whether a combination of features occurs as an annotation as well as
+    subset and superset tests are simple integer/set operations. The
+    sorted feature numbers of each annotation are kept next to its bitset,
+    so that the bitsets need not be decoded.
+    On top of this index, the pairwise classification of annotations
+    (classifyPairwise) and the mining of k-way feature interactions
+    (getFrequentItemsets) are computed."""
+
+    def __init__(self, annotations):
+        self.features = []          # [<feature name>]; bit position -> name
+        self.__featureids = {}      # {<feature name>: <bit position>}
+        self.annotations = []       # [<bitset>]; distinct annotations in order of occurrence
+        self.__index = {}           # hash index over self.annotations; {<bitset>: (<fid>, ...)}
+        self.__transactions = []    # [<bitset>]; all annotations (incl. duplicates)
+
+        for annotation in annotations:
+            fids = self.encodeIds(annotation)
+            bitset = _getBitset(fids)
+            self.__transactions.append(bitset)
+            if bitset not in self.__index:
+                self.__index[bitset] = fids
+                self.annotations.append(bitset)
+
+    def encodeIds(self, features):
+        """This method returns the sorted tuple of feature numbers for the
+        given feature names."""
+        fids = set()
+        for feature in features:
+            fid = self.__featureids.get(feature)
+            if fid is None:
+                fid = len(self.features)
+                self.__featureids[feature] = fid
+                self.features.append(feature)
+            fids.add(fid)
+        return tuple(sorted(fids))
+
+    def encode(self, features):
+        """This method returns the bitset for the given feature names."""
+        return _getBitset(self.encodeIds(features))
+
+    def getIds(self, bitset):
+        """This method returns the sorted tuple of feature numbers of the
+        given bitset."""
+        fids = self.__index.get(bitset)
+        if fids is None:
+            fids = tuple(_getBits(bitset))
+        return fids
+
+    def decode(self, bitset):
+        """This method returns the set of feature names of the given bitset."""
+        return set(self.features[fid] for fid in self.getIds(bitset))
+
+    def contains(self, bitset):
+        """This method checks whether the given feature combination occurs
+        as an annotation."""
+        return bitset in self.__index
+
+    def getAnnotations(self, minfeatures=1):
+        """This method returns all distinct annotations having at least
+        minfeatures features."""
+        return [a for a in self.annotations if len(self.__index[a]) >= minfeatures]
+
+    def classifyPairwise(self, minfeatures=3):
+        """This method checks, for all annotations with at least minfeatures
+        features, whether their features are covered by the pairwise
+        annotations occurring in the project. It returns the lists
+        (relevant, missing, none) with the entries (annotation, [pairs])
+        for relevant and (annotation, union of pairs) otherwise."""
+        relevant = list()
+        missing = list()
+        none = list()
+
+        pairs = self.getAnnotations(2)
+        pairs = [a for a in pairs if len(self.__index[a]) == 2]
+
+        for annotation in self.getAnnotations(minfeatures):
+            fids = self.__index[annotation]
+
+            # look up each combination of two features in the index or,
+            # if there are less pairwise annotations than combinations,
+            # test each pairwise annotation for being a subset
+            if len(fids) * (len(fids) - 1) / 2 <= len(pairs):
+                occcomblist = [(1 << f1) | (1 << f2)
+                        for (f1, f2) in itertools.combinations(fids, 2)]
+                occcomblist = filter(self.contains, occcomblist)
+            else:
+                occcomblist = [p for p in pairs if p & annotation == p]
+
+            combfeatset = reduce(lambda x, y: x | y, occcomblist, 0)
+            if combfeatset == annotation:
+                relevant.append((annotation, occcomblist))
+            elif combfeatset:
+                missing.append((annotation, combfeatset))
+            else:
+                none.append((annotation, combfeatset))
+
+        return (relevant, missing, none)
+
+    def getFrequentItemsets(self, minsupport=2, maxk=0):
+        """This method mines all combinations of at least two features that
+        occur together in at least minsupport annotations (i.e., in the
+        annotations of minsupport merged feature signatures). The
+        combinations are computed level-wise (Apriori): candidates of size
+        k are joined from frequent combinations of size k-1 sharing the same
+        k-2 features, and a candidate is pruned if any of its subsets of
+        size k-1 is not frequent. The support of a combination is counted
+        by intersecting the bitsets of annotations containing its features.
+        Pairs are counted directly in the annotations instead, and a
+        candidate is only joined if its last two features are a frequent
+        pair, as joining all frequent features would mostly intersect
+        disjoint bitsets.
+        maxk limits the size of the combinations (0 means no limit).
+        It returns a list of (combination, support) tuples ordered by size."""
+        minsupport = max(1, minsupport)
+
+        # vertical layout: feature -> annotations containing it; the lists
+        # are converted to bitsets once (growing a long bit by bit would
+        # copy it for each annotation)
+        tidlists = {}
+        for (tid, annotation) in enumerate(self.__transactions):
+            for fid in self.__index[annotation]:
+                tidlists.setdefault(fid, []).append(tid)
+
+        # frequent combinations of size one: {(fid,): tidset}
+        level = dict(((fid,), _getBitsetOfList(tids))
+                for (fid, tids) in tidlists.iteritems()
+                if len(tids) >= minsupport)
+        k = 1
+        result = list()
+
+        while level and (maxk == 0 or k < maxk):
+            k += 1
+            nextlevel = dict()
+
+            if k == 2:
+                # supports of pairs of frequent features:
+                # {fid1: {fid2: support}} with fid1 < fid2
+                pairsupports = dict()
+                for annotation in self.__transactions:
+                    fids = [fid for fid in self.__index[annotation] if (fid,) in level]
+                    for (i, fid1) in enumerate(fids):
+                        supports = pairsupports.setdefault(fid1, dict())
+                        for fid2 in fids[i + 1:]:
+                            supports[fid2] = supports.get(fid2, 0) + 1
+
+                for (fid1,) in sorted(level.iterkeys()):
+                    supports = pairsupports.get(fid1, {})
+                    for fid2 in sorted(supports.iterkeys()):
+                        support = supports[fid2]
+                        if support >= minsupport:
+                            nextlevel[(fid1, fid2)] = level[(fid1,)] & level[(fid2,)]
+                            result.append(((1 << fid1) | (1 << fid2), support))
+                level = nextlevel
+                continue
+
+            # frequent pairs: {fid1: set([fid2, ...])} with fid1 < fid2
+            if k == 3:
+                successors = dict()
+                for (fid1, fid2) in level.iterkeys():
+                    successors.setdefault(fid1, set()).add(fid2)
+
+            # candidates are joined from combinations with the same prefix
+            prefixes = dict()
+            for itemset in sorted(level.iterkeys()):
+                prefixes.setdefault(itemset[:-1], []).append(itemset)
+
+            for itemsets in prefixes.itervalues():
+                lasts = set(itemset[-1] for itemset in itemsets)
+                for itemset1 in itemsets:
+                    for fid in sorted(lasts.intersection(
+                            successors.get(itemset1[-1], ()))):
+                        candidate = itemset1 + (fid,)
+                        itemset2 = itemset1[:-1] + (fid,)
+
+                        # prune, if any subset of size k-1 is not frequent
+                        if any(candidate[:j] + candidate[j + 1:] not in level
+                                for j in xrange(k - 2)):
+                            continue
+
+                        tids = level[itemset1] & level[itemset2]
+                        support = _getNumOfBits(tids)
+                        if support >= minsupport:
+                            nextlevel[candidate] = tids
+                            result.append((sum(1 << fid for fid in candidate), support))
+
+            level = nextlevel
+
+        return result
+
+
+def _getBits(bitset):
+    """This function returns the positions of all set bits of the given
+    integer in ascending order; only the set bits are visited."""
+    bits = []
+    while bitset:
+        low = bitset & -bitset
+        bits.append(low.bit_length() - 1)
+        bitset ^= low
+    return bits
+
+
+def _getBitset(bits):
+    """This function returns the integer with the given bits set."""
+    bitset = 0
+    for bit in bits:
+        bitset |= 1 << bit
+    return bitset
+
+
+def _getBitsetOfList(bits):
+    """This function returns the integer with the given bits set; the
+    bitset is built in a bytearray and converted at once, so the cost is
+    linear in the highest bit."""
+    size = max(bits) // 8 + 1
+    bitmap = bytearray(size)
+    for bit in bits:
+        bitmap[size - 1 - bit // 8] |= 1 << (bit % 8)
+    return int(hexlify(bitmap), 16)
+
+
+def _getNumOfBits(bitset):
+    """This function returns the number of set bits of the given integer."""
+    return bin(bitset).count('1')
+
 
 def _flatten(l):
     """This function takes a list as input and returns a flatten version
@@ -148,20 +350,6 @@ def _flatten(l):
     return l
 
 
-def _collectDefines(d):
-    """This functions adds all defines to a set.
-    e.g. #define FEAT_WIN
-    also #define FEAT_WIN 12
-    but not #define GLIBCVER(x,y,z) ...
-    """
-    __defset.add(d[0])
-    if __defsetf.has_key(__curfile):
-        __defsetf[__curfile].add(d[0])
-    else:
-        __defsetf[__curfile] = set([d[0]])
-    return d
-
-
 # possible operands:
 #   - hexadecimal number
 #   - decimal number
@@ -224,6 +412,7 @@ def _collapseSubElementsToList(node):
 
 
 
+@tracing.traced(category="interaction")
 def _parseFeatureSignature(sig):
     """This function parses a given feature-signature."""
     mal = set()
@@ -233,7 +422,7 @@ def _parseFeatureSignature(sig):
     def _addIdentifier2Mal(p): mal.add(p[0])
 
     operand = __string | __hexadec | __function | __integer | \
-    __identifier.setParseAction(_addIdentifier2Mal)
+    __identifier.copy().setParseAction(_addIdentifier2Mal)
     compoperator = pypa.oneOf('< > <= >= == !=')
     calcoperator = pypa.oneOf('+ - * / % & | << >>')
     expr = pypa.operatorPrecedence(operand, [
@@ -246,7 +435,7 @@ def _parseFeatureSignature(sig):
     ])
 
     try:
-        rsig = expr.parseString(sig)[0]
+        rsig = parseString(expr, sig)[0]
     except pypa.ParseException, e:
         print 'ERROR (parse): cannot parse sig (%s) -- (%s)' % (sig, e.col,)
         return sig
@@ -271,7 +460,7 @@ def _getMacroSignature(ifdefnode):
     # see the srcml.dtd for more information
     nexpr = []
     res = ''
-    _, tag = __cpprens.match(ifdefnode.tag).groups()
+    _, tag = decodeTag(ifdefnode.tag)
 
     # get either the expr or the name tag,
     # which is always the second descendant
@@ -299,10 +488,11 @@ def _countNestedIfdefs(root):
     within the source-file."""
     cncur = 0
     cnlist = []
-    elements = [it for it in root.iterdescendants()]
+    elements = iterConditionals(root, __conditionals + __conditionals_endif,
+            __cppnscpp)
 
     for elem in elements:
-        ns, tag = __cpprens.match(elem.tag).groups()
+        ns, tag = decodeTag(elem.tag)
         if ((tag in __conditionals_endif)
                 and (ns == __cppnscpp)): cncur -= 1
         if ((tag in __conditionals)
@@ -365,7 +555,7 @@ def _getASTHistory(node):
     asth = []
 
     for anc in ancs:
-        _, tag = __cpprens.match(anc.tag).groups()
+        _, tag = decodeTag(anc.tag)
         asth.append(tag)
     return asth
 
@@ -382,12 +572,12 @@ def _getASTFuture(node):
 
     desh = []
     for des in dess:
-        _, tag = __cpprens.match(des.tag).groups()
+        _, tag = decodeTag(des.tag)
         desh.append(tag)
     return desh
 
 
-def _parseAndAddDefine(node):
+def _parseAndAddDefine(ctx, node):
     """This function extracts the identifier and the corresponding
     expansion from define macros. Later on these are used in conditionals
     in order to make them comparable."""
@@ -398,17 +588,18 @@ def _parseAndAddDefine(node):
     macrodef = pypa.Literal('#define').suppress() + __function + anytext
 
     try:
-        res = macrodef.parseString(define)
+        res = parseString(macrodef, define)
     except pypa.ParseException:
         return
 
     iden = ''.join(map(str, res[0]))
     expn = res[-1]
     para = res[1:-1]
-    __macrofuncs[iden] = (para, expn)
+    ctx.defineMacroFunction(iden, (para, expn))
 
 
-def _getFeatures(root):
+@tracing.traced(category="interaction")
+def _getFeatures(ctx, root):
     """This function returns all features in the source-file.
     A feature is defined as an enframement of soure-code. The frame
     consists of an ifdef (conditional) and an endif-macro. The function
@@ -481,7 +672,7 @@ def _getFeatures(root):
 
     # iterate over all tags separately <start>- and <end>-tag
     for event, elem in etree.iterwalk(root, events=("start", "end")):
-        ns, tag = __cpprens.match(elem.tag).groups()
+        ns, tag = decodeTag(elem.tag)
 
         # handling conditionals
         # hitting on conditional-macro
@@ -525,7 +716,7 @@ def _getFeatures(root):
         if ((tag in __macro_define) \
                 and (event == 'end') \
                 and (ns == __cppnscpp)):
-            _parseAndAddDefine(elem)
+            _parseAndAddDefine(ctx, elem)
 
         # iterateting in subtree of conditional-node
         if parcon:
@@ -788,6 +979,7 @@ def _getFeaturesDepthOne(features):
     return nof1
 
 
+@tracing.traced(category="interaction")
 def _distinguishFeatures(features):
     """This function returns a tuple with dicts, each holding
     one type of feature. The determination is according to the
@@ -854,7 +1046,7 @@ def _distinguishFeatures(features):
     return (scode, deriv, desc, het, hom, hethom)
 
 
-def _getNumOfDefines(defset):
+def _getNumOfDefines(ctx, defset):
     """This method returns the number of defines, that have the following
     structure:
     #define FEAT_A
@@ -864,15 +1056,16 @@ def _getNumOfDefines(defset):
     #define CHECKVERSION(x,y,z) x*100+y*10+z
     All determined elements are derived from the ifdef macros.
     """
-    # basic operation of this function is to check __defset against
-    # __macrofuncs
-    funcmacros = __macrofuncs.keys()
+    # basic operation of this function is to check the defines against
+    # the macro functions
+    funcmacros = ctx.macrofuncs.keys()
     funcmacros = map(lambda n: n.split('(')[0], funcmacros)
     funcmacros = set(funcmacros)
 
     return len((defset - funcmacros))
 
 
+@tracing.traced(category="interaction")
 def _getScatteringTanglingDegrees(sigs, defines):
     """This method returns the mean and the standard-deviation of
     defines according to the given mapping of a define to occurances
@@ -981,30 +1174,30 @@ def _checkForEquivalentSig(l, sig):
             return it
     raise NoEquivalentSigError()
 
-def resetModule() :
-    global __macrofuncs, __defset, __defsetf
-    __macrofuncs = {}       # functional macros like: "GLIBVERSION(2,3,4)",
-                            # used as "GLIBVERSION(x,y,z) 100*x+10*y+z"
-    __defset = set()        # macro-objects
-    __defsetf = dict()      # macro-objects per file
-
-
-def apply(folder, options):
+def apply(folder, options, stream=None):
     """This function applies the analysis to all xml-files in that
     directory and take the results and joins them together. Results
-    are getting written into the fdcsv-file."""
+    are getting written into the fdcsv-file and, if given, to the
+    ResultStream <stream>."""
     # overall status variables
-    resetModule()
+    ctx = AnalysisContext()
 
     sigmap = {}                # {<converted sig>: [<equivalent sigs>]}
     afeatures = {}            # identified features; {<sig>: ([flag], depth, [code])}
 
-    def _mergeFeatures(ffeatures):
-        """This function merges the, with the parameter given
-        dictionary (ffeatures) to the afeatures (overall-features)."""
-        for (sig, (depth, code)) in ffeatures.iteritems():
-            (mal, psig) = _parseFeatureSignature(sig)
+    def _parseFeatures(ffeatures):
+        """This function parses the signatures of the, with the parameter
+        given dictionary (ffeatures) for _mergeFeatures; returns a list of
+        (sig, mal, psig, depth, code)."""
+        return [(sig,) + _parseFeatureSignature(sig) + (depth, code)
+                for (sig, (depth, code)) in ffeatures.iteritems()]
 
+    @tracing.traced("merge", "interaction")
+    def _mergeFeatures(pfeatures):
+        """This function merges the, with the parameter given
+        list of parsed features (see _parseFeatures) to the afeatures
+        (overall-features)."""
+        for (sig, mal, psig, depth, code) in pfeatures:
             try:
                 sigmatch = _checkForEquivalentSig(sigmap.keys(), psig)
                 (tmpflag, tmpdepth, tmpcode) = \
@@ -1023,64 +1216,61 @@ def apply(folder, options):
     # # outputfile
     # fd, fdcsv = _prologCSV(folder)
 
-    global __curfile
     fcount = 0
     files = returnFileNames(folder, ['.xml'])
     fstats = [None]*len(__statsorder)
-    ftotal = len(files)
 
     # get statistics for all files; write results into csv
     # and merge the features
-    for file in files:
-        __curfile = file
-        fcount += 1
-        try:
-            tree = etree.parse(file)
-        except etree.XMLSyntaxError:
-            print("ERROR: cannot parse (%s). Skipping this file." %
-                os.path.join(folder, file))
-            continue
+    progress = Progress("interaction", files, folder, options.progressInterval)
+    accounting = FileAccounting("interaction", folder, options)
+    for file in tracing.spans(progress.iterate(files), "file", "interaction"):
+        # analyze the file; its results are merged only if it stays
+        # within its budget (see lib/accounting.py)
+        with accounting.account(file, ctx.rollbackFile) as account:
+            ctx.startFile(file)
+            try:
+                with tracing.span("parse", "interaction"):
+                    tree = etree.parse(file)
+            except etree.XMLSyntaxError:
+                print("ERROR: cannot parse (%s). Skipping this file." %
+                    os.path.join(folder, file))
+                progress.count("errors")
+                continue
+
 
-        logParseProgress(fcount, ftotal, folder, file)
+            root = tree.getroot()
+            try:
+                (features, _, featuresgrouter) = _getFeatures(ctx, root)
+            except IfdefEndifMismatchError:
+                print("ERROR: ifdef-endif mismatch in file (%s)" %
+                    (os.path.join(folder, file)))
+                progress.count("errors")
+                continue
+            pfeatures = _parseFeatures(features)
 
-        root = tree.getroot()
-        try:
-            (features, _, featuresgrouter) = _getFeatures(root)
-        except IfdefEndifMismatchError:
-            print("ERROR: ifdef-endif mismatch in file (%s)" %
-                (os.path.join(folder, file)))
+        if account.skipped:
             continue
-        _mergeFeatures(features)
+
+        fcount += 1
+        _mergeFeatures(pfeatures)
+
+        if stream:
+            stream.fileResult(file, OrderedDict([("annotations", len(features))]))
+
+    progress.finish()
+    accounting.report()
+
 
     # filter annotations that do not have any c-code
     # filter annotations with less than 3 features
     afeatureitems = filter(lambda (a, (f, d, c)):
             c != [''], afeatures.items())
-    annotations = map(lambda (a, (flag, b, c)): flag, afeatureitems)
-    annotations3andmore = filter(lambda a: len(a) > 2, annotations)
-    annotations3andmore = uniqueItems(annotations3andmore)
-    annotations3andmore = map(lambda s: set(s), annotations3andmore)
-    relevantannotations = list()
-    missingannotations = list()
-    noneannotations = list()
-
-    # create all pairwise combinations of features
-    for annotation in annotations3andmore:
-        combinations = map(lambda s:
-            set(s), list(itertools.combinations(annotation, 2)))
-        allcomb = len(combinations)
-        occcomblist = list(set())
-        for combination in combinations:
-            if combination in annotations:
-                occcomblist.append(combination)
-        combfeatset = reduce(set.union, occcomblist, set())
-        if combfeatset.issuperset(annotation):
-            relevantannotations.append((annotation, occcomblist))
-        else:
-            if len(combfeatset) > 0:
-                missingannotations.append((annotation, combfeatset))
-            else:
-                noneannotations.append((annotation, combfeatset))
+    index = _AnnotationIndex(map(lambda (a, (flag, b, c)): flag, afeatureitems))
+    (relevantannotations, missingannotations, noneannotations) = \
+            index.classifyPairwise(3)
+    numannotations = len(relevantannotations) + len(missingannotations) + \
+            len(noneannotations)
 
     projectpath = os.path.dirname(folder)
     projectname = os.path.basename(projectpath)
@@ -1091,13 +1281,36 @@ def apply(folder, options):
             __outputfile
         ), 'w')
 
-    for i in relevantannotations: fd.write(str(i)+"\n")
-    fd.write("total annotations: %5d\n" % len(annotations3andmore))
+    for (annotation, occcomblist) in relevantannotations:
+        fd.write(str((index.decode(annotation),
+                map(index.decode, occcomblist))) + "\n")
+    fd.write("total annotations: %5d\n" % numannotations)
     fd.write("relevant pairwise annotations: %5d\n" % len(relevantannotations))
     fd.write("missing pairwise annotations: %5d\n" % len(missingannotations))
     fd.write("none pairwise annotations: %5d\n" % len(noneannotations))
     fd.close()
 
+    if stream:
+        stream.projectResult(OrderedDict([
+            ("total annotations", numannotations),
+            ("relevant pairwise annotations", len(relevantannotations)),
+            ("missing pairwise annotations", len(missingannotations)),
+            ("none pairwise annotations", len(noneannotations))]))
+
+    # mine feature interactions of arbitrary size, if wanted
+    if options.interaction_kway:
+        itemsets = index.getFrequentItemsets(options.interaction_minsupport,
+                options.interaction_maxk)
+
+        fd = open(os.path.join(projectpath, __kwayoutputfile), 'w')
+        fdcsv = csv.writer(fd, delimiter=';')
+        fdcsv.writerow(["k", "support", "annotation", "features"])
+        for (itemset, support) in itemsets:
+            fdcsv.writerow([_getNumOfBits(itemset), support,
+                    int(index.contains(itemset)),
+                    ",".join(sorted(index.decode(itemset)))])
+        fd.close()
+
 
 # ##################################################
 # add command line options
@@ -1106,17 +1319,12 @@ def addCommandLineOptionsMain(optionparser):
     ''' add command line options for a direct call of this script'''
     optionparser.add_argument("--folder", dest="folder",
         help="input folder [default=.]", default=".")
+    commandline.addAccountingOptions(optionparser)
+    commandline.addProgressOptions(optionparser)
 
 
-def addCommandLineOptions(optionparser) :
-    # TODO implement CSP solving?
-    # optionparser.add_argument("--csp", dest="csp", action="store_true",
-    #         default=False, help="make use of csp solver to check " \
-    #         "feature expression equality [default=False]")
-    # optionparser.add_argument("--str", dest="str", action="store_true",
-    #         default=True, help="make use of simple string comparision " \
-    #         "for checking feature expression equality [default=True]")
-    pass
+def addCommandLineOptions(optionparser):
+    commandline.addInteractionOptions(optionparser)
 
 
 # ################################################
@@ -1126,6 +1334,13 @@ def getResultsFile():
     return __outputfile
 
 
+def getResultsFiles(options):
+    '''all files written by the analysis (in the project folder)'''
+    if options.interaction_kway:
+        return [__outputfile, __kwayoutputfile]
+    return [__outputfile]
+
+
 ##################################################
 if __name__ == '__main__':
 
@@ -1143,7 +1358,7 @@ if __name__ == '__main__':
 
     folder = os.path.abspath(options.folder)
     if (os.path.isdir(folder)):
-        apply(folder)
+        apply(folder, options)
     else:
         sys.exit(-1)
 
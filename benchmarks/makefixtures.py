@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# cppstats is a suite of analyses for measuring C preprocessor-based
+# variability in software product lines.
+# Copyright (C) 2014-2015 University of Passau, Germany
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+
+'''
+Writes the srcML fixtures of the microbenchmarks (see microbench.py) to the
+folder "fixtures". The fixtures are synthetic C files of increasing size
+(see cppstats bench), written directly as srcML in the form the analyses
+get after the preparation, i.e., #ifdef X is rewritten to #if defined(X).
+The same settings always give the same files, so the fixtures are only
+written again when the shape of the files is to be changed.
+'''
+
+
+# #################################################
+# imports from the std-library
+
+import os
+import re
+import sys
+from argparse import ArgumentParser, Namespace
+from xml.sax.saxutils import escape
+
+# #################################################
+# path adjustments, so that all imports can be done relative to these paths
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from cppstats.bench import CorpusGenerator
+
+
+# #################################################
+# global constants
+
+__fixturesfolder = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# fixtures: (name, lines); each one four times the size of the previous one
+__fixtures = [("small", 50), ("medium", 200), ("large", 800)]
+
+__unit = '<unit xmlns="http://www.srcML.org/srcML/src" xmlns:cpp="http://www.srcML.org/srcML/cpp" ' \
+         'revision="0.9.5" language="C" filename="%s">'
+
+__token = re.compile(r'defined\((\w+)\)|(\w+)|(&&|\|\||[!<>=]=?|[-+*/])|([()])|(\s+)')
+
+
+# #################################################
+# srcML markup
+
+def _getExpression(expression):
+    '''Returns the srcML markup of a C expression of the corpus.'''
+    markup = []
+    for match in __token.finditer(expression):
+        (defined, word, operator, parenthesis, space) = match.groups()
+        if defined:
+            markup.append('<call><name>defined</name><argument_list>(<argument><expr><name>%s</name>'
+                          '</expr></argument>)</argument_list></call>' % defined)
+        elif word:
+            if word.isdigit():
+                markup.append('<literal type="number">%s</literal>' % word)
+            else:
+                markup.append('<name>%s</name>' % word)
+        elif operator:
+            markup.append('<operator>%s</operator>' % escape(operator))
+        else:
+            markup.append(parenthesis or space)
+    return ''.join(markup)
+
+
+def _getDirective(directive, expression=None):
+    if expression is None:
+        return '<cpp:%s>#<cpp:directive>%s</cpp:directive></cpp:%s>' % (directive, directive, directive)
+    return '<cpp:%s>#<cpp:directive>%s</cpp:directive> <cpp:expr>%s</cpp:expr></cpp:%s>' \
+        % (directive, directive, _getExpression(expression), directive)
+
+
+class SrcMLGenerator(CorpusGenerator):
+    '''This class writes the C files of CorpusGenerator as prepared srcML.'''
+
+    def getDirective(self, directive, expression=None):
+        # the preparation rewrites #ifdef X to #if defined(X)
+        if directive == "ifdef":
+            (directive, expression) = ("if", "defined(%s)" % expression)
+        elif directive == "ifndef":
+            (directive, expression) = ("if", "!defined(%s)" % expression)
+        return _getDirective(directive, expression)
+
+    def getStatement(self, indent, expression):
+        return indent + "<expr_stmt><expr>%s</expr>;</expr_stmt>" % _getExpression(expression)
+
+    def getFunctionStart(self, name):
+        parameters = ", ".join('<parameter><decl><type><name>int</name></type> <name>%s</name></decl></parameter>'
+                               % parameter for parameter in ["x", "y"])
+        return ['<function><type><name>int</name></type> <name>%s</name><parameter_list>(%s)</parameter_list>'
+                % (name, parameters),
+                "<block>{"]
+
+    def getFunctionEnd(self):
+        return ["    <return>return <expr>%s</expr>;</return>" % _getExpression("x + y"),
+                "}</block></function>"]
+
+    def getIncludes(self, index):
+        return []  # the fixtures are single files
+
+    def addUndisciplinedAnnotation(self, lines, indent):
+        # only an annotated part of the condition of an if, as a lone
+        # brace has no srcML markup of its own
+        lines.append(indent + "<if>if <condition>(<expr>%s" % _getExpression("x > %d" % self.random.randint(0, 9)))
+        lines.append(self.getDirective("if", self.getSignature()))
+        lines.append(indent + "    %s" % _getExpression("&& y < %d" % self.random.randint(0, 9)))
+        lines.append(self.getDirective("endif"))
+        lines.append(indent + "   </expr>)</condition><then> <block>{")
+        lines.append(indent + "    <expr_stmt><expr><name>x</name><operator>--</operator></expr>;</expr_stmt>")
+        lines.append(indent + "}</block></then></if>")
+
+
+def writeFixture(folder, name, settings):
+    filename = os.path.join(folder, name + ".c.xml")
+    lines = SrcMLGenerator(settings).getSourceFile(0)
+    with open(filename, 'w') as fd:
+        fd.write('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n')
+        fd.write(__unit % (name + ".c") + "\n")
+        fd.write("\n".join(lines) + "\n")
+        fd.write("</unit>\n")
+    return (filename, len(lines))
+
+
+# #################################################
+# main method
+
+def main():
+    parser = ArgumentParser(description="Write the srcML fixtures of the microbenchmarks.")
+    parser.add_argument("--folder", dest="folder", default=__fixturesfolder,
+                        help="folder of the fixtures [default: %(default)s]")
+    options = parser.parse_args()
+
+    if not os.path.isdir(options.folder):
+        os.makedirs(options.folder)
+
+    for (name, lines) in __fixtures:
+        settings = Namespace(lines=lines, headers=1, density=0.2, depth=3, elifs=2, complexity=3,
+                             undisciplined=0.1, features=40, seed=1)
+        (filename, count) = writeFixture(options.folder, name, settings)
+        print "# wrote %s (%d lines)" % (filename, count)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,377 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# cppstats is a suite of analyses for measuring C preprocessor-based
+# variability in software product lines.
+# Copyright (C) 2014-2015 University of Passau, Germany
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+
+'''
+Microbenchmarks of the functions that dominate the profiles of the analyses,
+run on the srcML fixtures of increasing size in the folder "fixtures" (see
+makefixtures.py), e.g.:
+
+    $ python benchmarks/microbench.py
+    $ python benchmarks/microbench.py --filter discipline --json results.json
+
+For each function and fixture, the time and the allocations of one call are
+reported; a call processes the whole fixture (e.g., the signatures of all
+#ifdefs of the file). The slope of log(time) over log(lines) shows how a
+function scales: about 1 is linear, 2 is quadratic. Allocations are the
+peak of the bytes allocated during the call with tracemalloc, if available,
+and the peak of the objects created during the call and tracked by the
+garbage collector otherwise (sampled at each function call and return).
+'''
+
+
+# #################################################
+# imports from the std-library
+
+import os
+import re
+import gc
+import sys
+import json
+import math
+import time
+import types
+from argparse import ArgumentParser, Namespace
+from collections import OrderedDict
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+# #################################################
+# path adjustments, so that all imports can be done relative to these paths
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from analyses import general, discipline
+from lib.srcmlutils import decodeTag, iterConditionals
+from scripts import ascope
+
+from lxml import etree
+
+
+# #################################################
+# global constants
+
+__fixturesfolder = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+_conditionals = ['if', 'elif', 'else', 'endif']
+
+_options = Namespace(rewriteifdefs=True, disc_all=True, check=1, verbose=False)
+
+
+# #################################################
+# fixtures
+
+class Fixture(object):
+    '''A parsed srcML fixture and the inputs of the benchmarked functions
+    derived from it.'''
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.name = os.path.basename(filename).split(".")[0]
+        with open(filename) as fd:
+            self.lines = sum(1 for _ in fd)
+        self.root = etree.parse(filename).getroot()
+
+        ctx = general._GeneralContext()
+        (self.features, _, _) = general._getFeatures(ctx, self.root, _options)
+        self.signatures = self.features.keys()
+        self.defines = list(ctx.defset)
+        self.__parsedsignatures = None
+
+        self.conditionals = [elem for elem in iterConditionals(self.root, _conditionals)
+                             if decodeTag(elem.tag)[1] != 'endif']
+        self.histories = _getConditionalHistories(self.root)
+
+        self.treeifdefs = list(iterConditionals(self.root, _conditionals))
+
+    def getParsedSignatures(self):
+        '''Returns the rewritten signatures; the parsing is expensive, so it
+        is only done when needed.'''
+        if self.__parsedsignatures is None:
+            ctx = general._GeneralContext()
+            self.__parsedsignatures = [general._parseFeatureSignatureAndRewrite(ctx, sig)
+                                       for sig in self.signatures]
+        return self.__parsedsignatures
+
+
+def _getConditionalHistories(root):
+    '''Returns the history of conditionals (see general._getFeatures) at
+    each #if, #elif, and #else of the file.'''
+    histories = []
+    condinhist = []
+    for elem in iterConditionals(root, _conditionals):
+        tag = decodeTag(elem.tag)[1]
+        if tag == 'endif':
+            while condinhist[-1][0] != 'if':
+                condinhist.pop()
+            condinhist.pop()
+        else:
+            condinhist.append((tag, general._getMacroSignature(elem)))
+            histories.append(list(condinhist))
+    return histories
+
+
+def loadFixtures(folder):
+    fixtures = [Fixture(os.path.join(folder, filename)) for filename in os.listdir(folder)
+                if filename.endswith(".xml")]
+    return sorted(fixtures, key=lambda fixture: fixture.lines)
+
+
+# #################################################
+# benchmarked functions: each case returns the function that processes the
+# given fixture once; the functions return their results, so that the objects
+# kept by the results count as allocations
+
+def caseGetFeatures(fixture):
+    return lambda: general._getFeatures(general._GeneralContext(), fixture.root, _options)
+
+
+def caseGetMacroSignature(fixture):
+    return lambda: [general._getMacroSignature(elem) for elem in fixture.conditionals]
+
+
+def caseGetFeatureSignature(fixture):
+    return lambda: [general._getFeatureSignature(condinhist, _options) for condinhist in fixture.histories]
+
+
+def caseParseFeatureSignatureAndRewrite(fixture):
+    def run():
+        ctx = general._GeneralContext()
+        return [general._parseFeatureSignatureAndRewrite(ctx, sig) for sig in fixture.signatures]
+    return run
+
+
+def caseCheckForEquivalentSig(fixture):
+    # the merge of the signatures of a file (see general.apply)
+    parsedsignatures = fixture.getParsedSignatures()
+
+    def run():
+        sigmap = {}
+        for psig in parsedsignatures:
+            try:
+                sigmatch = general._checkForEquivalentSig(sigmap.keys(), psig)
+                sigmap[sigmatch].append(psig)
+            except general.NoEquivalentSigError:
+                sigmap[psig] = [psig]
+        return sigmap
+    return run
+
+
+def caseGetScatteringTanglingDegrees(fixture):
+    return lambda: general._getScatteringTanglingDegrees(fixture.signatures, fixture.defines)
+
+
+def _getDisciplineCase(check):
+    def case(fixture):
+        annotations = discipline.DisciplinedAnnotations(None, _options)
+        checkPattern = getattr(annotations, check)
+        treeifdefs = annotations.__getIfdefAnnotations__(fixture.root)
+        listifdefs = annotations.__createListFromTreeifdefs__(treeifdefs)
+
+        def run():
+            index = discipline._DirectiveIndex(treeifdefs)
+            return [checkPattern(listcorifdef, index) for listcorifdef in listifdefs]
+        return run
+    return case
+
+
+def caseAscopeCheckDiscipline(fixture):
+    # Ascope parses the command line in its constructor
+    scope = types.InstanceType(ascope.Ascope)
+    scope.screensizes = [50]
+
+    def run():
+        histograms = {50: ([0] * 60, [0] * 60)}
+        scope.__checkDiscipline__(fixture.treeifdefs, fixture.lines, histograms)
+        return histograms
+    return run
+
+
+def getCases():
+    cases = [
+        ("general._getFeatures", caseGetFeatures),
+        ("general._getMacroSignature", caseGetMacroSignature),
+        ("general._getFeatureSignature", caseGetFeatureSignature),
+        ("general._parseFeatureSignatureAndRewrite", caseParseFeatureSignatureAndRewrite),
+        ("general._checkForEquivalentSig", caseCheckForEquivalentSig),
+        ("general._getScatteringTanglingDegrees", caseGetScatteringTanglingDegrees),
+    ]
+    checks = [name for name in dir(discipline.DisciplinedAnnotations)
+              if re.match(r'^__check\w+__$', name) and name != '__checkDiscipline__']
+    for check in sorted(checks):
+        cases.append(("discipline." + check, _getDisciplineCase(check)))
+    cases.append(("ascope.__checkDiscipline__", caseAscopeCheckDiscipline))
+    return OrderedDict(cases)
+
+
+# #################################################
+# measurements
+
+def measureTime(function, repeat, mintime):
+    '''Returns the time of one call of <function>: the calls are looped
+    until they take at least <mintime> seconds, the best of <repeat> loops
+    counts. A single call taking longer than ten times <mintime> is not
+    repeated.'''
+    loops = 1
+    while True:
+        start = time.time()
+        for _ in xrange(loops):
+            function()
+        elapsed = time.time() - start
+        if elapsed >= mintime:
+            break
+        loops *= 2 if elapsed <= 0 else max(2, int(math.ceil(mintime / elapsed)))
+
+    best = elapsed
+    if loops == 1 and elapsed > 10 * mintime:
+        return best
+    for _ in range(repeat - 1):
+        start = time.time()
+        for _ in xrange(loops):
+            function()
+        best = min(best, time.time() - start)
+    return best / loops
+
+
+def measureAllocations(function):
+    '''Returns the allocations of one call of <function> (see module
+    documentation).'''
+    if tracemalloc is not None:
+        tracemalloc.start()
+        try:
+            function()
+            (_, peak) = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return peak
+
+    # with the collector disabled, the count of generation 0 is the number
+    # of objects created since the collection minus those freed again
+    # (the first sample includes the frame of the profiling function itself)
+    counts = []     # [<first count>, <peak count>]
+
+    def sample(frame, event, arg):
+        count = gc.get_count()[0]
+        if not counts:
+            counts.extend((count, count))
+        elif count > counts[1]:
+            counts[1] = count
+
+    gc.collect()
+    gc.disable()
+    try:
+        sys.setprofile(sample)
+        try:
+            result = function()
+        finally:
+            sys.setprofile(None)
+    finally:
+        gc.enable()
+    del result
+    return counts[1] - counts[0]
+
+
+def getSlope(sizes, values):
+    '''Returns the slope of the least-squares line through the points
+    (log(size), log(value)).'''
+    points = [(math.log(size), math.log(value)) for (size, value) in zip(sizes, values) if value > 0]
+    if len(points) < 2:
+        return None
+    meanx = sum(x for (x, _) in points) / len(points)
+    meany = sum(y for (_, y) in points) / len(points)
+    variance = sum((x - meanx) ** 2 for (x, _) in points)
+    if variance == 0:
+        return None
+    return sum((x - meanx) * (y - meany) for (x, y) in points) / variance
+
+
+def _formatTime(seconds):
+    for (unit, factor) in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= factor:
+            return "%.2f%s" % (seconds / factor, unit)
+    return "%.0fns" % (seconds / 1e-9)
+
+
+def run(fixtures, cases, repeat, mintime):
+    sizes = [fixture.lines for fixture in fixtures]
+    results = OrderedDict()
+
+    print "%-52s" % ("function (%s)" % ("time; peak objects" if not tracemalloc else "time; peak bytes")) \
+        + "".join("%22s" % ("%s (%d lines)" % (fixture.name, fixture.lines)) for fixture in fixtures) \
+        + "%8s" % "slope"
+    for (name, case) in cases.iteritems():
+        times = []
+        allocations = []
+        for fixture in fixtures:
+            function = case(fixture)
+            times.append(measureTime(function, repeat, mintime))
+            allocations.append(measureAllocations(function))
+
+        slope = getSlope(sizes, times)
+        results[name] = OrderedDict([
+            ("lines", sizes),
+            ("seconds", times),
+            ("allocations", allocations),
+            ("slope", slope),
+        ])
+        print "%-52s" % name \
+            + "".join("%22s" % ("%s; %d" % (_formatTime(t), a)) for (t, a) in zip(times, allocations)) \
+            + "%8s" % ("%.2f" % slope if slope is not None else "-")
+    return results
+
+
+# #################################################
+# main method
+
+def main():
+    parser = ArgumentParser(description="Run the microbenchmarks of the analyses on the srcML fixtures.")
+    parser.add_argument("--fixtures", dest="fixtures", default=__fixturesfolder,
+                        help="folder of the srcML fixtures [default: %(default)s]")
+    parser.add_argument("--filter", dest="filter", default=None, metavar="REGEX",
+                        help="run only the functions whose names match REGEX")
+    parser.add_argument("--repeat", dest="repeat", type=int, default=3,
+                        help="number of measurements per function and fixture; the best counts [default: %(default)s]")
+    parser.add_argument("--mintime", dest="mintime", type=float, default=0.1,
+                        help="minimum time of one measurement in seconds [default: %(default)s]")
+    parser.add_argument("--json", dest="json", metavar="FILE", default=None,
+                        help="additionally write the results to FILE")
+    options = parser.parse_args()
+
+    cases = getCases()
+    if options.filter:
+        cases = OrderedDict((name, case) for (name, case) in cases.iteritems()
+                            if re.search(options.filter, name))
+
+    fixtures = loadFixtures(options.fixtures)
+    results = run(fixtures, cases, options.repeat, options.mintime)
+
+    if options.json:
+        with open(options.json, 'w') as fd:
+            json.dump(OrderedDict([("fixtures", [fixture.name for fixture in fixtures]),
+                                   ("allocations", "peak bytes" if tracemalloc else "peak objects"),
+                                   ("results", results)]), fd, indent=2)
+            fd.write("\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -33,6 +33,7 @@ import errno  # for error/exception handling
 import threading  # for parallelism
 import subprocess  # for calling other commands
 import re  # for regular expressions
+import importlib  # for importing the analyses when they are run
 from abc import ABCMeta, abstractmethod  # abstract classes
 from argparse import ArgumentParser, RawTextHelpFormatter  # for parameters to this script
 from collections import OrderedDict  # for ordered dictionaries
@@ -40,10 +41,14 @@ from collections import OrderedDict  # for ordered dictionaries
 # #################################################
 # imports from subfolders
 
-import cppstats, cli
+import cppstats, cli, sqlitestore
 
-# import different kinds of analyses
-from analyses import general, generalvalues, discipline, featurelocations, derivative, interaction
+from lib import tracing
+from lib.resultstream import ResultStream
+
+# the command-line options of the different kinds of analyses; the analyses
+# themselves are imported when they are run (see getAnalysisModule)
+from analyses import commandline
 
 
 # #################################################
@@ -145,20 +150,51 @@ class AbstractAnalysisThread(object):
                 currentFile += ".xml"
             shutil.copyfile(self.file, currentFile)
 
+        # stream the results of the project, if wanted
+        self.stream = None
+        if (self.options.ndjson and not self.file):
+            self.stream = ResultStream(self.options.ndjson, self.getName(),
+                                       os.path.basename(os.path.dirname(self.folder)))
+
         # for all files in the self.folder (only C and H files)
-        self.analyze(self.folder)
+        try:
+            with tracing.span(self.getName(), "analysis", input=self.file or os.path.dirname(self.folder)):
+                self.analyze(self.folder)
+        finally:
+            if (self.stream):
+                self.stream.close()
 
         # copy main results file from tmp folder to destination, if given
         if (self.file and self.resultsfile != self.outfile):
             shutil.copyfile(self.resultsfile, self.outfile)
 
+        # store the results of the project in the database, if given
+        if (self.options.sqlite and not self.file):
+            self.storeResults(self.options.sqlite)
+
         self.teardown()
 
+    def storeResults(self, database):
+        projectfolder = os.path.dirname(self.folder)
+        resultsfiles = [os.path.join(projectfolder, resultsfile)
+                        for resultsfile in self.getResultsFiles(self.options)]
+        count = sqlitestore.storeResults(database, self.getName(),
+                                         os.path.basename(projectfolder), projectfolder, resultsfiles)
+        print "# stored " + str(count) + " results in " + database
+
     @classmethod
     @abstractmethod
     def getName(cls):
         pass
 
+    @classmethod
+    def getAnalysisModule(cls):
+        '''Returns the module of the analysis from the folder "analyses",
+        which has the name of the analysis. The modules build their grammars
+        when imported, so they are only imported when the analysis is run
+        or its results are needed.'''
+        return importlib.import_module("analyses." + cls.getName())
+
     @classmethod
     @abstractmethod
     def getPreparationFolder(self):
@@ -169,6 +205,11 @@ class AbstractAnalysisThread(object):
     def getResultsFile(self):
         pass
 
+    @classmethod
+    @abstractmethod
+    def getResultsFiles(self, options):
+        pass
+
     @classmethod
     @abstractmethod
     def addCommandLineOptions(cls, optionParser):
@@ -193,16 +234,20 @@ class GeneralAnalysisThread(AbstractAnalysisThread):
 
     @classmethod
     def getResultsFile(self):
-        return general.getResultsFile()
+        return self.getAnalysisModule().getResultsFile()
+
+    @classmethod
+    def getResultsFiles(self, options):
+        return self.getAnalysisModule().getResultsFiles(options)
 
     @classmethod
     def addCommandLineOptions(cls, optionParser):
         title = "Options for analysis '" + cls.getName() + "'"
         group = optionParser.add_argument_group(title.upper())
-        general.addCommandLineOptions(group)
+        commandline.addGeneralOptions(group)
 
     def analyze(self, folder):
-        general.apply(folder, self.options)
+        self.getAnalysisModule().apply(folder, self.options, self.stream)
 
 
 class GeneralValuesAnalysisThread(AbstractAnalysisThread):
@@ -216,16 +261,20 @@ class GeneralValuesAnalysisThread(AbstractAnalysisThread):
 
     @classmethod
     def getResultsFile(self):
-        return generalvalues.getResultsFile()
+        return self.getAnalysisModule().getResultsFile()
+
+    @classmethod
+    def getResultsFiles(self, options):
+        return self.getAnalysisModule().getResultsFiles(options)
 
     @classmethod
     def addCommandLineOptions(cls, optionParser):
         title = "Options for analysis '" + cls.getName() + "'"
         group = optionParser.add_argument_group(title.upper())
-        generalvalues.addCommandLineOptions(group)
+        commandline.addGeneralValuesOptions(group)
 
     def analyze(self, folder):
-        generalvalues.apply(folder, self.options)
+        self.getAnalysisModule().apply(folder, self.options, self.stream)
 
 
 class DisciplineAnalysisThread(AbstractAnalysisThread):
@@ -239,16 +288,20 @@ class DisciplineAnalysisThread(AbstractAnalysisThread):
 
     @classmethod
     def getResultsFile(self):
-        return discipline.getResultsFile()
+        return self.getAnalysisModule().getResultsFile()
+
+    @classmethod
+    def getResultsFiles(self, options):
+        return self.getAnalysisModule().getResultsFiles(options)
 
     @classmethod
     def addCommandLineOptions(cls, optionParser):
         title = "Options for analysis '" + cls.getName() + "'"
         group = optionParser.add_argument_group(title.upper())
-        discipline.addCommandLineOptions(group)
+        commandline.addDisciplineOptions(group)
 
     def analyze(self, folder):
-        discipline.DisciplinedAnnotations(folder, self.options)
+        self.getAnalysisModule().DisciplinedAnnotations(folder, self.options, self.stream)
 
 
 class FeatureLocationsAnalysisThread(AbstractAnalysisThread):
@@ -262,16 +315,20 @@ class FeatureLocationsAnalysisThread(AbstractAnalysisThread):
 
     @classmethod
     def getResultsFile(self):
-        return featurelocations.getResultsFile()
+        return self.getAnalysisModule().getResultsFile()
+
+    @classmethod
+    def getResultsFiles(self, options):
+        return self.getAnalysisModule().getResultsFiles(options)
 
     @classmethod
     def addCommandLineOptions(cls, optionParser):
         title = "Options for analysis '" + cls.getName() + "'"
         group = optionParser.add_argument_group(title.upper())
-        featurelocations.addCommandLineOptions(group)
+        commandline.addFeatureLocationsOptions(group)
 
     def analyze(self, folder):
-        featurelocations.apply(folder, self.options)
+        self.getAnalysisModule().apply(folder, self.options, self.stream)
 
 
 class DerivativeAnalysisThread(AbstractAnalysisThread):
@@ -285,16 +342,20 @@ class DerivativeAnalysisThread(AbstractAnalysisThread):
 
     @classmethod
     def getResultsFile(self):
-        return derivative.getResultsFile()
+        return self.getAnalysisModule().getResultsFile()
+
+    @classmethod
+    def getResultsFiles(self, options):
+        return self.getAnalysisModule().getResultsFiles(options)
 
     @classmethod
     def addCommandLineOptions(cls, optionParser):
         title = "Options for analysis '" + cls.getName() + "'"
         group = optionParser.add_argument_group(title.upper())
-        derivative.addCommandLineOptions(group)
+        commandline.addDerivativeOptions(group)
 
     def analyze(self, folder):
-        derivative.apply(folder)
+        self.getAnalysisModule().apply(folder, self.stream, self.options)
 
 
 class InteractionAnalysisThread(AbstractAnalysisThread):
@@ -308,16 +369,20 @@ class InteractionAnalysisThread(AbstractAnalysisThread):
 
     @classmethod
     def getResultsFile(self):
-        return interaction.getResultsFile()
+        return self.getAnalysisModule().getResultsFile()
+
+    @classmethod
+    def getResultsFiles(self, options):
+        return self.getAnalysisModule().getResultsFiles(options)
 
     @classmethod
     def addCommandLineOptions(cls, optionParser):
         title = "Options for analyses '" + cls.getName() + "'"
         group = optionParser.add_argument_group(title.upper())
-        interaction.addCommandLineOptions(group)
+        commandline.addInteractionOptions(group)
 
     def analyze(self, folder):
-        interaction.apply(folder, self.options)
+        self.getAnalysisModule().apply(folder, self.options, self.stream)
 
 
 # #################################################
@@ -371,20 +436,22 @@ def getFoldersFromInputListFile(inputlist):
     return folders
 
 
-def applyFolders(kind, inputlist, options):
+def applyFolder(kind, folder, options):
     kinds = getKinds()
 
+    # get proper analysis thread and call it
+    threadClass = kinds[kind]
+    thread = threadClass(options, inputfolder=folder)
+    thread.run()
+
+
+def applyFolders(kind, inputlist, options):
     # get the list of projects/folders to process
     folders = getFoldersFromInputListFile(inputlist)
 
     # for each folder:
     for folder in folders:
-        # start preparations for this single folder
-
-        # get proper preparation thread and call it
-        threadClass = kinds[kind]
-        thread = threadClass(options, inputfolder=folder)
-        thread.run()
+        applyFolder(kind, folder, options)
 
 
 def applyFoldersAll(inputlist, options):
@@ -404,6 +471,12 @@ def main():
     # #################################################
     # main
 
+    with tracing.traceTo(options.trace):
+        run(options)
+
+
+def run(options):
+    '''Analyzes the input given by the parsed <options>.'''
     if (options.inputfile):
 
         # split --file argument
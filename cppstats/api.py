@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+# cppstats is a suite of analyses for measuring C preprocessor-based
+# variability in software product lines.
+# Copyright (C) 2014-2015 University of Passau, Germany
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+
+'''
+The programmatic interface of cppstats, e.g.:
+
+    from cppstats import api
+
+    result = api.analyzeFolder("general", "/local/repos/mpsolve/mpsolve-2.2",
+                               filenamesRelative=True)
+    table = result.table()  # the main results file, i.e., cppstats.csv
+    for row in table.rows:
+        print row[table.header.index("LOC")]
+
+Each call works on its own copy of the options and each analysis run keeps
+its state in its own context, so several calls can run at the same time in
+threads of one process (as long as they do not work on the same project
+folder).
+'''
+
+
+# #################################################
+# imports from the std-library
+
+import os
+import copy
+import tempfile
+from collections import OrderedDict
+
+# #################################################
+# imports from subfolders
+
+import cli, preparation, analysis
+import cppstats as cstats # import cppstats.py and avoid confusion with module
+
+from lib.resulttable import ResultTable, readResultTable
+
+
+# #################################################
+# results
+
+class AnalysisResult(object):
+    '''The results of one analysis of a project folder or a single file.
+    <tables> maps the names of the written result files to their content
+    (ResultTable); the main results file comes first.'''
+
+    def __init__(self, kind, project, tables):
+        self.kind = kind
+        self.project = project
+        self.tables = tables
+
+    def table(self, name=None):
+        '''Returns the ResultTable of the result file <name>, by default
+        the one of the main results file.'''
+        if name is None:
+            return self.tables.values()[0]
+        return self.tables[name]
+
+    def __repr__(self):
+        return "AnalysisResult(%r, %r, %r)" % (self.kind, self.project, self.tables.keys())
+
+
+def _readResult(kind, project, filenames):
+    tables = OrderedDict()
+    for filename in filenames:
+        if os.path.isfile(filename):
+            tables[os.path.basename(filename)] = readResultTable(filename)
+    return AnalysisResult(kind, project, tables)
+
+
+# #################################################
+# options
+
+def getOptions(**settings):
+    '''Returns the options of cppstats with their default values. The
+    <settings> override single options by the names they have in the
+    parsed command line (e.g., filenamesRelative=True, disc_jobs=4).'''
+    options = cli.getDefaultOptions(cstats.getKinds())
+    for (name, value) in settings.iteritems():
+        if not hasattr(options, name):
+            raise ValueError("unknown option '%s'" % (name,))
+        setattr(options, name, value)
+    return options
+
+
+def _getOptions(options, settings):
+    if options is None:
+        return getOptions(**settings)
+
+    # the preparation and analysis store the current input in the options
+    options = copy.copy(options)
+    for (name, value) in settings.iteritems():
+        setattr(options, name, value)
+    return options
+
+
+def _getKind(kind):
+    kinds = cstats.getKinds()
+    if kind not in kinds:
+        raise ValueError("unknown kind of analysis '%s' (one of: %s)" % (kind, ", ".join(kinds.keys())))
+    return kinds[kind]
+
+
+# #################################################
+# analyses
+
+def analyzeFolder(kind, folder, options=None, prepare=True, **settings):
+    '''Prepares and analyzes the project folder <folder> (with its source
+    files in the subfolder "source") by the analysis <kind> and returns
+    the AnalysisResult. The result files are written to <folder> as usual.
+    <options> are the options to use (see getOptions), <settings> override
+    single options. If <prepare> is False, the existing preparation
+    results are analyzed.'''
+    (preparationKind, analysisKind) = _getKind(kind)
+    options = _getOptions(options, settings)
+    folder = os.path.normpath(os.path.abspath(folder))
+
+    if prepare:
+        preparation.applyFolder(preparationKind, folder, options)
+    analysis.applyFolder(analysisKind, folder, options)
+
+    resultsfiles = analysis.getKinds()[analysisKind].getResultsFiles(options)
+    return _readResult(kind, os.path.basename(folder),
+                       [os.path.join(folder, resultsfile) for resultsfile in resultsfiles])
+
+
+def analyzeFile(kind, inputfile, outputfile=None, options=None, **settings):
+    '''Prepares and analyzes the single source file <inputfile> by the
+    analysis <kind> and returns the AnalysisResult (with the main results
+    file only). The results are written to <outputfile>; if it is not
+    given, to a temporary file that is removed afterwards.'''
+    _getKind(kind)
+    options = _getOptions(options, settings)
+    inputfile = os.path.normpath(os.path.abspath(inputfile))
+
+    if not os.path.isfile(inputfile):
+        raise IOError("input file '%s' cannot be found" % (inputfile,))
+
+    if outputfile is None:
+        (handle, resultsfile) = tempfile.mkstemp(suffix=".csv")
+        os.close(handle)
+    else:
+        resultsfile = os.path.normpath(os.path.abspath(outputfile))
+
+    try:
+        cstats.applyFile(kind, inputfile, resultsfile, options)
+        result = _readResult(kind, os.path.basename(inputfile), [resultsfile])
+    finally:
+        if outputfile is None and os.path.exists(resultsfile):
+            os.remove(resultsfile)
+    return result
@@ -0,0 +1,508 @@
+# -*- coding: utf-8 -*-
+# cppstats is a suite of analyses for measuring C preprocessor-based
+# variability in software product lines.
+# Copyright (C) 2014-2015 University of Passau, Germany
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+
+'''
+An end-to-end benchmark of cppstats (cppstats bench): a synthetic C project
+is generated, and each kind of preparation and analysis is run on it and
+timed as a stage of its own, e.g.:
+
+    $ cppstats bench --files 50 --lines 800 --output report.json
+    $ cppstats bench --files 50 --lines 800 --baseline report.json --threshold 0.2
+
+The JSON report holds the settings of the corpus, the available external
+tools, and the run times of all stages. Given a baseline report, the stages
+that got slower than allowed by the threshold are reported as regressions
+and the exit code is 1.
+
+The benchmark runs offline; a preparation whose external tools (srcml,
+xsltproc, astyle) are missing is skipped together with the analyses that
+depend on it. Only the JSON report is written to stdout (without --output);
+all other messages go to stderr.
+'''
+
+
+# #################################################
+# imports from the std-library
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import tempfile
+from argparse import ArgumentParser, RawTextHelpFormatter
+from collections import OrderedDict
+from distutils.spawn import find_executable
+
+# #################################################
+# imports from subfolders
+
+import cli, preparation, analysis
+import cppstats as cstats # import cppstats.py and avoid confusion with module
+
+from lib.manifest import clearManifests
+
+
+# #################################################
+# global constants
+
+__reportversion = 1
+
+# external tools needed by the preparations
+__preparationtools = {
+    'general': ['srcml', 'xsltproc'],
+    'discipline': ['srcml', 'xsltproc'],
+    'featurelocations': ['srcml', 'xsltproc'],
+    'pretty': ['astyle'],
+}
+
+
+# #################################################
+# synthetic corpus
+
+class CorpusGenerator(object):
+    '''This class generates the source files of a synthetic C project with
+    #ifdef annotations. The shape of the annotations is given by <settings>
+    (see addCommandLineOptions); the same settings and seed always give the
+    same files. The lines of the C files are built by getDirective,
+    getStatement, getFunctionStart, getFunctionEnd, and getIncludes, which
+    can be overridden to write the files in another form (e.g., as srcML
+    in benchmarks/makefixtures.py).'''
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.random = random.Random(settings.seed)
+        self.features = ["FEATURE_%d" % i for i in range(max(1, settings.features))]
+
+    def getDirective(self, directive, expression=None):
+        '''Returns the line of the preprocessor directive <directive>.'''
+        if expression is None:
+            return "#" + directive
+        return "#%s %s" % (directive, expression)
+
+    def getStatement(self, indent, expression):
+        '''Returns the line of the expression statement <expression>.'''
+        return indent + expression + ";"
+
+    def getFunctionStart(self, name):
+        '''Returns the lines of a function <name> up to its body.'''
+        return ["int %s(int x, int y)" % name, "{"]
+
+    def getFunctionEnd(self):
+        '''Returns the lines of a function after its body.'''
+        return ["    return x + y;", "}"]
+
+    def getIncludes(self, index):
+        '''Returns the first lines of the C file <index>.'''
+        return ["#include \"header_%d.h\"" % (index % max(1, self.settings.headers)), ""]
+
+    def getFeature(self):
+        return self.random.choice(self.features)
+
+    def getSignature(self):
+        '''Returns a feature expression of up to --complexity feature
+        constants.'''
+        terms = []
+        for _ in range(self.random.randint(1, max(1, self.settings.complexity))):
+            feature = self.getFeature()
+            choice = self.random.random()
+            if choice < 0.6:
+                term = "defined(%s)" % feature
+            elif choice < 0.8:
+                term = "%s > %d" % (feature, self.random.randint(0, 3))
+            else:
+                term = feature
+            if self.random.random() < 0.25:
+                term = "!" + term if term.startswith("defined") else "!(%s)" % term
+            terms.append(term)
+
+        signature = terms[0]
+        for term in terms[1:]:
+            signature += self.random.choice([" && ", " || "]) + term
+        return signature
+
+    def getCondition(self):
+        '''Returns the directive that opens an annotation.'''
+        choice = self.random.random()
+        if choice < 0.3:
+            return self.getDirective("ifdef", self.getFeature())
+        elif choice < 0.4:
+            return self.getDirective("ifndef", self.getFeature())
+        return self.getDirective("if", self.getSignature())
+
+    def isAnnotated(self, depth):
+        return depth < self.settings.depth and self.random.random() < self.settings.density
+
+    def addStatements(self, lines, count, depth, indent):
+        '''Adds <count> statements of a function body, some of them
+        annotated.'''
+        for _ in range(count):
+            if self.isAnnotated(depth):
+                if self.random.random() < self.settings.undisciplined:
+                    self.addUndisciplinedAnnotation(lines, indent)
+                else:
+                    self.addAnnotation(lines, depth, indent,
+                                       lambda: self.addStatements(lines, self.random.randint(1, 3),
+                                                                  depth + 1, indent))
+            else:
+                lines.append(self.getStatement(indent, "x = x * %d + %d" % (self.random.randint(1, 9),
+                                                                            self.random.randint(0, 99))))
+
+    def addAnnotation(self, lines, depth, indent, addContent):
+        '''Adds a disciplined annotation with a chain of up to --elifs
+        #elif branches and, sometimes, an #else branch.'''
+        lines.append(self.getCondition())
+        addContent()
+        for _ in range(self.random.randint(0, self.settings.elifs)):
+            lines.append(self.getDirective("elif", self.getSignature()))
+            addContent()
+        if self.random.random() < 0.3:
+            lines.append(self.getDirective("else"))
+            addContent()
+        lines.append(self.getDirective("endif"))
+
+    def addUndisciplinedAnnotation(self, lines, indent):
+        '''Adds an annotation of a part of an expression or of a lone brace.'''
+        if self.random.random() < 0.5:
+            lines.append(indent + "if (x > %d" % self.random.randint(0, 9))
+            lines.append(self.getDirective("if", self.getSignature()))
+            lines.append(indent + "    && y < %d" % self.random.randint(0, 9))
+            lines.append(self.getDirective("endif"))
+            lines.append(indent + "   ) {")
+            lines.append(indent + "    x--;")
+            lines.append(indent + "}")
+        else:
+            lines.append(self.getDirective("if", self.getSignature()))
+            lines.append(indent + "if (y > 0) {")
+            lines.append(self.getDirective("else"))
+            lines.append(indent + "if (y < 0) {")
+            lines.append(self.getDirective("endif"))
+            lines.append(indent + "    y = -y;")
+            lines.append(indent + "}")
+
+    def addFunction(self, lines, name, depth):
+        lines.extend(self.getFunctionStart(name))
+        self.addStatements(lines, self.random.randint(3, 12), depth, "    ")
+        lines.extend(self.getFunctionEnd())
+        lines.append("")
+
+    def getSourceFile(self, index):
+        '''Returns the lines of the C file <index>.'''
+        lines = self.getIncludes(index)
+        function = 0
+        while len(lines) < self.settings.lines:
+            name = "function_%d_%d" % (index, function)
+            function += 1
+            if self.isAnnotated(0):
+                self.addAnnotation(lines, 0, "", lambda: self.addFunction(lines, name, 1))
+            else:
+                self.addFunction(lines, name, 0)
+        return lines
+
+    def getHeaderFile(self, index):
+        '''Returns the lines of the header file <index>.'''
+        guard = "HEADER_%d_H" % index
+        lines = ["#ifndef " + guard, "#define " + guard, ""]
+        declaration = 0
+        while len(lines) < self.settings.lines / 4:
+            if self.isAnnotated(0):
+                feature = self.getFeature()
+                lines.append("#ifndef " + feature)
+                lines.append("#define %s %d" % (feature, self.random.randint(0, 3)))
+                lines.append("#endif")
+            else:
+                lines.append("extern int variable_%d_%d;" % (index, declaration))
+            declaration += 1
+        lines.append("")
+        lines.append("#endif")
+        return lines
+
+    def generate(self, folder):
+        '''Writes the project to <folder> (with the source files in the
+        subfolder "source") and returns the number of files and bytes.'''
+        source = os.path.join(folder, preparation.AbstractPreparationThread.sourcefolder)
+        if os.path.isdir(folder):
+            shutil.rmtree(folder)
+        os.makedirs(source)
+
+        files = [("header_%d.h" % i, self.getHeaderFile(i)) for i in range(self.settings.headers)]
+        files += [("file_%d.c" % i, self.getSourceFile(i)) for i in range(self.settings.files)]
+
+        size = 0
+        for (name, lines) in files:
+            content = "\n".join(lines) + "\n"
+            with open(os.path.join(source, name), 'w') as fd:
+                fd.write(content)
+            size += len(content)
+        return (len(files), size)
+
+
+# #################################################
+# stages
+
+class _NullOutput(object):
+    def write(self, data):
+        pass
+
+    def flush(self):
+        pass
+
+
+def _getMissingTools(preparationkind):
+    return [tool for tool in __preparationtools.get(preparationkind, [])
+            if find_executable(tool) is None]
+
+
+def _timeStage(function, repeat, verbose):
+    '''Runs <function> <repeat> times and returns the wall-clock times.'''
+    times = []
+    for _ in range(repeat):
+        # (stdout is kept for the report)
+        stdout = sys.stdout
+        sys.stdout = sys.stderr if verbose else _NullOutput()
+        try:
+            start = time.time()
+            function()
+            times.append(time.time() - start)
+        finally:
+            sys.stdout = stdout
+    return times
+
+
+def _getStageResult(times, files, size):
+    times = sorted(times)
+    middle = len(times) / 2
+    median = times[middle] if len(times) % 2 else (times[middle - 1] + times[middle]) / 2
+    return OrderedDict([
+        ("status", "ok"),
+        ("seconds", times),
+        ("min", times[0]),
+        ("median", median),
+        ("filesPerSecond", files / times[0] if times[0] > 0 else None),
+        ("bytesPerSecond", size / times[0] if times[0] > 0 else None),
+    ])
+
+
+def runStages(folder, settings, files, size):
+    '''Runs all preparation kinds and then all analysis kinds on the
+    project <folder> and returns the results per stage.'''
+    options = cli.getDefaultOptions(cstats.getKinds())
+    stages = OrderedDict()
+
+    # the corpus may have been generated again in the same folder
+    clearManifests()
+
+    # preparations
+    prepared = set()
+    for preparationkind in preparation.getKinds().keys():
+        name = "preparation." + preparationkind
+        if settings.kinds and preparationkind not in _getNeededPreparations(settings.kinds):
+            continue
+
+        missing = _getMissingTools(preparationkind)
+        if missing:
+            stages[name] = OrderedDict([("status", "skipped"),
+                                        ("reason", "missing tools: " + ", ".join(missing))])
+            print >> sys.stderr, "# skipping stage %s (missing tools: %s)" % (name, ", ".join(missing))
+            continue
+
+        print >> sys.stderr, "# running stage " + name
+        times = _timeStage(lambda: preparation.applyFolder(preparationkind, folder, options),
+                           settings.repeat, settings.verbose)
+        stages[name] = _getStageResult(times, files, size)
+        prepared.add(preparationkind)
+
+    # analyses
+    for (kind, (preparationkind, analysiskind)) in cstats.getKinds().iteritems():
+        name = "analysis." + analysiskind
+        if settings.kinds and kind not in settings.kinds:
+            continue
+
+        if preparationkind not in prepared:
+            stages[name] = OrderedDict([("status", "skipped"),
+                                        ("reason", "preparation '%s' not run" % preparationkind)])
+            print >> sys.stderr, "# skipping stage %s (preparation '%s' not run)" % (name, preparationkind)
+            continue
+
+        print >> sys.stderr, "# running stage " + name
+        times = _timeStage(lambda: analysis.applyFolder(analysiskind, folder, options),
+                           settings.repeat, settings.verbose)
+        stages[name] = _getStageResult(times, files, size)
+
+    return stages
+
+
+def _getNeededPreparations(kinds):
+    allkinds = cstats.getKinds()
+    return set(allkinds[kind][0] for kind in kinds if kind in allkinds) | \
+        set(kind for kind in kinds if kind in preparation.getKinds())
+
+
+# #################################################
+# report and comparison
+
+def _getCorpusSettings(settings):
+    return OrderedDict((name, getattr(settings, name)) for name in
+                       ["files", "headers", "lines", "density", "depth", "elifs",
+                        "complexity", "undisciplined", "features", "seed"])
+
+
+def getReport(settings, corpus, stages):
+    return OrderedDict([
+        ("version", __reportversion),
+        ("created", time.strftime("%Y-%m-%dT%H:%M:%S")),
+        ("cppstats", cstats.version()),
+        ("python", platform.python_version()),
+        ("platform", platform.platform()),
+        ("tools", OrderedDict((tool, find_executable(tool))
+                              for tool in ["srcml", "xsltproc", "astyle"])),
+        ("corpus", corpus),
+        ("repeat", settings.repeat),
+        ("stages", stages),
+    ])
+
+
+def compareReports(report, baseline, threshold, minDelta):
+    '''Compares the minimal run times of the stages in <report> to the ones
+    in <baseline>. A stage is a regression if it is slower by more than the
+    relative <threshold> and by more than <minDelta> seconds. Returns the
+    list of regressed stages.'''
+    if baseline.get("corpus", {}).get("settings") != report["corpus"]["settings"]:
+        print >> sys.stderr, "WARNING: the baseline was measured on a corpus with other settings!"
+
+    regressions = []
+    print >> sys.stderr, "%-30s %10s %10s %8s" % ("stage", "baseline", "current", "change")
+    for (name, stage) in report["stages"].iteritems():
+        base = baseline.get("stages", {}).get(name)
+        if stage["status"] != "ok" or not base or base.get("status") != "ok":
+            print >> sys.stderr, "%-30s %10s %10s %8s" % (name, "-", "-", "-")
+            continue
+
+        change = (stage["min"] - base["min"]) / base["min"] if base["min"] > 0 else 0.0
+        regression = change > threshold and stage["min"] - base["min"] > minDelta
+        print >> sys.stderr, "%-30s %9.3fs %9.3fs %+7.1f%%%s" % (name, base["min"], stage["min"], change * 100,
+                                                                 "  REGRESSION" if regression else "")
+        if regression:
+            regressions.append(name)
+    return regressions
+
+
+# #################################################
+# add command line options
+
+def addCommandLineOptions(optionparser):
+    group = optionparser.add_argument_group("SYNTHETIC CORPUS")
+    group.add_argument("--files", dest="files", type=int, default=20,
+                       help="number of C files [default: %(default)s]")
+    group.add_argument("--headers", dest="headers", type=int, default=5,
+                       help="number of header files [default: %(default)s]")
+    group.add_argument("--lines", dest="lines", type=int, default=400,
+                       help="lines per C file (header files get a quarter) [default: %(default)s]")
+    group.add_argument("--density", dest="density", type=float, default=0.15,
+                       help="probability that a function or statement is annotated [default: %(default)s]")
+    group.add_argument("--depth", dest="depth", type=int, default=3,
+                       help="maximum nesting depth of annotations [default: %(default)s]")
+    group.add_argument("--elifs", dest="elifs", type=int, default=2,
+                       help="maximum length of #elif chains [default: %(default)s]")
+    group.add_argument("--complexity", dest="complexity", type=int, default=3,
+                       help="maximum number of feature constants per signature [default: %(default)s]")
+    group.add_argument("--undisciplined", dest="undisciplined", type=float, default=0.1,
+                       help="share of undisciplined annotations [default: %(default)s]")
+    group.add_argument("--features", dest="features", type=int, default=40,
+                       help="number of distinct feature constants [default: %(default)s]")
+    group.add_argument("--seed", dest="seed", type=int, default=1,
+                       help="seed of the random generator [default: %(default)s]")
+
+    group = optionparser.add_argument_group("BENCHMARK")
+    group.add_argument("--folder", dest="folder", default=None,
+                       help="project folder for the corpus; it is replaced!\n"
+                            "[default: a temporary folder that is removed afterwards]")
+    group.add_argument("--kinds", dest="kinds", nargs="+", metavar="K", default=None,
+                       help="run only the stages needed for the given kinds [default: all]")
+    group.add_argument("--repeat", dest="repeat", type=int, default=3,
+                       help="number of runs per stage; the fastest run counts [default: %(default)s]")
+    group.add_argument("--generateOnly", dest="generateOnly", action="store_true", default=False,
+                       help="only generate the corpus in --folder [default: %(default)s]")
+    group.add_argument("--output", dest="output", metavar="FILE", default=None,
+                       help="write the JSON report to FILE [default: stdout]")
+    group.add_argument("--baseline", dest="baseline", metavar="FILE", default=None,
+                       help="compare the run times to the JSON report FILE and exit with 1 on regressions")
+    group.add_argument("--threshold", dest="threshold", type=float, default=0.1,
+                       help="allowed relative slowdown of a stage against the baseline [default: %(default)s]")
+    group.add_argument("--minDelta", dest="minDelta", type=float, default=0.05,
+                       help="allowed absolute slowdown of a stage in seconds,\n"
+                            "to ignore noise on fast stages [default: %(default)s]")
+    group.add_argument("--verbose", dest="verbose", action="store_true", default=False,
+                       help="show the output of the stages [default: %(default)s]")
+
+
+# #################################################
+# main method
+
+def main(argv=None):
+    parser = ArgumentParser(prog="cppstats bench", formatter_class=RawTextHelpFormatter,
+                            description="Benchmark all preparations and analyses of cppstats "
+                                        "on a synthetic project.")
+    addCommandLineOptions(parser)
+    settings = parser.parse_args(argv)
+
+    if settings.generateOnly and not settings.folder:
+        parser.error("--generateOnly needs --folder")
+
+    folder = settings.folder
+    if folder is None:
+        tmpfolder = tempfile.mkdtemp(prefix="cppstats-bench-")
+        folder = os.path.join(tmpfolder, "project")
+    folder = os.path.normpath(os.path.abspath(folder))
+
+    try:
+        (files, size) = CorpusGenerator(settings).generate(folder)
+        print >> sys.stderr, "# generated %d files (%d bytes) in %s" % (files, size, folder)
+        if settings.generateOnly:
+            return
+
+        corpus = OrderedDict([("settings", _getCorpusSettings(settings)),
+                              ("files", files), ("bytes", size)])
+        report = getReport(settings, corpus, runStages(folder, settings, files, size))
+    finally:
+        if settings.folder is None:
+            shutil.rmtree(tmpfolder)
+
+    if settings.output:
+        with open(settings.output, 'w') as fd:
+            json.dump(report, fd, indent=2)
+            fd.write("\n")
+        print >> sys.stderr, "# wrote report to " + settings.output
+    else:
+        print json.dumps(report, indent=2)
+
+    if settings.baseline:
+        with open(settings.baseline) as fd:
+            baseline = json.load(fd, object_pairs_hook=OrderedDict)
+        regressions = compareReports(report, baseline, settings.threshold, settings.minDelta)
+        if regressions:
+            print >> sys.stderr, "ERROR: %d stage(s) regressed: %s" % (len(regressions), ", ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -33,6 +33,9 @@ from argparse import ArgumentParser, RawTextHelpFormatter, _VersionAction  # for
 
 import preparation, analysis
 import cppstats as cstats # import cppstats.py and avoid confusion with module
+from link_or_copy_file import STAGING_MODES
+
+from analyses import commandline
 
 
 # #################################################
@@ -90,7 +93,7 @@ class CppstatsVersionAction(_VersionAction):
 # #################################################
 # construct ArgumentParser
 
-def getOptions(kinds, step=steps.ALL):
+def getOptions(kinds, step=steps.ALL, argv=None):
     """
     Constructs the parser needed for cppstats. Includes following procedure:
       * addition of step-specific arguments
@@ -98,22 +101,75 @@ def getOptions(kinds, step=steps.ALL):
       * addition of constants
       * checking of constraints
 
+    :arg kinds : the list of preperation/analysis kinds, dependent on the step parameter
+    :arg step : the variant of cppstats to execute: one of cli.steps (ALL, PREPARATION, ANALYSIS)
+    :arg argv : the arguments to parse [default: sys.argv[1:]]
+    :rtype : the resulting options
+    """
+
+    parser = getParser(kinds, step)
+
+    # PARSE OPTIONS
+
+    options = parser.parse_args(argv)
+
+
+    # ADD CONSTANTS TO OPTIONS
+
+    addConstants(options)
+
+
+    # CHECK CONSTRAINTS ON OPTIONS
+
+    checkConstraints(options)
+
+
+    # RETURN
+
+    return options
+
+
+def getDefaultOptions(kinds, step=steps.ALL):
+    """
+    Returns the options with all default values, but without any input;
+    the constraints are not checked (e.g., for the library API).
+
     :arg kinds : the list of preperation/analysis kinds, dependent on the step parameter
     :arg step : the variant of cppstats to execute: one of cli.steps (ALL, PREPARATION, ANALYSIS)
     :rtype : the resulting options
     """
 
+    options = getParser(kinds, step).parse_args([])
+    options.inputlist = None
+    addConstants(options)
+    return options
+
+
+def getParser(kinds, step=steps.ALL):
+    """
+    Constructs the parser needed for cppstats, including the step-specific arguments.
+
+    :arg kinds : the list of preperation/analysis kinds, dependent on the step parameter
+    :arg step : the variant of cppstats to execute: one of cli.steps (ALL, PREPARATION, ANALYSIS)
+    :rtype : the parser
+    """
+
     parser = ArgumentParser(formatter_class=RawTextHelpFormatter)
 
     # version (uses CppstatsVersionAction instead of 'version' as action)
     parser.add_argument('--version', action=CppstatsVersionAction, version=cstats.version())
     
     parser.add_argument(OPT_LAZY_PREP, action="store_true", dest="lazyPreparation", default=False,
-                        help="Perform preparations lazily: If the prepared srcml file already exists don't recompute it. [default: %(default)s]")
+                        help="Perform preparations lazily: If the prepared srcml file already exists don't recompute it, unless the source file changed since it was copied. [default: %(default)s]")
     
     parser.add_argument(OPT_PREPARE_FROM, dest="prepareFrom", metavar="LIST_FILE",
                         help="Try to reuse cppstats preparation results from the folders listed in the file LIST_FILE (one folder per line). If, during preparation of a source file, an identical source file can be found in one of those folders, do not prepare it again, but instead, copy the previous preparation results. Implies `%s'." %(OPT_LAZY_PREP,))
 
+    parser.add_argument("--trace", dest="trace", metavar="FILE", default=None,
+                        help="write the timing of the stages of the run (preparation steps, external tools,\n"
+                             "analyzed files, ...) to FILE as Chrome trace events (see lib/tracing.py)")
+    commandline.addProgressOptions(parser)
+
     # ADD KIND ARGUMENT
 
     # kinds
@@ -153,16 +209,44 @@ def getOptions(kinds, step=steps.ALL):
     if step == steps.ALL or step == steps.PREPARATION:
         parser.add_argument("--nobak", action="store_true", dest="nobak", default=False,
                             help="do not backup files during preparation [default: %(default)s]")
+        parser.add_argument("--snapshots", choices=preparation.SNAPSHOT_MODES, dest="snapshots", default="files",
+                            help="how to backup files before each preparation step, if --nobak is not given [default: %(default)s]\n"
+                                 "(files=one .bakN file per step, failure=.bakN files only for files whose preparation fails,\n"
+                                 "archive=all steps of a file as one member of cppstats_snapshots.zip in the subfolder)")
+        parser.add_argument("--prepareJobs", type=int, dest="prepareJobs", default=1, metavar="N",
+                            help="number of files of a project that are prepared at the same time [default: %(default)s]\n"
+                                 "(the Python steps of some files run while external tools process other files)")
+        parser.add_argument("--maxToolProcesses", type=int, dest="maxToolProcesses", default=0, metavar="P",
+                            help="maximum number of external tools (srcml, xsltproc, astyle) running at the same time\n"
+                                 "[default: same as --prepareJobs]")
+        parser.add_argument("--pipes", action="store_true", dest="pipes", default=False,
+                            help="connect chained external tools by pipes instead of temporary files [default: %(default)s]\n"
+                                 "(if a pipeline fails, the file is processed with temporary files again)")
+        parser.add_argument("--astyleBatch", type=int, dest="astyleBatch", default=0, metavar="N",
+                            help="format up to N files with a single astyle process (pretty preparation) [default: %(default)s]\n"
+                                 "(0=one astyle process per file)")
+        parser.add_argument("--toolTimeout", type=float, dest="toolTimeout", default=0, metavar="SECONDS",
+                            help="kill external tools that run longer than SECONDS [default: %(default)s]\n"
+                                 "(0=no limit; files whose preparation is killed are quarantined)")
+        parser.add_argument("--fileTimeout", type=float, dest="fileTimeout", default=0, metavar="SECONDS",
+                            help="quarantine files whose preparation takes longer than SECONDS [default: %(default)s]\n"
+                                 "(0=no limit; quarantined files are listed in cppstats_quarantine.json in the\n"
+                                 "project folder and skipped until their content changes; not kept with --file)")
+        parser.add_argument("--staging", choices=STAGING_MODES, dest="staging", default="copy",
+                            help="how source files are put into the preparation subfolders [default: %(default)s]\n"
+                                 "(hardlink and reflink avoid copying the files; auto tries reflink, then hardlink;\n"
+                                 "all modes fall back to copying)")
 
     # add general CLI options applying for all or several analyses
     if step == steps.ALL or step == steps.ANALYSIS:
-        # constants for the choices of '--filenames' are added in method 'addConstants'
-        parser.add_argument("--filenames", choices=[0, 1], dest="filenames", default=0,
-                            help="determines the file paths to print [default: %(default)s]\n"
-                                 "(0=paths to srcML files, 1=paths to source files)")
-        parser.add_argument("--filenamesRelative", action="store_true", dest="filenamesRelative", default=False,
-                            help="print relative file names [default: %(default)s]\n"
-                                 "e.g., '/projects/apache/_cppstats/afile.c.xml' becomes 'afile.c.xml'.")
+        commandline.addFilenameOptions(parser)
+        parser.add_argument("--sqlite", dest="sqlite", metavar="DB", default=None,
+                            help="additionally store the results of each project in the SQLite database DB\n"
+                                 "(with --list only; see cppstats/sqlitestore.py for the tables)")
+        parser.add_argument("--ndjson", dest="ndjson", metavar="FILE", default=None,
+                            help="additionally stream the results of each file and project to FILE as JSON Lines,\n"
+                                 "while the analysis runs (with --list only; see lib/resultstream.py)")
+        commandline.addAccountingOptions(parser)
 
 
     # ADD POSSIBLE PREPARATION/ANALYSIS KINDS AND THEIR COMMAND-LINE ARGUMENTS
@@ -186,31 +270,12 @@ def getOptions(kinds, step=steps.ALL):
         for cls in kinds.values():
             cls.addCommandLineOptions(parser)
 
-    # PARSE OPTIONS
-
-    options = parser.parse_args()
-
-
-    # ADD CONSTANTS TO OPTIONS
-
-    addConstants(options)
-
-
-    # CHECK CONSTRAINTS ON OPTIONS
-
-    checkConstraints(options)
-
-
-    # RETURN
-
-    return options
+    return parser
 
 
 def addConstants(options):
     # add option constants
-    # --filenames
-    options.FILENAME_SRCML = 0
-    options.FILENAME_SOURCE = 1
+    commandline.addFilenameConstants(options)
 
 def isReadableFile(fn):
     return os.path.isfile(fn) and os.access(fn, os.R_OK)
@@ -222,8 +287,8 @@ def checkConstraints(options):
         sys.exit(1)
 
     if options.inputfile:
-        if (not isReadableFile(options.infile)):
-            print >> sys.stderr, "ERROR: input file '{}' does not exist or cannot be read!".format(options.infile)
+        if (not isReadableFile(options.inputfile[0])):
+            print >> sys.stderr, "ERROR: input file '{}' does not exist or cannot be read!".format(options.inputfile[0])
             sys.exit(1)
             
     elif options.inputlist:
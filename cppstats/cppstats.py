@@ -45,6 +45,8 @@ import tempfile # for temporary files
 # import different kinds of analyses
 import cli, preparation, analysis
 
+from lib import tracing
+
 
 # #################################################
 # version number
@@ -77,6 +79,10 @@ if (len(__kinds) == 0) :
 __kinds = OrderedDict(__kinds)
 
 
+def getKinds():
+    return __kinds
+
+
 # #################################################
 # main method
 
@@ -112,6 +118,12 @@ def applyFoldersAll(inputlist, options):
 
 
 def main():
+    # the benchmark has options of its own (see bench.py)
+    if (sys.argv[1:2] == ["bench"]):
+        import bench
+        bench.main(sys.argv[2:])
+        return
+
     # #################################################
     # options parsing
 
@@ -120,6 +132,11 @@ def main():
     # #################################################
     # main
 
+    with tracing.traceTo(options.trace):
+        run(options)
+
+def run(options):
+    '''Prepares and analyzes the input given by the parsed <options>.'''
     if (options.inputfile):
 
         # split --file argument
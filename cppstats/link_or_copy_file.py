@@ -3,9 +3,15 @@
 import os
 import sys
 import shutil
+from collections import OrderedDict
 import argparse
 import errno
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
 def split_all(path):
     tails=[]
     while True:
@@ -126,6 +132,77 @@ def link_or_copy_file(srcPath, destPath, overwrite=False, verbose=False):
         if verbose:
             print >> sys.stderr, "%s -> %s" %(repr(srcPath)[1:-1],repr(destPath)[1:-1],)
 
+# ioctl request for cloning a file on Linux (_IOW(0x94, 9, int), see
+# linux/fs.h); supported by copy-on-write file systems like Btrfs and XFS
+_FICLONE = 0x40049409
+
+def reflink_file(srcPath, destPath):
+    '''Creates `destPath' as a copy-on-write clone of `srcPath', i.e., both
+    files share their data blocks until one of them is written. Raises an
+    IOError (or OSError) if the file system does not support this.'''
+    if fcntl is None or not sys.platform.startswith('linux'):
+        raise IOError(errno.EOPNOTSUPP, os.strerror(errno.EOPNOTSUPP), srcPath)
+    with open(srcPath, 'rb') as src:
+        try:
+            with open(destPath, 'wb') as dest:
+                fcntl.ioctl(dest.fileno(), _FICLONE, src.fileno())
+        except (IOError, OSError):
+            if os.path.lexists(destPath):
+                os.unlink(destPath)
+            raise
+    shutil.copystat(srcPath, destPath)
+
+def hardlink_file(srcPath, destPath):
+    '''Creates `destPath' as a hard link to `srcPath'. Raises an OSError if
+    this is not possible, e.g., across file systems.'''
+    os.link(srcPath, destPath)
+
+# error numbers indicating that a linking method is not supported at all
+_UNSUPPORTED_ERRNOS = frozenset(getattr(errno, name) for name in
+                                ('EXDEV', 'EOPNOTSUPP', 'ENOTSUP', 'ENOTTY', 'EINVAL',
+                                 'EPERM', 'ENOSYS', 'EMLINK')
+                                if hasattr(errno, name))
+
+# possible values for FileStager
+STAGING_MODES = ('copy', 'hardlink', 'reflink', 'auto')
+
+class FileStager(object):
+    '''Puts files into place by linking instead of copying them, if the
+    given mode asks for it. In mode `auto', reflinks are tried first, then
+    hard links. A linking method that fails once (e.g., because the file
+    system does not support it) is not tried again.
+
+    Note that users of linked files must never write to them in place, but
+    replace them (e.g., write to a temporary file and rename it), as the
+    source file would be changed otherwise.'''
+
+    _methods = OrderedDict([('reflink', reflink_file), ('hardlink', hardlink_file)])
+
+    def __init__(self, mode='copy'):
+        if mode not in STAGING_MODES:
+            raise ValueError("unknown staging mode: %s" % (mode,))
+        if mode == 'auto':
+            self.methods = self._methods.keys()
+        elif mode == 'copy':
+            self.methods = []
+        else:
+            self.methods = [mode]
+
+    def stage(self, srcPath, destPath):
+        '''Links `srcPath' to the (non-existing) `destPath' and returns the
+        name of the used method. If no linking method works, nothing is done
+        and `copy' is returned, so that the caller copies the file itself.'''
+        for method in list(self.methods):
+            try:
+                self._methods[method](srcPath, destPath)
+                return method
+            except (IOError, OSError) as e:
+                if e.errno not in _UNSUPPORTED_ERRNOS:
+                    break
+                print >> sys.stderr, "INFO: staging by %s is not possible (%s), falling back." % (method, e,)
+                self.methods.remove(method)
+        return 'copy'
+
 def strip_newline_at_end(fn):
     if fn.endswith('\n'):
         return fn[:-1]
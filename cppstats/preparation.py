@@ -33,8 +33,16 @@ import errno  # for error/exception handling
 import subprocess  # for calling other commands
 import re  # for regular expressions
 from abc import ABCMeta, abstractmethod  # abstract classes
-from collections import OrderedDict
+from collections import OrderedDict, namedtuple
 import filecmp
+import hashlib  # for detecting changed source files
+import json  # for the sync state of the subfolders
+import threading
+import zipfile  # for archived snapshots
+import copy  # for per-file copies of preparation threads
+import time  # for timeouts
+import Queue  # for the worker threads
+from contextlib import contextmanager
 
 # #################################################
 # paths
@@ -55,9 +63,11 @@ import cli
 # for deletion of include guards in H files
 from preparations import rewriteIfdefs, rewriteMultilineMacros, deleteIncludeGuards
 
-from lib import cpplib
+from lib import progress, tracing
+from lib.threadlocal import InheritedLocal, startThread
+from lib.manifest import getManifest, invalidateManifest
 
-from link_or_copy_file import link_or_copy_file
+from link_or_copy_file import link_or_copy_file, FileStager
 
 # #################################################
 # global constants
@@ -68,6 +78,13 @@ _filepattern = _filepattern_c + _filepattern_h
 
 _cvs_pattern = (".git", ".cvs", ".svn")
 
+# snapshots of the files before each preparation step (see --snapshots)
+SNAPSHOT_MODES = ('files', 'failure', 'archive')
+_snapshotarchive = "cppstats_snapshots.zip"
+
+# files whose preparation timed out (see Quarantine)
+_quarantinefile = "cppstats_quarantine.json"
+
 
 # #################################################
 # helper functions
@@ -89,16 +106,20 @@ def handle_cygwinlike_path(cygwin_path_like):
 
 
 # function for ignore pattern
-def filterForFiles(dirpath, contents, pattern=_filepattern):
-    filesToIgnore = [filename for filename in contents if
-                     not filename.endswith(pattern) and
-                     not os.path.isdir(os.path.join(dirpath, filename))
-                     ]
-    foldersToIgnore = [dir for dir in contents if
-                       dir in _cvs_pattern and
-                       os.path.isdir(os.path.join(dirpath, dir))
-                       ]
-    return filesToIgnore + foldersToIgnore
+def isFileToPrepare(relpath, pattern=_filepattern):
+    '''This function checks whether the path <relpath> (relative to the
+    project folder) is a C or H file outside of version control folders.'''
+    folders = os.path.dirname(relpath).split(os.sep)
+    return relpath.endswith(pattern) and \
+        not any(folder in _cvs_pattern for folder in folders)
+
+def findFilesToPrepare(folder, refresh=False):
+    '''This function returns the paths of all files in <folder> and its
+    subfolders that are to be prepared. The paths are taken from the
+    manifest of <folder>.'''
+    return [os.path.join(folder, entry.relpath)
+            for entry in getManifest(folder, refresh)
+            if isFileToPrepare(entry.relpath)]
 
 def dieWithExSoftware(command, returnCode):
     print >> sys.stderr, "ERROR Command %s failed with exitcode %d and was killed by an OS signal." \
@@ -122,24 +143,332 @@ def makeBashCommandErrorHandler(osErrorHandler=dieWithExSoftware):
 
 defaultBashCommandErrorHandler = makeBashCommandErrorHandler()
 
-def runBashCommand(command, shell=False, stdin=None, stdout=None, onFailure=defaultBashCommandErrorHandler):
+
+class PreparationTimeout(Exception):
+    '''Raised if an external tool or the preparation of a file takes longer
+    than allowed (see --toolTimeout and --fileTimeout).'''
+    pass
+
+
+class ExternalTools(object):
+    '''This class limits the number of external tools (srcml, xsltproc,
+    astyle) running at the same time and keeps track of the processes and
+    of the file handles opened for them. It also enforces the time limits
+    for single tools and for the preparation of a file (the deadline of
+    the file is kept per thread).
+    Each preparation run has tools of its own with its own limits and
+    statistics, so that runs at the same time (e.g., requests of
+    cppstats/server.py) do not change each other's settings; the external
+    tools called by a thread are the ones given to useExternalTools.'''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.slots = None
+        self.maxProcesses = 0
+        self.timeout = 0
+        self.local = threading.local()
+        self.resetStatistics()
+
+    def setTimeout(self, timeout):
+        '''Allows each external process to run for at most <timeout>
+        seconds; 0 means no limit.'''
+        self.timeout = timeout
+
+    def setFileDeadline(self, deadline):
+        '''Sets the point in time (or None) at which the preparation of the
+        file handled by the current thread has to be finished.'''
+        self.local.deadline = deadline
+
+    def getFileDeadline(self):
+        return getattr(self.local, 'deadline', None)
+
+    def checkFileDeadline(self, what):
+        '''Raises PreparationTimeout if the deadline of the current file has
+        passed; otherwise, returns the remaining seconds (or None).'''
+        deadline = self.getFileDeadline()
+        if deadline is None:
+            return None
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            raise PreparationTimeout("time for preparing the file is up before %s" % (what,))
+        return remaining
+
+    def getTimeout(self, command):
+        '''Returns the number of seconds <command> may run (or None).'''
+        timeout = self.checkFileDeadline(repr(command))
+        if self.timeout > 0:
+            timeout = self.timeout if timeout is None else min(timeout, self.timeout)
+        return timeout
+
+    @contextmanager
+    def watchdog(self, processes, timeout):
+        '''Kills the <processes> if they run for more than <timeout>
+        seconds. Yields a list that is non-empty after the processes were
+        killed.'''
+        expired = []
+        if timeout is None:
+            yield expired
+            return
+
+        def kill():
+            expired.append(timeout)
+            for process in processes:
+                try:
+                    process.kill()
+                except OSError:
+                    pass  # already finished
+
+        timer = threading.Timer(timeout, kill)
+        timer.daemon = True
+        timer.start()
+        try:
+            yield expired
+        finally:
+            timer.cancel()
+
+    def resetStatistics(self):
+        with self.lock:
+            self.started = 0
+            self.running = 0
+            self.peakRunning = 0
+            self.openHandles = 0
+            self.peakOpenHandles = 0
+
+    def setMaxProcesses(self, maxProcesses):
+        '''Allows at most <maxProcesses> external processes at the same
+        time; 0 means no limit.'''
+        with self.lock:
+            if maxProcesses == self.maxProcesses:
+                return
+            self.maxProcesses = maxProcesses
+            if maxProcesses > 0:
+                self.slots = threading.BoundedSemaphore(maxProcesses)
+            else:
+                self.slots = None
+
+    @contextmanager
+    def openFile(self, filename, mode):
+        '''Opens <filename> for an external process and closes it afterwards.
+        Yields None if no filename is given.'''
+        if filename is None:
+            yield None
+            return
+        with open(filename, mode) as handle:
+            with self.lock:
+                self.openHandles += 1
+                self.peakOpenHandles = max(self.peakOpenHandles, self.openHandles)
+            try:
+                yield handle
+            finally:
+                with self.lock:
+                    self.openHandles -= 1
+
+    @contextmanager
+    def processSlot(self, processes=1):
+        '''Waits until another external process may be started. A pipeline
+        of several <processes> takes a single slot.'''
+        # the limit may be changed in the meantime, so the acquired
+        # semaphore is the one to release
+        slots = self.slots
+        if slots is not None:
+            slots.acquire()
+        with self.lock:
+            self.started += processes
+            self.running += processes
+            self.peakRunning = max(self.peakRunning, self.running)
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.running -= processes
+            if slots is not None:
+                slots.release()
+
+    def getStatistics(self):
+        with self.lock:
+            return "%d processes (at most %d at the same time), at most %d open file handles" \
+                % (self.started, self.peakRunning, self.peakOpenHandles)
+
+# the tools used outside of preparation runs
+externalTools = ExternalTools()
+
+_currentTools = InheritedLocal()
+
+
+def getExternalTools():
+    '''Returns the external tools of the preparation run of the current
+    thread (see useExternalTools).'''
+    return getattr(_currentTools, 'tools', None) or externalTools
+
+
+@contextmanager
+def useExternalTools(tools):
+    '''Runs the external tools of the current thread with <tools>.'''
+    previous = getattr(_currentTools, 'tools', None)
+    _currentTools.tools = tools
+    try:
+        yield tools
+    finally:
+        _currentTools.tools = previous
+
+
+def _prepareCommand(command):
     # split command if not a list/tuple is given already
     if type(command) is str:
         command = command.split()
 
-    print("\033[31;1;4mDEBUG " + str (command) + "\033[0m")
     if len(command) >= 2 and command[1].startswith("/cygdrive"):
         command[1] = handle_cygwinlike_path(command[1])
-        print("\033[31;1;4mDEBUG " + str (command) + "\033[0m")
-    process = subprocess.Popen(command, shell=shell, stdin=stdin, stdout=stdout, stderr=stdout)
-    out, err = process.communicate()  # TODO do something with the output
-    process.wait()
-
+    return command
 
+def runBashCommand(command, shell=False, stdin=None, stdout=None, onFailure=defaultBashCommandErrorHandler):
+    '''Runs the external tool <command>. <stdin> and <stdout> are the names
+    of the files to read the input from and to write the output (and
+    errors) to; they are opened for the tool and closed afterwards.'''
+    command = _prepareCommand(command)
+    tools = getExternalTools()
+
+    with tools.openFile(stdin, 'r') as fin:
+        with tools.openFile(stdout, 'w+') as fout:
+            with tools.processSlot():
+                timeout = tools.getTimeout(command)
+                with tracing.span(os.path.basename(command[0]), "tool", command=" ".join(command)):
+                    process = subprocess.Popen(command, shell=shell, stdin=fin, stdout=fout, stderr=fout,
+                                               close_fds=True)
+                    with tools.watchdog([process], timeout) as expired:
+                        process.communicate()  # TODO do something with the output
+
+    if expired:
+        raise PreparationTimeout("command %s was killed after %.1f seconds" % (repr(command), timeout,))
     if process.returncode != 0:
         return onFailure(command, process.returncode)
     return process.returncode
 
+
+def runPipeline(commands, stdin=None, stdout=None):
+    '''Runs the external tools <commands> connected by pipes, i.e., the
+    output of each tool is the input of the next one, without intermediate
+    files. <stdin> and <stdout> are the names of the files the first tool
+    reads from and the last tool writes to. Returns the list of exit codes
+    of the tools.'''
+    commands = map(_prepareCommand, commands)
+    tools = getExternalTools()
+
+    with tools.openFile(stdin, 'r') as fin:
+        with tools.openFile(stdout, 'w+') as fout:
+            with tools.processSlot(len(commands)):
+                timeout = tools.getTimeout(commands)
+                processes = []
+                try:
+                    source = fin
+                    for number, command in enumerate(commands):
+                        islast = (number == len(commands) - 1)
+                        process = subprocess.Popen(command, stdin=source,
+                                                   stdout=fout if islast else subprocess.PIPE,
+                                                   close_fds=True)
+                        if processes:
+                            # only the new process reads from this pipe
+                            processes[-1].stdout.close()
+                        processes.append(process)
+                        source = process.stdout
+                except OSError:
+                    for process in processes:
+                        process.kill()
+                        process.wait()
+                    raise
+                with tracing.span(" | ".join(os.path.basename(command[0]) for command in commands), "tool"):
+                    with tools.watchdog(processes, timeout) as expired:
+                        exitcodes = [process.wait() for process in processes]
+
+    if expired:
+        raise PreparationTimeout("pipeline %s was killed after %.1f seconds" % (repr(commands), timeout,))
+    return exitcodes
+
+
+def formatFile(filename):
+    '''Formats the file <filename> with astyle in Java-style.'''
+    tmp = filename + "tmp.txt"
+
+    shutil.move(filename, tmp)  # move for script
+    try:
+        runBashCommand(["astyle", "--style=java"], stdin=tmp, stdout=filename)
+    except BaseException:
+        shutil.move(tmp, filename)  # restore the unformatted file
+        raise
+
+    os.remove(tmp)  # remove temp file
+
+def formatFiles(filenames):
+    '''Formats all files <filenames> in place with a single astyle process.
+    If astyle fails, each file is formatted by a process of its own again,
+    so that errors are reported for the single files. Returns the files
+    whose formatting timed out, with the reason; they are left unformatted.
+    NOTE: astyle writes the files in place, so they must not be (hard-)linked
+    to the source files anymore.'''
+    # a killed astyle may leave a file half-written
+    contents = {}
+    for filename in filenames:
+        with open(filename, 'rb') as source:
+            contents[filename] = source.read()
+
+    try:
+        returnCode = runBashCommand(["astyle", "--style=java", "--suffix=none", "--quiet"] + filenames)
+    except PreparationTimeout as e:
+        print >> sys.stderr, "WARN %s" % (e,)
+        returnCode = None
+
+    timedout = []
+    if returnCode != 0:
+        print >> sys.stderr, "INFO formatting %d files at once failed. Formatting them one by one ..." \
+            %(len(filenames),)
+        for filename in filenames:
+            with open(filename, 'wb') as target:
+                target.write(contents[filename])
+            try:
+                formatFile(filename)
+            except PreparationTimeout as e:
+                timedout.append((filename, str(e)))
+    return timedout
+
+def runInThreads(function, items, jobs):
+    '''Calls <function> for each of the <items> using <jobs> worker threads.
+    If a call raises an exception (or calls sys.exit), no further items are
+    started and the exception is re-raised in the calling thread as soon as
+    the running calls are finished. The workers inherit the thread-local
+    state of the calling thread (see lib/threadlocal.py), e.g., its
+    external tools.'''
+    if jobs <= 1:
+        for item in items:
+            function(item)
+        return
+
+    queue = Queue.Queue()
+    for item in items:
+        queue.put(item)
+    errors = []
+
+    def worker():
+        while not errors:
+            try:
+                item = queue.get_nowait()
+            except Queue.Empty:
+                return
+            try:
+                function(item)
+            except BaseException:
+                errors.append(sys.exc_info())
+                return
+
+    threads = [startThread(worker) for _ in xrange(jobs)]
+    for thread in threads:
+        # join with timeout, so that the main thread still gets KeyboardInterrupt
+        while thread.is_alive():
+            thread.join(0.5)
+
+    if errors:
+        exctype, value, traceback = errors[0]
+        raise exctype, value, traceback
+
               
 def replaceMultiplePatterns(replacements, infile, outfile):
     with open(infile, "rb") as source:
@@ -170,7 +499,7 @@ def src2srcml(src, srcml, osErrorHandler=dieWithExSoftware):
     errorHandler = makeBashCommandErrorHandler(osErrorHandler)
     __s2sml = "srcml"
     runBashCommand([__s2sml, src, "--language=C"]
-                   , stdout=open(srcml, 'w+')
+                   , stdout=srcml
                    , onFailure=errorHandler
     ) # + " -o " + srcml)
     # FIXME incorporate "|| rm ${f}.xml" from bash
@@ -178,80 +507,128 @@ def src2srcml(src, srcml, osErrorHandler=dieWithExSoftware):
 
 def srcml2src(srcml, src):
     __sml2s = "srcml"
-    runBashCommand([__sml2s, srcml], stdout=open(src, 'w+'))  # + " -o " + src)
+    # do not write through a (hard-)linked source file
+    silentlyRemoveFile(src)
+    runBashCommand([__sml2s, srcml], stdout=src)  # + " -o " + src)
 
-def copy_missing_files(src_dir, dest_dir, ignore=None):
+# name of the file (in the destination folder) that holds the state of the
+# last sync, i.e., size, mtime, and md5 digest of each copied source file
+# (the digest is None for linked files)
+_syncstatefile = ".cppstats_sync.json"
+
+# result of copy_missing_files; each field is a list of relative paths
+SyncReport = namedtuple('SyncReport', ['new', 'changed', 'removed', 'unchanged'])
+
+
+def _readSyncState(dest_dir):
+    try:
+        with open(os.path.join(dest_dir, _syncstatefile), 'r') as statefile:
+            return json.load(statefile)
+    except (IOError, ValueError):
+        return {}
+
+
+def _writeSyncState(dest_dir, state):
+    with open(os.path.join(dest_dir, _syncstatefile), 'w') as statefile:
+        json.dump(state, statefile, sort_keys=True)
+
+
+def _hashFile(filename):
+    md5 = hashlib.md5()
+    with open(filename, 'rb') as source:
+        for chunk in iter(lambda: source.read(1 << 16), b''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def _copyAndHashFile(src_file, dest_file):
+    '''Copies <src_file> to <dest_file> (like shutil.copy2) and returns the md5
+    digest of the copied content, so that the file is read only once.'''
+    md5 = hashlib.md5()
+    with open(src_file, 'rb') as source:
+        with open(dest_file, 'wb') as target:
+            for chunk in iter(lambda: source.read(1 << 16), b''):
+                md5.update(chunk)
+                target.write(chunk)
+    shutil.copystat(src_file, dest_file)
+    return md5.hexdigest()
+
+
+def copy_missing_files(src_dir, dest_dir, include=None, stager=None):
+    '''Synchronizes the files of <src_dir> into <dest_dir>: new source files are
+    copied, and so are source files that changed since the last sync (size
+    and mtime differ from the recorded ones, and so does the md5 digest).
+    Files in <dest_dir> without a record of a previous sync are assumed to be
+    in sync. Only files whose relative paths satisfy <include> are synced.
+    Files are staged with <stager> (a FileStager), if given, and copied
+    otherwise. Returns a SyncReport.'''
     if not os.path.isdir(dest_dir):
         os.makedirs(dest_dir)
-    existing_dest_files = find_files(dest_dir)
-    files_not_to_copy = [ os.path.join(src_dir, os.path.relpath(fn, dest_dir))
-                          for fn in existing_dest_files ]
-
-    def file_filter(src_dir, files_in_src_dir, **kwargs):
-        files_not_to_overwrite = [ fn for fn in files_in_src_dir
-                                   if os.path.join(src_dir, fn) in files_not_to_copy ]
-        #if files_not_to_overwrite:
-        #    print "copy_missing_files: ignoring existing files in %s: %s" %(src_dir, files_not_to_overwrite,)
-            
-        if ignore:
-            other_ignored_files = ignore(src_dir, files_in_src_dir, **kwargs)
-            return other_ignored_files + files_not_to_overwrite
-        else:
-            return files_not_to_overwrite
+    existing_dest_files = set(entry.relpath for entry in getManifest(dest_dir, refresh=True))
+    oldstate = _readSyncState(dest_dir)
+    newstate = {}
+    report = SyncReport([], [], [], [])
 
-    all_files_in_source_dir = find_files(src_dir)
-
-    for src_file in all_files_in_source_dir:
-        dir_name = os.path.dirname(src_file)
-        base_name = os.path.basename(src_file)
-        files_to_ignore = file_filter(dir_name, [base_name])
-        if base_name in files_to_ignore:
+    for entry in getManifest(src_dir):
+        if include and not include(entry.relpath):
             continue
-        rel_dir_name = os.path.relpath(dir_name, src_dir)
-        dest_dir_name = os.path.join(dest_dir, rel_dir_name)
+        src_file = os.path.join(src_dir, entry.relpath)
+        dest_name = os.path.join(dest_dir, entry.relpath)
+
+        if entry.relpath in existing_dest_files:
+            record = oldstate.get(entry.relpath)
+            if record is None:
+                # copied before syncs were recorded (or by --prepareFrom)
+                newstate[entry.relpath] = [entry.size, entry.mtime, None]
+                report.unchanged.append(entry.relpath)
+                continue
+            size, mtime, digest = record
+            if size == entry.size and mtime == entry.mtime:
+                newstate[entry.relpath] = record
+                report.unchanged.append(entry.relpath)
+                continue
+            if digest is not None and size == entry.size and digest == _hashFile(src_file):
+                newstate[entry.relpath] = [entry.size, entry.mtime, digest]
+                report.unchanged.append(entry.relpath)
+                continue
+            report.changed.append(entry.relpath)
+        else:
+            report.new.append(entry.relpath)
+
+        dest_dir_name = os.path.dirname(dest_name)
         if not os.path.isdir(dest_dir_name):
             os.makedirs(dest_dir_name)
-        dest_name = os.path.join(dest_dir_name, base_name)
-        shutil.copy2(src_file,dest_name)
-        #print 'shutil.copy2("%s","%s")' %(src_file,dest_name,)
+        if os.path.exists(dest_name):
+            # do not write through hard links to other copies
+            os.remove(dest_name)
+        if stager and stager.stage(src_file, dest_name) != 'copy':
+            digest = None
+        else:
+            digest = _copyAndHashFile(src_file, dest_name)
+        newstate[entry.relpath] = [entry.size, entry.mtime, digest]
 
-def find_files(dir_name):
-    names = os.listdir(dir_name)
-    result = []
-    errors = []
-    for name in names:
-        src_name = os.path.join(dir_name, name)
-        src_test_name = src_name
-        try:
-            if os.path.islink(src_name):
-                src_test_name = os.readlink(src_name)
-            if os.path.isdir(src_test_name):
-                files_below = find_files(src_name)
-                result.extend(files_below)
-            else:
-                result.append(src_name)
-        except (IOError, os.error) as why:
-            errors.append((dir_name, src_name, str(why)))
-        # catch the Error from the recursive call so that we can
-        # continue with other files
-        except shutil.Error as err:
-            errors.extend(err.args[0])
-    if errors:
-        raise shutil.Error(errors)
-    return result
+    report.removed.extend(sorted(relpath for relpath in oldstate
+                                 if relpath not in newstate))
+
+    _writeSyncState(dest_dir, newstate)
+    invalidateManifest(dest_dir)
+    return report
 
 
 class DieWithExSoftwareIfThresholdReached(object):
     def __init__(self, maxErrors,):
         self.maxErrors = maxErrors
         self.errorsSeen = 0
+        self.lock = threading.Lock()
 
     def __call__(self, command, returnCode):
         print >> sys.stderr, "WARN Command %s failed with exitcode %d and was killed by an OS signal." \
             %(repr(command), returnCode,)
         print >> sys.stderr, "WARN Working directory was: %s" %(repr(os.getcwd()),)
-        self.errorsSeen += 1
-        if self.errorsSeen > self.maxErrors:
+        with self.lock:
+            self.errorsSeen += 1
+            errorsSeen = self.errorsSeen
+        if errorsSeen > self.maxErrors:
             print >> sys.stderr, "ERROR: Too many errors (%d). Aborting cppstats." \
                 %(self.errorsSeen,)
             sys.exit(os.EX_SOFTWARE)
@@ -259,6 +636,116 @@ class DieWithExSoftwareIfThresholdReached(object):
         return returnCode
 
 
+class SnapshotArchive(object):
+    '''This class is the zip archive of snapshots of one subfolder (see
+    --snapshots). It is opened on the first write and can be shared by
+    several threads. With <append>, the snapshots of earlier runs are kept,
+    except the ones of the files written again: the new snapshots are
+    written to a new archive, and the other members of the old archive are
+    copied to it on close.'''
+
+    def __init__(self, filename, append=False):
+        self.filename = filename
+        self.append = append
+        self.archive = None
+        self.names = set()  # the members written by this run
+        self.lock = threading.Lock()
+
+    def getNewFilename(self):
+        return self.filename + ".new" if self.append else self.filename
+
+    def write(self, name, content):
+        with self.lock:
+            if self.archive is None:
+                self.archive = zipfile.ZipFile(self.getNewFilename(), 'w',
+                                               zipfile.ZIP_DEFLATED, allowZip64=True)
+            self.archive.writestr(name, content)
+            self.names.add(name)
+
+    def close(self):
+        with self.lock:
+            if self.archive is None:
+                return
+            if self.append and os.path.isfile(self.filename):
+                self.copyOldMembers()
+            self.archive.close()
+            self.archive = None
+            if self.append:
+                os.rename(self.getNewFilename(), self.filename)
+
+    def copyOldMembers(self):
+        '''Copies the members of the old archive that were not written
+        again to the new archive (only the latest of duplicate members).'''
+        try:
+            with zipfile.ZipFile(self.filename, 'r', allowZip64=True) as old:
+                members = OrderedDict((info.filename, info) for info in old.infolist())
+                for (name, info) in members.iteritems():
+                    if name not in self.names:
+                        self.archive.writestr(info, old.read(info))
+        except zipfile.BadZipfile as e:
+            print >> sys.stderr, "WARN dropping the snapshots of earlier runs in %s (%s)." \
+                %(self.filename, e,)
+
+
+def _hashFileSha1(filename):
+    sha1 = hashlib.sha1()
+    with open(filename, 'rb') as source:
+        for chunk in iter(lambda: source.read(1 << 16), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+class Quarantine(object):
+    '''This class is the list of files whose preparation timed out. It is
+    stored as JSON in the file <filename>: for each kind of preparation, the
+    relative paths of the files together with the sha1 digest of their
+    content and the reason. A quarantined file is skipped until its
+    content changes. Without <filename>, the list is kept in memory only.
+    The list can be shared by several threads.'''
+
+    def __init__(self, filename, kind):
+        self.filename = filename
+        self.kind = kind
+        self.lock = threading.Lock()
+        self.entries = {}
+        if self.filename is None:
+            return
+        try:
+            with open(self.filename, 'r') as quarantinefile:
+                self.entries = json.load(quarantinefile)
+        except (IOError, ValueError):
+            self.entries = {}
+
+    def _save(self):
+        if self.filename is None:
+            return
+        with open(self.filename, 'w') as quarantinefile:
+            json.dump(self.entries, quarantinefile, indent=2, sort_keys=True)
+
+    def isQuarantined(self, relpath, sourcefile):
+        '''Checks whether <relpath> is quarantined and its content (i.e., the
+        content of <sourcefile>) did not change since then.'''
+        with self.lock:
+            entry = self.entries.get(self.kind, {}).get(relpath)
+            if entry is None:
+                return False
+            if os.path.isfile(sourcefile) and entry["sha1"] == _hashFileSha1(sourcefile):
+                return True
+            # changed file, try again
+            del self.entries[self.kind][relpath]
+            self._save()
+            return False
+
+    def add(self, relpath, sourcefile, reason):
+        with self.lock:
+            self.entries.setdefault(self.kind, {})[relpath] = {
+                "sha1": _hashFileSha1(sourcefile),
+                "reason": reason,
+                "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            self._save()
+
+
 # #################################################
 # abstract preparation thread
 
@@ -271,6 +758,11 @@ class AbstractPreparationThread(object):
         self.options = options
         self.notrunnable = False
         self.src2srcmlErrorHandler = dieWithExSoftware
+        self.changedFiles = set()
+        self.snapshots = []
+        self.formattingQueue = []
+        self.formattingLock = threading.Lock()
+        self.externalTools = ExternalTools()
 
         if (inputfolder):
             self.file = None
@@ -282,6 +774,13 @@ class AbstractPreparationThread(object):
             # get full path of subfolder "_cppstats"
             self.subfolder = os.path.join(self.folder, self.getSubfolder())
 
+            # keep archives of earlier runs when preparing lazily
+            self.snapshotArchive = SnapshotArchive(os.path.join(self.subfolder, _snapshotarchive),
+                                                   append=self.options.lazyPreparation)
+
+            self.quarantine = Quarantine(os.path.join(self.folder, _quarantinefile),
+                                         self.getPreparationName())
+
         elif (inputfile):
             self.file = inputfile
             self.outfile = self.options.outfile
@@ -292,23 +791,34 @@ class AbstractPreparationThread(object):
             # get full path of temp folder for
             import tempfile
             self.subfolder = tempfile.mkdtemp(suffix=self.getSubfolder())
-
+            self.snapshotArchive = SnapshotArchive(os.path.join(self.subfolder, _snapshotarchive))
+            # do not leave a quarantine list next to the source file
+            self.quarantine = Quarantine(None, self.getPreparationName())
 
         else:
             self.notrunnable = True
 
     def startup(self):
+        # allow as many external tools as files are prepared at the same
+        # time, unless limited even further
+        maxToolProcesses = self.options.maxToolProcesses or self.options.prepareJobs
+        self.externalTools.setMaxProcesses(maxToolProcesses)
+        self.externalTools.setTimeout(self.options.toolTimeout)
+
         # LOGGING
         notify("starting '" + self.getPreparationName() + "' preparations:\n " + self.project)
         print "# starting '" + self.getPreparationName() + "' preparations: " + self.project
 
     def teardown(self):
 
+        self.snapshotArchive.close()
+
         # delete temp folder for file-based preparation
         if (self.file):
             shutil.rmtree(self.subfolder)
 
         # LOGGING
+        print "# external tools: " + self.externalTools.getStatistics()
         notify("finished '" + self.getPreparationName() + "' preparations:\n " + self.project)
         print "# finished '" + self.getPreparationName() + "' preparations: " + self.project
 
@@ -318,6 +828,10 @@ class AbstractPreparationThread(object):
             print "ERROR: No single file or input list of projects given!"
             return
 
+        with useExternalTools(self.externalTools):
+            self.prepare()
+
+    def prepare(self):
         self.startup()
 
         self.preparedFilesByRelName = self.findPreparedFiles()
@@ -335,8 +849,10 @@ class AbstractPreparationThread(object):
 
             if not self.canSkipPreparation():
                 shutil.copyfile(self.file, self.currentFile)
-                self.backupCounter = 0
-                self.prepareFile()
+                if not self.prepareCurrentFileWithinBudget():
+                    self.teardown()
+                    return
+                self.finishPreparation()
             else:
                 self.logLazySkip()
 
@@ -348,21 +864,73 @@ class AbstractPreparationThread(object):
             self.installSrc2srcmlErrorHandlerForFilesInSubfolder()
             
             # preparation for all files in the self.subfolder (only C and H files)
-            for dirname, subFolders, files in os.walk(self.subfolder):
-                non_source_files = filterForFiles(dirname, files)
-                for fn in files:
-                    if fn in non_source_files:
-                        #print >> sys.stderr, "Refusing to prepare of non-source file %s" %(fn,)
-                        continue
-                    self.currentFile = os.path.join(dirname, fn)
-                    if not self.canSkipPreparation():
-                        self.backupCounter = 0
-                        self.prepareFile()
-                    else:
-                        self.logLazySkip()
-                
+            files = findFilesToPrepare(self.subfolder)
+            self.progress = progress.Progress(self.getPreparationName() + " preparation", files, self.folder,
+                                              self.options.progressInterval)
+            with tracing.span(self.getPreparationName(), "preparation", project=self.project):
+                runInThreads(self.prepareFileInSubfolder, files, self.options.prepareJobs)
+                self.finishPreparation()
+            self.progress.finish()
+
+            # the preparation results are new files in the subfolder
+            invalidateManifest(self.subfolder)
+
         self.teardown()
 
+    def prepareFileInSubfolder(self, filename):
+        '''Prepares the file <filename> of the subfolder. As several files may
+        be prepared at the same time, this is done by a shallow copy of
+        this object, which holds the state of the current file.'''
+        worker = copy.copy(self)
+        worker.currentFile = filename
+        size = self.progress.getSize(filename)
+        if not worker.canSkipPreparation():
+            prepared = worker.prepareCurrentFileWithinBudget()
+            self.progress.advance(size, "prepared" if prepared else "quarantined")
+        else:
+            worker.logLazySkip()
+            self.progress.advance(size, "skipped")
+
+    def getSourceOfCurrentFile(self):
+        return self.getSourceOfFile(self.currentFile)
+
+    def getSourceOfFile(self, filename):
+        if self.file:
+            return self.file
+        return os.path.join(self.source, os.path.relpath(filename, self.subfolder))
+
+    def prepareCurrentFileWithinBudget(self):
+        '''Prepares the current file unless it is quarantined. If the
+        preparation times out (see --toolTimeout and --fileTimeout), the
+        file is quarantined and its (partial) result is removed. Returns
+        whether the file was prepared.'''
+        relName = os.path.relpath(self.currentFile, self.subfolder)
+        sourceFile = self.getSourceOfCurrentFile()
+        if self.quarantine.isQuarantined(relName, sourceFile):
+            print >> sys.stderr, "INFO skipping quarantined file %s (see %s)" \
+                %(relName, self.quarantine.filename,)
+            return False
+
+        if self.options.fileTimeout > 0:
+            self.externalTools.setFileDeadline(time.time() + self.options.fileTimeout)
+        try:
+            with tracing.span("file", "preparation", file=relName):
+                self.prepareCurrentFile()
+            return True
+        except PreparationTimeout as e:
+            print >> sys.stderr, "WARN preparation of %s timed out (%s), quarantining it." \
+                %(relName, e,)
+            self.quarantine.add(relName, sourceFile, str(e))
+            resFn = self.resultFilename(self.currentFile)
+            if resFn != self.currentFile:
+                silentlyRemoveFile(resFn)
+            # the temp files of the steps (tmp.xml would be analyzed otherwise)
+            for suffix in ("tmp.txt", "tmp.xml", "tmp_out.xml"):
+                silentlyRemoveFile(self.currentFile + suffix)
+            return False
+        finally:
+            self.externalTools.setFileDeadline(None)
+
     def installSrc2srcmlErrorHandlerForFilesInSubfolder(self,):
         PERCENT_ERRORS=0.5
 
@@ -378,20 +946,14 @@ class AbstractPreparationThread(object):
         self.src2srcmlErrorHandler = DieWithExSoftwareIfThresholdReached(threshold)
 
     def countFilesToPrepareInSubfolder(self,):
-        result = 0
-        for dirname, subFolders, files in os.walk(self.subfolder):
-            non_source_files = filterForFiles(dirname, files)
-            for fn in files:
-                if fn in non_source_files:
-                    continue
-                else:
-                    result += 1
-        return result
+        return len(findFilesToPrepare(self.subfolder))
 
 
     def canSkipPreparation(self):
         if not self.options.lazyPreparation:
             return False
+        if self.currentFile in self.changedFiles:
+            return False
         resFn = self.resultFilename(self.currentFile)
         return os.path.isfile(resFn) and (resFn != self.currentFile)
 
@@ -414,9 +976,9 @@ class AbstractPreparationThread(object):
             if (not os.path.isdir(sourceFolder)) or (not os.path.isdir(preparedFolder)):
                 continue
             
-            filenames = find_files(sourceFolder)
-            for fn in filenames:
-                relName = os.path.relpath(fn, sourceFolder)
+            for entry in getManifest(sourceFolder):
+                fn = os.path.join(sourceFolder, entry.relpath)
+                relName = entry.relpath
                 preparedName = os.path.join(preparedFolder, relName)
                 preparationResultName = \
                     os.path.join(preparedFolder, self.resultFilename(relName))
@@ -436,6 +998,7 @@ class AbstractPreparationThread(object):
         
         return res
 
+    @tracing.traced(category="preparation")
     def copyToSubfolder(self):
         # TODO debug
         # echo '### preparing sources ...'
@@ -443,17 +1006,30 @@ class AbstractPreparationThread(object):
 
         if self.options.lazyPreparation:
             if self.options.prepareFrom:
-                for fn in find_files(self.source):
-                    self.tryCopyPreparedFile(fn, os.path.relpath(fn, self.source))
-            copy_missing_files(self.source, self.subfolder,
-                               ignore=filterForFiles)
+                for entry in getManifest(self.source):
+                    self.tryCopyPreparedFile(os.path.join(self.source, entry.relpath), entry.relpath)
         else:
-            # delete folder if already existing (shutil.copytree will
-            # otherwise fail)
+            # delete folder if already existing, so that all files are
+            # copied and prepared again
             if os.path.isdir(self.subfolder):
                 shutil.rmtree(self.subfolder)
-            # copy all C and H files recursively to the subfolder
-            shutil.copytree(self.source, self.subfolder, ignore=filterForFiles)
+
+        # copy all new and changed C and H files recursively to the subfolder
+        report = copy_missing_files(self.source, self.subfolder,
+                                    include=isFileToPrepare,
+                                    stager=FileStager(self.options.staging))
+        print "# synced source files: %d new, %d changed, %d removed, %d unchanged" \
+            % (len(report.new), len(report.changed), len(report.removed), len(report.unchanged))
+
+        # changed files have outdated preparation results
+        self.changedFiles = set(os.path.join(self.subfolder, relpath) for relpath in report.changed)
+
+        # remove the copies and results of deleted source files
+        for relpath in report.removed:
+            silentlyRemoveFile(os.path.join(self.subfolder, relpath))
+            silentlyRemoveFile(self.resultFilename(os.path.join(self.subfolder, relpath)))
+        if report.removed:
+            invalidateManifest(self.subfolder)
 
     def tryCopyPreparedFile(self, fullName, relName):
         preparedFiles = self.preparedFilesByRelName.get(relName)
@@ -496,16 +1072,70 @@ class AbstractPreparationThread(object):
             #shutil.copy2(prepResultPath, destResultPath)
             link_or_copy_file(prepResultPath, destResultPath)
 
-    def backupCurrentFile(self):
+    def prepareCurrentFile(self):
+        '''Prepares self.currentFile and takes care of the snapshots taken
+        during the preparation steps: with --snapshots=failure, they are
+        written as .bakN files only if the preparation fails (i.e., raises
+        an error or leaves no result); with --snapshots=archive, they are
+        added to the snapshot archive of the subfolder.'''
+        self.backupCounter = 0
+        self.snapshots = []
+
+        failed = True
+        try:
+            self.prepareFile()
+            resFn = self.resultFilename(self.currentFile)
+            failed = not (os.path.isfile(resFn) and os.path.getsize(resFn) > 0)
+        finally:
+            if self.snapshots:
+                if self.options.snapshots == "archive":
+                    self.archiveSnapshots(failed)
+                elif failed:
+                    self.writeSnapshotFiles()
+                self.snapshots = []
+
+    def backupCurrentFile(self, stepname):
         '''# backup file'''
-        if (not self.options.nobak):
+        # every step starts with a backup, so check the time limit here
+        self.externalTools.checkFileDeadline("step '%s'" % (stepname,))
+
+        if (self.options.nobak):
+            return None
+
+        if self.options.snapshots == "files":
             bak = self.currentFile + ".bak" + str(self.backupCounter)
             shutil.copyfile(self.currentFile, bak)
             self.backupCounter += 1
             return bak
         else:
+            # keep the snapshot in memory until the file is prepared
+            with open(self.currentFile, 'rb') as current:
+                self.snapshots.append((stepname, current.read()))
+            self.backupCounter += 1
             return None
 
+    def writeSnapshotFiles(self):
+        for number, (stepname, content) in enumerate(self.snapshots):
+            bak = self.currentFile + ".bak" + str(number)
+            with open(bak, 'wb') as target:
+                target.write(content)
+        print >> sys.stderr, "WARN preparation of %s failed, wrote %d snapshots (.bakN files)." \
+            %(self.currentFile, len(self.snapshots),)
+
+    def archiveSnapshots(self, failed):
+        '''Adds all snapshots of self.currentFile as one (compressed) member
+        to the snapshot archive; each snapshot is preceded by a header line
+        naming the number and the following step.'''
+        relName = os.path.relpath(self.currentFile, self.subfolder)
+        parts = ["### cppstats snapshots of %s (%s)\n" % (relName, "failed" if failed else "prepared")]
+        for number, (stepname, content) in enumerate(self.snapshots):
+            parts.append("### snapshot %d: before step '%s'\n" % (number, stepname))
+            parts.append(content)
+            if content and not content.endswith('\n'):
+                parts.append('\n')
+
+        self.snapshotArchive.write(relName, ''.join(parts))
+
     @classmethod
     @abstractmethod
     def getPreparationName(cls):
@@ -529,10 +1159,11 @@ class AbstractPreparationThread(object):
         pass
 
     # TODO refactor such that file has not be opened several times! (__currentfile)
+    @tracing.traced(category="preparation")
     def rewriteMultilineMacros(self):
         tmp = self.currentFile + "tmp.txt"
 
-        self.backupCurrentFile()  # backup file
+        self.backupCurrentFile("rewriteMultilineMacros")  # backup file
 
         # turn multiline macros to oneliners
         shutil.move(self.currentFile, tmp)  # move for script
@@ -540,22 +1171,65 @@ class AbstractPreparationThread(object):
 
         os.remove(tmp)  # remove temp file
 
+    @tracing.traced(category="preparation")
     def formatCode(self):
-        tmp = self.currentFile + "tmp.txt"
-
-        self.backupCurrentFile()  # backup file
+        self.backupCurrentFile("formatCode")  # backup file
 
         # call astyle to format file in Java-style
-        shutil.move(self.currentFile, tmp)  # move for script
-        runBashCommand(["astyle", "--style=java"], stdin=open(tmp, 'r'), stdout=open(self.currentFile, 'w+'))
-
-        os.remove(tmp)  # remove temp file
-
+        formatFile(self.currentFile)
+
+    @tracing.traced(category="preparation")
+    def queueForFormatting(self):
+        '''Formats the current file as formatCode does, but together with
+        other files by a single astyle process: the file is queued and the
+        queue is formatted as soon as it holds --astyleBatch files (the
+        rest is formatted by finishPreparation).'''
+        self.backupCurrentFile("formatCode")  # backup file
+
+        with self.formattingLock:
+            self.formattingQueue.append(self.currentFile)
+            if len(self.formattingQueue) < self.options.astyleBatch:
+                return
+            batch = list(self.formattingQueue)
+            del self.formattingQueue[:]
+        self.formatBatch(batch)
+
+    def formatBatch(self, batch):
+        '''Formats the queued files <batch> with formatFiles. The batch does
+        not count against the --fileTimeout of the file that happened to
+        fill the queue, only --toolTimeout applies; files whose formatting
+        times out are quarantined.'''
+        deadline = self.externalTools.getFileDeadline()
+        self.externalTools.setFileDeadline(None)
+        try:
+            timedout = formatFiles(batch)
+        finally:
+            self.externalTools.setFileDeadline(deadline)
+
+        for (filename, reason) in timedout:
+            relName = os.path.relpath(filename, self.subfolder)
+            print >> sys.stderr, "WARN formatting of %s timed out (%s), quarantining it." \
+                %(relName, reason,)
+            self.quarantine.add(relName, self.getSourceOfFile(filename), reason)
+
+    @tracing.traced(category="preparation")
+    def finishPreparation(self):
+        '''Called after all files are prepared.'''
+        with self.formattingLock:
+            batch = list(self.formattingQueue)
+            del self.formattingQueue[:]
+        if batch:
+            self.formatBatch(batch)
+
+    @tracing.traced(category="preparation")
     def deleteComments(self):
         tmp = self.currentFile + "tmp.xml"
         tmp_out = self.currentFile + "tmp_out.xml"
 
-        self.backupCurrentFile()  # backup file
+        self.backupCurrentFile("deleteComments")  # backup file
+
+        if self.options.pipes and self.deleteCommentsWithPipes():
+            return
 
         # call src2srcml to transform code to xml
         src2srcml(self.currentFile, tmp, osErrorHandler=self.src2srcmlErrorHandler)
@@ -571,12 +1245,12 @@ class AbstractPreparationThread(object):
                                    "--maxparserdepth", "1024",
                                    getPreparationScript("deleteComments.xsl"),
                                    tmp],
-                                  stdout=open(tmp_out, 'w+'))
+                                  stdout=tmp_out)
         
         runBashCommand(["xsltproc",
                         getPreparationScript("deleteComments.xsl"),
                         tmp],
-                       stdout=open(tmp_out, 'w+'),
+                       stdout=tmp_out,
                        onFailure=retryOnFailure)
 
         # re-transform the xml to a normal source file
@@ -586,12 +1260,41 @@ class AbstractPreparationThread(object):
         silentlyRemoveFile(tmp)
         silentlyRemoveFile(tmp_out)
 
+    @tracing.traced(category="preparation")
+    def deleteCommentsWithPipes(self):
+        '''Deletes the comments as deleteComments does, but the tools are
+        connected by pipes (srcml | xsltproc | srcml), so that the srcML
+        representation is never written to disk. Returns False if the
+        pipeline fails; the current file is unchanged then.'''
+        tmp = self.currentFile + "tmp.txt"
+
+        try:
+            exitcodes = runPipeline([["srcml", self.currentFile, "--language=C"],
+                                     ["xsltproc", getPreparationScript("deleteComments.xsl"), "-"],
+                                     ["srcml", "--output-src"]],
+                                    stdout=tmp)
+        except OSError as e:
+            exitcodes = [str(e)]
+
+        # an empty result for a non-empty file is a failure, too
+        if any(exitcodes) or (os.path.getsize(tmp) == 0 and os.path.getsize(self.currentFile) > 0):
+            print >> sys.stderr, \
+                "INFO Pipeline for %s failed (exitcodes %s). Retrying with temporary files ..." \
+                %(repr(self.currentFile), exitcodes,)
+            silentlyRemoveFile(tmp)
+            return False
+
+        # move temp file to output file
+        shutil.move(tmp, self.currentFile)
+        return True
+
+    @tracing.traced(category="preparation")
     def deleteWhitespace(self):
         """Deletes leading, trailing and inter (# ... if) whitespaces,
         replaces multiple whitespace with a single space. Also deletes empty lines."""
         tmp = self.currentFile + "tmp.txt"
 
-        self.backupCurrentFile()  # backup file
+        self.backupCurrentFile("deleteWhitespace")  # backup file
 
         # replace patterns with replacements
         #replacements = {
@@ -634,17 +1337,20 @@ class AbstractPreparationThread(object):
         # move temp file to output file
         shutil.move(tmp, self.currentFile)
 
+    @tracing.traced(category="preparation")
     def rewriteIfdefsAndIfndefs(self):
         tmp = self.currentFile + "tmp.txt"
 
-        self.backupCurrentFile()  # backup file
+        self.backupCurrentFile("rewriteIfdefsAndIfndefs")  # backup file
 
         # rewrite #if(n)def ... to #if (!)defined(...)
-        d = rewriteIfdefs.rewriteFile(self.currentFile, open(tmp, 'w'))
+        with open(tmp, 'w') as out:
+            rewriteIfdefs.rewriteFile(self.currentFile, out)
 
         # move temp file to output file
         shutil.move(tmp, self.currentFile)
 
+    @tracing.traced(category="preparation")
     def removeIncludeGuards(self):
         # include guards only exist in H files, otherwise return
         _, extension = os.path.splitext(self.currentFile)
@@ -653,29 +1359,34 @@ class AbstractPreparationThread(object):
 
         tmp = self.currentFile + "tmp.txt"
 
-        self.backupCurrentFile()  # backup file
+        self.backupCurrentFile("removeIncludeGuards")  # backup file
 
         # delete include guards
-        deleteIncludeGuards.apply(self.currentFile, open(tmp, 'w'))
+        with open(tmp, 'w') as out:
+            deleteIncludeGuards.apply(self.currentFile, out)
 
         # move temp file to output file
         shutil.move(tmp, self.currentFile)
 
+    @tracing.traced(category="preparation")
     def removeOtherPreprocessor(self):
         tmp = self.currentFile + "tmp.txt"
 
-        self.backupCurrentFile()  # backup file
+        self.backupCurrentFile("removeOtherPreprocessor")  # backup file
 
         # delete other preprocessor statements than #ifdefs
+        # (cpplib builds its grammars when imported, so only import it when needed)
+        from lib import cpplib
         cpplib._filterAnnotatedIfdefs(self.currentFile, tmp)
 
         # move temp file to output file
-        shutil.copyfile(tmp, self.currentFile)
+        shutil.move(tmp, self.currentFile)
 
+    @tracing.traced(category="preparation")
     def deleteEmptyLines(self):
         tmp = self.currentFile + "tmp.txt"
 
-        self.backupCurrentFile()  # backup file
+        self.backupCurrentFile("deleteEmptyLines")  # backup file
 
         # remove empty lines
         stripEmptyLinesFromFile(self.currentFile, tmp)
@@ -683,6 +1394,7 @@ class AbstractPreparationThread(object):
         # move temp file to output file
         shutil.move(tmp, self.currentFile)
 
+    @tracing.traced(category="preparation")
     def transformFileToSrcml(self):
         source = self.currentFile
         dest = self.currentFile + ".xml"
@@ -805,10 +1517,14 @@ class PrettyPreparationThread(AbstractPreparationThread):
 
     def prepareFile(self):
         # multiline macros
+        # (this also replaces a file linked to its source file, see --staging)
         self.rewriteMultilineMacros()
 
         # format the code
-        self.formatCode()
+        if self.options.astyleBatch > 0:
+            self.queueForFormatting()
+        else:
+            self.formatCode()
 
         # # delete comments
         # self.deleteComments()
@@ -870,20 +1586,23 @@ def getFoldersFromInputListFile(inputlist):
     return folders
 
 
-def applyFolders(kind, inputlist, options):
+def applyFolder(kind, folder, options):
     kinds = getKinds()
 
+    # get proper preparation thread and call it
+    threadClass = kinds[kind]
+    thread = threadClass(options, inputfolder=folder)
+    thread.run()
+
+
+def applyFolders(kind, inputlist, options):
     # get the list of projects/folders to process
     folders = getFoldersFromInputListFile(inputlist)
 
     # for each folder:
     for folder in folders:
         # start preparations for this single folder
-
-        # get proper preparation thread and call it
-        threadClass = kinds[kind]
-        thread = threadClass(options, inputfolder=folder)
-        thread.run()
+        applyFolder(kind, folder, options)
 
 
 def applyAllPreparationKindsToFolders(inputlist, options):
@@ -902,6 +1621,12 @@ def main():
     # #################################################
     # main
 
+    with tracing.traceTo(options.trace):
+        run(options)
+
+
+def run(options):
+    '''Prepares the input given by the parsed <options>.'''
     if (options.inputfile):
         # split --file argument
         options.infile = os.path.normpath(os.path.abspath(options.inputfile[0]))  # IN
@@ -0,0 +1,298 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# cppstats is a suite of analyses for measuring C preprocessor-based
+# variability in software product lines.
+# Copyright (C) 2014-2015 University of Passau, Germany
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+
+'''
+A long-running cppstats process that serves requests over a Unix socket, so
+that the start-up costs (interpreter, imports, grammars) are paid only once.
+
+Each request is one line of JSON:
+    {"argv": ["--kind", "general", "--file", "in.c", "out.csv"], "cwd": "/some/dir"}
+where "argv" are the usual arguments of cppstats and relative paths are
+resolved against "cwd"; the project folders in the files given by --list
+and --prepareFrom have to be absolute. The response is one line of JSON:
+    {"status": "ok", "exitcode": 0, "output": "...", "results": [{"file": ..., "header": [...], "rows": [...]}]}
+with the output cppstats printed and the contents of all written result files
+(see api.readResultTable).
+Several requests can be sent over one connection, and several connections
+are handled at the same time.
+'''
+
+
+# #################################################
+# imports from the std-library
+
+import os
+import sys
+import json
+import socket
+import tempfile
+import threading
+import traceback
+from argparse import ArgumentParser, REMAINDER
+from SocketServer import ThreadingMixIn, UnixStreamServer, StreamRequestHandler
+from StringIO import StringIO
+
+# #################################################
+# imports from subfolders
+
+import cli, analysis, api
+import cppstats as cstats # import cppstats.py and avoid confusion with module
+
+from lib import tracing
+from lib.threadlocal import InheritedLocal
+from lib.manifest import clearManifests
+
+
+# #################################################
+# global constants
+
+__socket_default = os.path.join(tempfile.gettempdir(), "cppstats-%d.sock" % (os.getuid(),))
+
+
+# #################################################
+# output of concurrent requests
+
+class ThreadOutput(object):
+    '''This class replaces sys.stdout and sys.stderr while serving: the output
+    of a thread that handles a request, and of its worker threads, goes to
+    the buffer of the request, all other output goes to the original
+    stream.'''
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = InheritedLocal()
+        self.lock = threading.Lock()  # workers write to the same buffer
+
+    def setBuffer(self, buffer):
+        self.local.buffer = buffer
+
+    def write(self, data):
+        buffer = getattr(self.local, 'buffer', None)
+        if buffer is not None:
+            with self.lock:
+                buffer.write(data)
+        else:
+            self.stream.write(data)
+
+    def flush(self):
+        if getattr(self.local, 'buffer', None) is None:
+            self.stream.flush()
+
+    def isatty(self):
+        # the output of a request is sent to the client, not to a terminal
+        if getattr(self.local, 'buffer', None) is not None:
+            return False
+        return self.stream.isatty()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+# #################################################
+# handling of requests
+
+# the working directory is global for the process, so options are parsed
+# by one request at a time
+__cwdlock = threading.Lock()
+
+
+def _checkInputListFile(inputlist):
+    '''Raises ValueError if the list of project folders <inputlist> holds
+    relative folders, which would be resolved against the working directory
+    of the server instead of the one of the request.'''
+    with open(inputlist, 'r') as listfile:
+        for folder in listfile.read().splitlines():
+            if folder and not folder.startswith("#") and not os.path.isabs(folder):
+                raise ValueError("the project folder '%s' in %s is relative; "
+                                 "the server needs absolute folders" % (folder, inputlist))
+
+
+def _parseOptions(argv, cwd):
+    '''Parses the cppstats arguments <argv> and makes all given paths
+    absolute with respect to the folder <cwd>.'''
+    with __cwdlock:
+        oldcwd = os.getcwd()
+        os.chdir(cwd)
+        try:
+            options = cli.getOptions(cstats.getKinds(), step=cli.steps.ALL, argv=argv)
+            if options.inputfile:
+                options.inputfile = map(os.path.abspath, options.inputfile)
+            if options.inputlist:
+                options.inputlist = os.path.abspath(options.inputlist)
+            if options.prepareFrom:
+                options.prepareFrom = os.path.abspath(options.prepareFrom)
+            if options.sqlite:
+                options.sqlite = os.path.abspath(options.sqlite)
+            if options.ndjson:
+                options.ndjson = os.path.abspath(options.ndjson)
+            if options.trace:
+                options.trace = os.path.abspath(options.trace)
+        finally:
+            os.chdir(oldcwd)
+
+    if not options.inputfile:
+        _checkInputListFile(options.inputlist)
+    if options.prepareFrom:
+        _checkInputListFile(options.prepareFrom)
+    return options
+
+
+def _getResultFiles(options):
+    '''Returns the names of the result files written for <options>.'''
+    if options.inputfile:
+        return [options.outfile]
+
+    kinds = cstats.getKinds()
+    if options.allkinds:
+        analysiskinds = [kind[1] for kind in kinds.values()]
+    else:
+        analysiskinds = [kinds[options.kind][1]]
+
+    resultfiles = []
+    for folder in analysis.getFoldersFromInputListFile(options.inputlist):
+        for analysiskind in analysiskinds:
+            for resultsfile in analysis.getKinds()[analysiskind].getResultsFiles(options):
+                resultfiles.append(os.path.join(folder, resultsfile))
+    return resultfiles
+
+
+def handleRequest(request):
+    '''Runs cppstats for the given request (see module documentation) and
+    returns the response.'''
+    output = StringIO()
+    response = {"status": "ok", "exitcode": 0, "results": []}
+
+    sys.stdout.setBuffer(output)
+    sys.stderr.setBuffer(output)
+    try:
+        argv = request.get("argv")
+        if not isinstance(argv, list):
+            raise ValueError("the request has to give the cppstats arguments as list 'argv'")
+        options = _parseOptions([str(arg) for arg in argv], request.get("cwd", os.getcwd()))
+
+        # source files may have changed since the last request
+        clearManifests()
+
+        with tracing.traceTo(options.trace):
+            cstats.run(options)
+
+        for resultfile in _getResultFiles(options):
+            if os.path.isfile(resultfile):
+                table = api.readResultTable(resultfile)
+                response["results"].append({"file": resultfile, "header": table.header, "rows": table.rows})
+
+    except SystemExit as e:
+        # exit code of cppstats, e.g., for wrong arguments
+        if e.code:
+            response["status"] = "error"
+            response["exitcode"] = e.code if isinstance(e.code, int) else 1
+    except Exception as e:
+        traceback.print_exc()
+        response["status"] = "error"
+        response["exitcode"] = 1
+        response["error"] = str(e)
+    finally:
+        sys.stdout.setBuffer(None)
+        sys.stderr.setBuffer(None)
+
+    response["output"] = output.getvalue()
+    return response
+
+
+class RequestHandler(StreamRequestHandler):
+    def handle(self):
+        for line in iter(self.rfile.readline, ''):
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                response = {"status": "error", "exitcode": 1, "error": "invalid request: %s" % (e,)}
+            else:
+                response = handleRequest(request)
+            self.wfile.write(json.dumps(response) + "\n")
+            self.wfile.flush()
+
+
+class CppstatsServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(socketpath):
+    if os.path.exists(socketpath):
+        os.remove(socketpath)
+
+    server = CppstatsServer(socketpath, RequestHandler)
+    sys.stdout = ThreadOutput(sys.stdout)
+    sys.stderr = ThreadOutput(sys.stderr)
+
+    print "# cppstats server listening on " + socketpath
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(socketpath)
+        print "# cppstats server stopped"
+
+
+# #################################################
+# client
+
+def sendRequest(socketpath, argv, cwd=None):
+    '''Sends the cppstats arguments <argv> to the server listening on
+    <socketpath> and returns its response.'''
+    request = {"argv": argv, "cwd": cwd or os.getcwd()}
+
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.connect(socketpath)
+    try:
+        client.sendall(json.dumps(request) + "\n")
+        response = client.makefile('r').readline()
+    finally:
+        client.close()
+    return json.loads(response)
+
+
+# #################################################
+# main method
+
+def main():
+    parser = ArgumentParser(description="Serve cppstats requests over a Unix socket, "
+                                        "or send a request to a running server.")
+    parser.add_argument("--socket", dest="socket", default=__socket_default, metavar="PATH",
+                        help="the socket to listen on or to connect to [default: %(default)s]")
+    parser.add_argument("--call", dest="call", nargs=REMAINDER, metavar="ARG",
+                        help="send the cppstats arguments ARG... to the server, print the JSON response,\n"
+                             "and exit with the exit code of the request")
+    options = parser.parse_args()
+
+    if options.call is not None:
+        response = sendRequest(options.socket, options.call)
+        print json.dumps(response, indent=2)
+        sys.exit(response.get("exitcode", 1))
+    else:
+        serve(options.socket)
+
+
+if __name__ == '__main__':
+    main()
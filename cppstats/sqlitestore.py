@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+# cppstats is a suite of analyses for measuring C preprocessor-based
+# variability in software product lines.
+# Copyright (C) 2014-2015 University of Passau, Germany
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+
+'''
+Stores the results of the analyses in an SQLite database (option --sqlite),
+so that the results of many projects can be queried together, e.g.:
+
+    SELECT p.name, r.value FROM project_results r JOIN projects p ON p.id = r.project_id
+    WHERE r.analysis = 'general' AND r.metric = 'NOFC';
+
+The results are stored on three levels, mostly as (metric, value, text) rows,
+where <value> holds numbers and <text> everything else:
+  * project_results: one row per metric of a project
+  * project_values: one row per value of a metric of a project that is a
+    list of values (e.g., the tangling degrees of generalvalues), with the
+    position of the value in the list
+  * file_results: one row per metric of a file of a project
+  * feature_results: one row per metric of a feature (a configuration
+    constant, a combination of them, or a feature expression)
+The feature locations are stored in feature_locations, with one row per
+location and used configuration constant.
+
+The results of an analysis of a project replace the ones of the previous
+analysis of this project; each project is written in one transaction.
+'''
+
+
+# #################################################
+# imports from the std-library
+
+import os
+import sqlite3
+
+# #################################################
+# imports from subfolders
+
+from lib.resulttable import readResultTable
+
+
+# #################################################
+# database schema
+
+__schema = '''
+CREATE TABLE IF NOT EXISTS projects (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    folder TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS project_results (
+    project_id INTEGER NOT NULL REFERENCES projects(id),
+    analysis TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    value REAL,
+    text TEXT
+);
+CREATE TABLE IF NOT EXISTS project_values (
+    project_id INTEGER NOT NULL REFERENCES projects(id),
+    analysis TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    value REAL
+);
+CREATE TABLE IF NOT EXISTS file_results (
+    project_id INTEGER NOT NULL REFERENCES projects(id),
+    analysis TEXT NOT NULL,
+    file TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    value REAL,
+    text TEXT
+);
+CREATE TABLE IF NOT EXISTS feature_results (
+    project_id INTEGER NOT NULL REFERENCES projects(id),
+    analysis TEXT NOT NULL,
+    feature TEXT NOT NULL,
+    file TEXT,
+    metric TEXT NOT NULL,
+    value REAL,
+    text TEXT
+);
+CREATE TABLE IF NOT EXISTS feature_locations (
+    project_id INTEGER NOT NULL REFERENCES projects(id),
+    file TEXT NOT NULL,
+    line_start INTEGER,
+    line_end INTEGER,
+    type TEXT,
+    expression TEXT,
+    constant TEXT
+);
+CREATE INDEX IF NOT EXISTS project_results_project ON project_results (project_id, analysis);
+CREATE INDEX IF NOT EXISTS project_results_metric ON project_results (analysis, metric);
+CREATE INDEX IF NOT EXISTS project_values_project ON project_values (project_id, analysis);
+CREATE INDEX IF NOT EXISTS project_values_metric ON project_values (analysis, metric);
+CREATE INDEX IF NOT EXISTS file_results_project ON file_results (project_id, analysis);
+CREATE INDEX IF NOT EXISTS file_results_metric ON file_results (analysis, metric);
+CREATE INDEX IF NOT EXISTS feature_results_project ON feature_results (project_id, analysis);
+CREATE INDEX IF NOT EXISTS feature_results_feature ON feature_results (feature, analysis);
+CREATE INDEX IF NOT EXISTS feature_results_metric ON feature_results (analysis, metric);
+CREATE INDEX IF NOT EXISTS feature_locations_project ON feature_locations (project_id);
+CREATE INDEX IF NOT EXISTS feature_locations_constant ON feature_locations (constant);
+'''
+
+
+def connect(database):
+    '''Opens the database <database> and creates the tables, if needed.'''
+    connection = sqlite3.connect(database, timeout=60)
+    connection.text_factory = str
+    # readers do not block the writer (and vice versa)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.executescript(__schema)
+    return connection
+
+
+# #################################################
+# conversion of result files to rows
+
+def _cell(value):
+    '''Returns the columns (value, text) for the cell <value>.'''
+    if isinstance(value, (int, long, float)):
+        return (value, None)
+    return (None, value)
+
+
+class _Rows(object):
+    '''The rows for the tables of the database that are collected from
+    the result files of an analysis of one project.'''
+
+    def __init__(self):
+        self.project = []
+        self.values = []
+        self.file = []
+        self.feature = []
+        self.locations = []
+
+    def addProject(self, metric, value):
+        self.project.append((metric,) + _cell(value))
+
+    def addValues(self, metric, values):
+        '''Adds the list of numbers <values>, given as cell of numbers
+        separated by ';'.'''
+        for (position, value) in enumerate(str('' if values is None else values).split(';')):
+            if value:
+                self.values.append((metric, position, float(value)))
+
+    def addFile(self, file, metric, value):
+        self.file.append((file, metric) + _cell(value))
+
+    def addFeature(self, feature, file, metric, value):
+        self.feature.append((feature, file, metric) + _cell(value))
+
+    def addColumns(self, header, row, add):
+        '''Adds each cell of <row> (except the first one) by calling
+        add(<column name>, <cell>).'''
+        for (metric, value) in zip(header[1:], row[1:]):
+            add(metric, value)
+
+
+def _general(tables, rows):
+    table = tables.get("cppstats.csv")
+    if table is None:
+        return
+    for row in table.rows:
+        name = row[0]
+        if name == "FUNCTIONS":  # formulas for spreadsheets
+            continue
+        elif name == "ALL - MERGED":
+            rows.addColumns(table.header, row, rows.addProject)
+        else:
+            rows.addColumns(table.header, row, lambda metric, value: rows.addFile(name, metric, value))
+
+
+def _generalValues(tables, rows):
+    table = tables.get("metric_values.csv")
+    if table is not None:
+        for (name, values) in table.rows:
+            rows.addValues(name, values)
+
+    for (filename, metric) in (("merged_scattering_degrees.csv", "SD"), ("merged_tangling_degrees.csv", "TD")):
+        table = tables.get(filename)
+        if table is not None:
+            for (feature, value) in table.rows:
+                rows.addFeature(feature, None, metric, value)
+
+    table = tables.get("nesting_degrees_toplevel_branches.csv")
+    if table is not None:
+        for (file, signature, depth) in table.rows:
+            rows.addFeature(signature, file, "ND", depth)
+
+
+def _discipline(tables, rows):
+    table = tables.get("cppstats_discipline.csv")
+    if table is not None:
+        for row in table.rows:
+            rows.addColumns(table.header, row, rows.addProject)
+
+    table = tables.get("cppstats_discipline_files.csv")
+    if table is not None:
+        for row in table.rows:
+            file = row[0]
+            rows.addColumns(table.header, row, lambda metric, value: rows.addFile(file, metric, value))
+
+
+def _featureLocations(tables, rows):
+    table = tables.get("cppstats_featurelocations.csv")
+    if table is not None:
+        for (file, start, end, type, expression, constants) in table.rows:
+            for constant in str(constants or '').split(';'):
+                rows.locations.append((file, start, end, type, expression, constant or None))
+
+    table = tables.get("listoffeatures.csv")
+    if table is not None:
+        for (file, constants) in table.rows:
+            rows.addFile(file, "CONSTANTS", constants)
+
+
+def _derivative(filenames, rows):
+    # the file lists the used features, then the annotations as
+    # "<feature>,<feature>...;<feature expression>"
+    if "cppstats_derivative.csv" not in filenames:
+        return
+    with open(filenames["cppstats_derivative.csv"]) as fd:
+        for line in fd:
+            (features, separator, expression) = line.rstrip("\n").partition(';')
+            if not separator:
+                continue
+            for feature in features.split(','):
+                rows.addFeature(feature, None, "DERIVATIVE", expression)
+
+
+def _interaction(filenames, rows):
+    # the file lists the annotations and their pairwise interactions,
+    # then the counts as "<name>: <count>"
+    if "cppstats_interaction.csv" in filenames:
+        with open(filenames["cppstats_interaction.csv"]) as fd:
+            for line in fd:
+                (name, separator, count) = line.partition(':')
+                if separator and count.strip().isdigit() and not line.startswith('('):
+                    rows.addProject(name.strip(), int(count))
+
+    filename = filenames.get("cppstats_interaction_kway.csv")
+    if filename is not None:
+        table = readResultTable(filename)
+        for (k, support, annotation, features) in table.rows:
+            features = str(features)
+            rows.addFeature(features, None, "K", k)
+            rows.addFeature(features, None, "SUPPORT", support)
+            rows.addFeature(features, None, "ANNOTATION", annotation)
+
+
+# (collect rows from tables, or from file names for files that are no tables)
+__converters = {
+    'general': (_general, True),
+    'generalvalues': (_generalValues, True),
+    'discipline': (_discipline, True),
+    'featurelocations': (_featureLocations, True),
+    'derivative': (_derivative, False),
+    'interaction': (_interaction, False),
+}
+
+
+# #################################################
+# storing results
+
+def storeResults(database, analysis, project, folder, resultsfiles):
+    '''Stores the results of the analysis <analysis> of the project
+    <project> in the project folder <folder>, given by the list of written
+    result files <resultsfiles>, in the database <database>.'''
+    (converter, istable) = __converters[analysis]
+    filenames = dict((os.path.basename(filename), filename)
+                     for filename in resultsfiles if os.path.isfile(filename))
+    if istable:
+        source = dict((name, readResultTable(filename)) for (name, filename) in filenames.iteritems())
+    else:
+        source = filenames
+
+    rows = _Rows()
+    converter(source, rows)
+
+    connection = connect(database)
+    try:
+        with connection:  # one transaction
+            connection.execute("INSERT OR IGNORE INTO projects (name, folder) VALUES (?, ?)", (project, folder))
+            (projectid,) = connection.execute("SELECT id FROM projects WHERE folder = ?", (folder,)).fetchone()
+
+            # replace the results of a previous analysis
+            for table in ("project_results", "project_values", "file_results", "feature_results"):
+                connection.execute("DELETE FROM %s WHERE project_id = ? AND analysis = ?" % table,
+                                   (projectid, analysis))
+            if analysis == 'featurelocations':
+                connection.execute("DELETE FROM feature_locations WHERE project_id = ?", (projectid,))
+
+            connection.executemany(
+                "INSERT INTO project_results (project_id, analysis, metric, value, text) VALUES (?, ?, ?, ?, ?)",
+                ((projectid, analysis) + row for row in rows.project))
+            connection.executemany(
+                "INSERT INTO project_values (project_id, analysis, metric, position, value) VALUES (?, ?, ?, ?, ?)",
+                ((projectid, analysis) + row for row in rows.values))
+            connection.executemany(
+                "INSERT INTO file_results (project_id, analysis, file, metric, value, text) VALUES (?, ?, ?, ?, ?, ?)",
+                ((projectid, analysis) + row for row in rows.file))
+            connection.executemany(
+                "INSERT INTO feature_results (project_id, analysis, feature, file, metric, value, text) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                ((projectid, analysis) + row for row in rows.feature))
+            connection.executemany(
+                "INSERT INTO feature_locations (project_id, file, line_start, line_end, type, expression, constant) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                ((projectid,) + row for row in rows.locations))
+    finally:
+        connection.close()
+
+    return len(rows.project) + len(rows.values) + len(rows.file) + len(rows.feature) + len(rows.locations)
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+# cppstats is a suite of analyses for measuring C preprocessor-based
+# variability in software product lines.
+# Copyright (C) 2014-2015 University of Passau, Germany
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+'''
+Per-file accounting of the analyses: the CPU time, the memory growth, and
+the time of the stages (the spans of lib/tracing.py, e.g., parse or
+_getFeatures) of each analyzed file, optional budgets, and a report of the
+slowest and largest files at the end of the analysis of a project:
+
+    accounting = FileAccounting("general", folder, options)
+    for file in files:
+        with accounting.account(file, ctx.rollbackFile) as account:
+            ...  # analyze the file into local state
+        if account.skipped:
+            continue
+        ...  # merge the results of the file
+    accounting.report()
+
+The analysis of a file exceeding a budget (see --fileCpuBudget and
+--fileMemoryBudget) is aborted by FileBudgetExceeded, which account()
+catches; the changes of the file are undone by the given rollback function,
+and the file is skipped and recorded in cppstats_skipped.json in the project
+folder. So, the block must only analyze the file; its results are merged
+after the block, where no budget is checked. The budgets are checked at the
+end of each stage of a file; in the main thread, a CPU-time budget also
+interrupts a long stage by a timer signal, which is set only for the block.
+CPU time and memory are those of the whole process, so they are exact only
+if one analysis runs at a time.
+'''
+
+import os
+import sys
+import json
+import time
+import signal
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from lib import tracing
+
+
+##################################################
+# constants
+
+# skipped files of all analyses of a project
+_skippedfile = "cppstats_skipped.json"
+
+__skippedlock = threading.Lock()
+
+try:
+    _pagesize = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError):
+    _pagesize = 4096
+
+
+##################################################
+# measurements
+
+class FileBudgetExceeded(Exception):
+    pass
+
+
+def _getCpuTime():
+    (user, system) = os.times()[:2]
+    return user + system
+
+
+def _getMemory():
+    '''Returns the resident memory of the process in bytes (its peak, if
+    the current one is not available).'''
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * _pagesize
+    except (IOError, IndexError, ValueError):
+        pass
+    if resource is None:
+        return 0
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on Mac OS X
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+def _formatMemory(count):
+    return "%.1f MB" % (count / (1024.0 * 1024.0))
+
+
+class _NoAccount(object):
+    '''The account of a file if the accounting is disabled.'''
+    skipped = None
+
+
+_noaccount = _NoAccount()
+
+
+class _FileAccount(object):
+    '''The CPU time, memory growth, and time per stage of one file.'''
+
+    def __init__(self, file):
+        self.file = file
+        self.active = True
+        self.skipped = None  # the reason, if the file is skipped
+        self.stages = OrderedDict()  # {<stage>: <seconds>}
+        self.cpu = 0.0
+        self.memory = 0
+        self.startcpu = _getCpuTime()
+        self.startmemory = _getMemory()
+
+    def update(self):
+        self.cpu = _getCpuTime() - self.startcpu
+        self.memory = max(self.memory, _getMemory() - self.startmemory)
+
+
+##################################################
+# accounting of an analysis
+
+class FileAccounting(object):
+    '''This class accounts the files of the analysis <analysis> of the
+    folder <folder> (see module documentation); the budgets and the size
+    of the report are given by <options>. Files may be accounted by several
+    threads at the same time.'''
+
+    def __init__(self, analysis, folder, options):
+        self.analysis = analysis
+        self.folder = folder
+        self.cpubudget = options.fileCpuBudget
+        self.memorybudget = options.fileMemoryBudget * 1024 * 1024
+        self.reportsize = options.fileReport
+        self.enabled = bool(self.cpubudget or self.memorybudget or self.reportsize)
+
+        self.accounts = []
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    @contextmanager
+    def account(self, file, rollback=None):
+        '''Accounts the block as analysis of the file <file> and yields the
+        account of the file. If the file exceeds a budget, the rest of the
+        block is skipped, the function <rollback> is called to undo the
+        changes of the block, and the reason is set as 'skipped' of the
+        account.'''
+        if not self.enabled:
+            yield _noaccount
+            return
+
+        account = _FileAccount(file)
+        self.local.account = account
+        tracing.addRecorder(self)
+        previoushandler = self.__startTimer()
+        try:
+            yield account
+        except FileBudgetExceeded as e:
+            account.skipped = str(e)
+        finally:
+            account.active = False
+            self.__stopTimer(previoushandler)
+            tracing.removeRecorder(self)
+            self.local.account = None
+
+        if account.skipped and rollback is not None:
+            rollback()
+        account.update()
+        with self.lock:
+            self.accounts.append(account)
+        if account.skipped:
+            print >> sys.stderr, "WARN analysis of %s exceeded its budget (%s), skipping it." \
+                % (file, account.skipped)
+
+    def add(self, name, category, start, end, args, thread):
+        '''Adds the span that ended to the current file of the thread, if
+        any, and checks the budgets (see tracing.addRecorder).'''
+        account = getattr(self.local, 'account', None)
+        if account is None or not account.active:
+            return
+        account.stages[name] = account.stages.get(name, 0) + (end - start)
+        account.update()
+        if self.cpubudget and account.cpu > self.cpubudget:
+            raise FileBudgetExceeded("CPU time %.2f s > %g s" % (account.cpu, self.cpubudget))
+        if self.memorybudget and account.memory > self.memorybudget:
+            raise FileBudgetExceeded("memory growth %s > %s"
+                                     % (_formatMemory(account.memory), _formatMemory(self.memorybudget)))
+
+    def __startTimer(self):
+        '''Interrupts the current file after self.cpubudget CPU seconds;
+        only possible in the main thread. Returns the previous signal
+        handler, or None if no timer is set.'''
+        if not self.cpubudget or not hasattr(signal, "setitimer") \
+                or not isinstance(threading.current_thread(), threading._MainThread):
+            return None
+
+        def interrupt(signum, frame):
+            account = getattr(self.local, 'account', None)
+            if account is not None and account.active:
+                raise FileBudgetExceeded("CPU time > %g s" % (self.cpubudget,))
+
+        previoushandler = signal.signal(signal.SIGPROF, interrupt)
+        signal.setitimer(signal.ITIMER_PROF, self.cpubudget)
+        return previoushandler or signal.SIG_DFL
+
+    def __stopTimer(self, previoushandler):
+        if previoushandler is None:
+            return
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, previoushandler)
+
+    def __formatAccount(self, account):
+        stages = sorted(account.stages.iteritems(), key=lambda (stage, seconds): seconds, reverse=True)
+        line = "%8.2f s %10s  %s" % (account.cpu, _formatMemory(account.memory),
+                                     os.path.relpath(account.file, self.folder))
+        if stages:
+            line += "  (" + ", ".join("%s %.2f s" % stage for stage in stages[:3]) + ")"
+        if account.skipped:
+            line += "  SKIPPED: " + account.skipped
+        return line
+
+    def report(self):
+        '''Records the skipped files and prints the slowest and the largest
+        files of the analysis.'''
+        skipped = [account for account in self.accounts if account.skipped]
+        if skipped:
+            _recordSkippedFiles(os.path.join(self.folder, os.pardir), self.analysis, skipped)
+
+        if not self.reportsize or not self.accounts:
+            return
+        print "# slowest files of '%s' analysis (CPU time, memory growth, longest stages):" % (self.analysis,)
+        for account in sorted(self.accounts, key=lambda account: account.cpu, reverse=True)[:self.reportsize]:
+            print "#   " + self.__formatAccount(account)
+        print "# largest files of '%s' analysis:" % (self.analysis,)
+        for account in sorted(self.accounts, key=lambda account: account.memory, reverse=True)[:self.reportsize]:
+            print "#   " + self.__formatAccount(account)
+        if skipped:
+            print "# %d files skipped, see %s" % (len(skipped), _skippedfile)
+
+
+def _recordSkippedFiles(projectfolder, analysis, accounts):
+    '''Adds the skipped files <accounts> of the analysis <analysis> to the
+    list of skipped files of the project: for each analysis, the paths of
+    the files relative to the project folder with the reason.'''
+    filename = os.path.join(projectfolder, _skippedfile)
+    with __skippedlock:
+        try:
+            with open(filename, 'r') as skippedfile:
+                entries = json.load(skippedfile)
+        except (IOError, ValueError):
+            entries = {}
+        for account in accounts:
+            entries.setdefault(analysis, {})[os.path.relpath(account.file, projectfolder)] = {
+                "reason": account.skipped,
+                "cpuSeconds": round(account.cpu, 3),
+                "memoryBytes": account.memory,
+                "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            }
+        with open(filename, 'w') as skippedfile:
+            json.dump(entries, skippedfile, indent=2, sort_keys=True, separators=(',', ': '))
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+# cppstats is a suite of analyses for measuring C preprocessor-based
+# variability in software product lines.
+# Copyright (C) 2010-2015 University of Passau, Germany
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+import functools
+import threading
+
+
+
+##################################################
+# state of a single analysis run
+
+class AnalysisContext(object):
+    '''This class holds the state that an analysis collects while it
+    walks over the files of a project folder. Each run of an analysis
+    gets its own context, so that several analyses can run in one process
+    at the same time (e.g., in threads).'''
+
+    def __init__(self):
+        self.macrofuncs = {}    # functional macros like: "GLIBVERSION(2,3,4)",
+                                # used as "GLIBVERSION(x,y,z) 100*x+10*y+z"
+        self.curfile = ''       # current processed xml-file
+        self.defset = set()     # macro-objects
+        self.defsetf = dict()   # macro-objects per file
+        self.undos = []         # changes of the current file (see startFile)
+
+    def startFile(self, curfile):
+        '''Starts the analysis of the file <curfile>. The changes of the
+        context from now on can be undone by rollbackFile, e.g., if the
+        file exceeds its budget (see lib/accounting.py).'''
+        self.curfile = curfile
+        self.undos = []
+
+    def rollbackFile(self):
+        '''Undoes the changes of the context since startFile.'''
+        for undo in reversed(self.undos):
+            undo()
+        self.undos = []
+        self.defsetf.pop(self.curfile, None)
+
+    def defineMacroFunction(self, name, definition):
+        '''Adds the functional macro <name> (see self.macrofuncs).'''
+        # (the undo is recorded first, so that it is complete even if the
+        # analysis of the file is interrupted in between)
+        if name in self.macrofuncs:
+            self.undos.append(functools.partial(self.macrofuncs.__setitem__, name, self.macrofuncs[name]))
+        else:
+            self.undos.append(functools.partial(self.macrofuncs.pop, name, None))
+        self.macrofuncs[name] = definition
+
+    def collectDefines(self, d):
+        """This functions adds all defines to a set.
+        e.g. #define FEAT_WIN
+        also #define FEAT_WIN 12
+        but not #define GLIBCVER(x,y,z) ...
+        It is used as parse action for identifiers.
+        """
+        if d[0] not in self.defset:
+            self.undos.append(functools.partial(self.defset.discard, d[0]))
+            self.defset.add(d[0])
+        if self.defsetf.has_key(self.curfile):
+            self.defsetf[self.curfile].add(d[0])
+        else:
+            self.defsetf[self.curfile] = set([d[0]])
+        return d
+
+    def identifier(self, grammar):
+        '''This function returns a copy of the identifier <grammar>
+        that collects the parsed identifiers in this context.'''
+        return grammar.copy().setParseAction(self.collectDefines)
+
+
+##################################################
+# parsing
+
+# pyparsing keeps one packrat cache for all grammars and clears it at the
+# start of each parse, so parses of different threads must not overlap
+__parselock = threading.RLock()
+
+def parseString(grammar, string):
+    '''This function parses <string> with <grammar> (see
+    pyparsing.ParserElement.parseString); one parse at a time.'''
+    with __parselock:
+        return grammar.parseString(string)
@@ -27,7 +27,9 @@ import sys
 # pyparsing module
 import pyparsing as pypa
 pypa.ParserElement.enablePackrat()        # speed up parsing
-sys.setrecursionlimit(2000)               # handle larger expressions
+# handle larger expressions (without lowering the limit of the analyses,
+# if they are imported before)
+sys.setrecursionlimit(max(sys.getrecursionlimit(), 2000))
 
 # possible operands:
 #   - hexadecimal number
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+# cppstats is a suite of analyses for measuring C preprocessor-based
+# variability in software product lines.
+# Copyright (C) 2010-2015 University of Passau, Germany
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+import os
+import stat
+import threading
+from collections import deque, namedtuple
+
+# os.scandir is available from Python 3.5 on; for Python 2.7, the backport
+# from PyPI (package "scandir") is used if it is installed. Otherwise, we
+# fall back to os.listdir and a stat call per entry.
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+
+##################################################
+# manifest of a folder
+
+# an entry of a manifest; <relpath> is relative to the scanned folder
+ManifestEntry = namedtuple('ManifestEntry', ['relpath', 'size', 'mtime'])
+
+
+def _scanFolderWithScandir(folder):
+    '''This function yields the tuple (name, isdir, islink, statresult) for
+    all entries of <folder>. <statresult> is None for directories.'''
+    for entry in scandir(folder):
+        try:
+            if entry.is_dir():
+                yield (entry.name, True, entry.is_symlink(), None)
+            elif entry.is_file():
+                yield (entry.name, False, False, entry.stat())
+        except OSError:
+            # dangling symlinks and files removed in the meantime
+            continue
+
+
+def _scanFolderWithListdir(folder):
+    '''The same as _scanFolderWithScandir, but based on os.listdir.'''
+    for name in os.listdir(folder):
+        path = os.path.join(folder, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        if stat.S_ISDIR(st.st_mode):
+            yield (name, True, os.path.islink(path), None)
+        elif stat.S_ISREG(st.st_mode):
+            yield (name, False, False, st)
+
+
+if scandir is not None:
+    _scanFolder = _scanFolderWithScandir
+else:
+    _scanFolder = _scanFolderWithListdir
+
+
+def scanManifest(folder):
+    '''This function returns the manifest of the folder <folder>, i.e., a list
+    of ManifestEntry for all regular files in <folder> and its subfolders.
+    The folders are traversed breadth-first and each folder is read only
+    once; symbolic links to folders are followed (but each linked folder
+    only once, to avoid cycles).'''
+    manifest = list()
+
+    if not os.path.isdir(folder):
+        return manifest
+
+    visitedlinks = set([os.path.realpath(folder)])
+    wqueue = deque([''])
+
+    while wqueue:
+        currentrel = wqueue.popleft()
+        currentfolder = os.path.join(folder, currentrel)
+        try:
+            foldercontent = list(_scanFolder(currentfolder))
+        except OSError:
+            continue
+
+        subfolders = list()
+        for (name, isdir, islink, st) in foldercontent:
+            relpath = os.path.join(currentrel, name)
+            if isdir:
+                if islink:
+                    realpath = os.path.realpath(os.path.join(folder, relpath))
+                    if realpath in visitedlinks:
+                        continue
+                    visitedlinks.add(realpath)
+                subfolders.append(relpath)
+            else:
+                manifest.append(ManifestEntry(relpath, st.st_size, st.st_mtime))
+        wqueue.extend(subfolders)
+
+    return manifest
+
+
+##################################################
+# cache of manifests for the current run
+
+__manifests = {}
+__manifestslock = threading.Lock()
+
+
+def getManifest(folder, refresh=False):
+    '''This function returns the manifest of the folder <folder> (see
+    scanManifest). The manifest is computed only once per folder and run;
+    use <refresh> or invalidateManifest to rescan a folder after it has
+    been changed.'''
+    key = os.path.abspath(folder)
+    with __manifestslock:
+        if not refresh and key in __manifests:
+            return __manifests[key]
+    manifest = scanManifest(key)
+    with __manifestslock:
+        __manifests[key] = manifest
+    return manifest
+
+
+def invalidateManifest(folder):
+    '''This function drops the cached manifests that contain the folder
+    <folder>, i.e., the manifests of <folder>, its subfolders, and its
+    parent folders.'''
+    key = os.path.abspath(folder)
+    with __manifestslock:
+        for cached in __manifests.keys():
+            if cached == key or cached.startswith(key + os.sep) \
+                    or key.startswith(cached.rstrip(os.sep) + os.sep):
+                del __manifests[cached]
+
+
+def clearManifests():
+    '''This function drops all cached manifests, e.g., before a new run in
+    the same process.'''
+    with __manifestslock:
+        __manifests.clear()
+
+
+def returnFileNames(folder, extfilt = ['.xml']):
+    '''This function returns all files of the input folder <folder>
+    and its subfolders.'''
+    folder = os.path.abspath(folder)
+    return [os.path.join(folder, entry.relpath) for entry in getManifest(folder)
+            if os.path.splitext(entry.relpath)[1] in extfilt]
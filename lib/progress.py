@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+# cppstats is a suite of analyses for measuring C preprocessor-based
+# variability in software product lines.
+# Copyright (C) 2014-2015 University of Passau, Germany
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+'''
+Progress reports of the stages of a run (the preparation or analysis of a
+project), at most one every few seconds (see --progressInterval):
+
+    progress = Progress("general", files, folder)
+    for file in progress.iterate(files):
+        ...
+        progress.count("errors")  # e.g., for a file that cannot be parsed
+
+On a terminal, the report is a single line that is updated in place:
+
+    [general apache/_cppstats] 1200/6000 files (20%), 85.3 files/s, 1.2 MB/s, ETA 0:00:56, errors=2
+
+Otherwise, each report is a line of key=value pairs for other programs:
+
+    PROGRESS stage=general folder=apache/_cppstats done=1200 total=6000 bytes=... totalBytes=...
+        elapsed=14.1 filesPerSecond=85.3 bytesPerSecond=1234567 eta=56.2 errors=2
+'''
+
+import os
+import sys
+import time
+import threading
+from collections import OrderedDict
+
+
+##################################################
+# settings
+
+# seconds between two reports, if not given by --progressInterval
+__ttyinterval = 0.5
+__plaininterval = 10.0
+
+
+def _getInterval(interval, tty):
+    if interval is not None:
+        return interval
+    return __ttyinterval if tty else __plaininterval
+
+
+def _isTerminal(out):
+    try:
+        return out.isatty()
+    except AttributeError:
+        return False
+
+
+def _formatBytes(count):
+    for unit in ("B", "kB", "MB"):
+        if count < 1000:
+            return "%.1f %s" % (count, unit)
+        count /= 1000.0
+    return "%.1f GB" % count
+
+
+def _formatDuration(seconds):
+    seconds = int(round(seconds))
+    return "%d:%02d:%02d" % (seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+
+##################################################
+# progress of a stage
+
+class Progress(object):
+    '''This class reports the progress of a stage that processes the given
+    <files> of the folder <folder>, e.g., the analysis of a project: files
+    and bytes per second, the estimated time to completion (by bytes), and
+    named counters of the stage. <interval> gives the seconds between two
+    reports (the option progressInterval of the run): None chooses them
+    depending on the output, 0 turns the reports off. Files may be
+    finished by several threads.'''
+
+    def __init__(self, stage, files, folder=None, interval=None):
+        self.stage = stage
+        self.folder = os.path.relpath(folder) if folder else None
+        self.total = len(files)
+        self.done = 0
+        self.bytes = 0
+        self.counters = OrderedDict()
+        self.lock = threading.Lock()
+        self.start = time.time()
+        self.lastreport = self.start
+
+        self.interval = _getInterval(interval, _isTerminal(sys.stdout))
+        self.enabled = self.interval > 0
+        self.totalbytes = sum(self.getSize(file) for file in files)
+
+    def getSize(self, file):
+        '''Returns the size of the file <file>; as it is only needed for the
+        reports, 0 if there are none.'''
+        if not self.enabled:
+            return 0
+        try:
+            return os.path.getsize(file)
+        except OSError:
+            return 0
+
+    def count(self, counter, number=1):
+        '''Increases the counter <counter> of the stage, e.g., "errors".'''
+        with self.lock:
+            self.counters[counter] = self.counters.get(counter, 0) + number
+
+    def advance(self, size, counter=None):
+        '''Marks a file of <size> bytes as finished (and increases <counter>,
+        if given); reports the progress, if the last report is old enough
+        (and not the last file, which is reported by finish).'''
+        with self.lock:
+            self.done += 1
+            self.bytes += size
+            if counter:
+                self.counters[counter] = self.counters.get(counter, 0) + 1
+            now = time.time()
+            if not self.enabled or self.done == self.total or now - self.lastreport < self.interval:
+                return
+            self.lastreport = now
+            self.__report(now, False)
+
+    def iterate(self, files):
+        '''Returns the <files>, each one marked as finished as soon as the
+        next one is taken.'''
+        for file in files:
+            yield file
+            self.advance(self.getSize(file))
+
+    def finish(self):
+        '''Reports the final state of the stage, unless nothing was done.'''
+        with self.lock:
+            if self.enabled and self.done:
+                self.__report(time.time(), True)
+
+    def __report(self, now, final):
+        elapsed = max(now - self.start, 1e-6)
+        filespersecond = self.done / elapsed
+        bytespersecond = self.bytes / elapsed
+        eta = None
+        if self.totalbytes and self.bytes:
+            eta = (self.totalbytes - self.bytes) / bytespersecond
+        elif self.done:
+            eta = (self.total - self.done) / filespersecond
+
+        out = sys.stdout
+        if _isTerminal(out):
+            line = "[%s] %d/%d files (%d%%), %.1f files/s, %s/s" \
+                % (" ".join(filter(None, [self.stage, self.folder])), self.done, self.total,
+                   100 * self.done / max(self.total, 1), filespersecond, _formatBytes(bytespersecond))
+            if final:
+                line += ", done in " + _formatDuration(elapsed)
+            elif eta is not None:
+                line += ", ETA " + _formatDuration(eta)
+            line += "".join(", %s=%d" % item for item in self.counters.iteritems())
+            # overwrite the last report
+            out.write("\r\033[K" + line + ("\n" if final else ""))
+        else:
+            fields = [("stage", self.stage), ("folder", self.folder),
+                      ("done", self.done), ("total", self.total),
+                      ("bytes", self.bytes), ("totalBytes", self.totalbytes),
+                      ("elapsed", "%.1f" % elapsed),
+                      ("filesPerSecond", "%.1f" % filespersecond),
+                      ("bytesPerSecond", "%.0f" % bytespersecond),
+                      ("eta", "%.1f" % (0 if final else eta or 0)),
+                      ("final", int(final))] + self.counters.items()
+            # (write each line at once, as several threads may report)
+            out.write("PROGRESS " + " ".join("%s=%s" % (key, str(value).replace(" ", "_"))
+                                             for (key, value) in fields if value is not None) + "\n")
+        out.flush()
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+# cppstats is a suite of analyses for measuring C preprocessor-based
+# variability in software product lines.
+# Copyright (C) 2014-2015 University of Passau, Germany
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+import json
+import threading
+from collections import OrderedDict
+
+
+##################################################
+# streaming of results as JSON Lines
+
+# all streams of the process write through this lock, so that the records
+# of analyses running at the same time do not get mixed up in one file
+__writelock = threading.Lock()
+
+
+def _writeRecord(fd, record):
+    line = json.dumps(record, default=str) + "\n"
+    with __writelock:
+        fd.write(line)
+        fd.flush()
+
+
+class ResultStream(object):
+    '''This class streams the results of an analysis of one project to the
+    file <filename> in the JSON Lines format, i.e., one JSON object per
+    line. A record of type "file" is written as soon as a file is analyzed,
+    a record of type "project" when the analysis of the project is done:
+        {"type": "file", "analysis": ..., "project": ..., "file": ..., "results": {...}}
+        {"type": "project", "analysis": ..., "project": ..., "results": {...}}
+    The records are appended to the file and flushed one by one, so the
+    file can be read while the run progresses and keeps the records written
+    before a crash.'''
+
+    def __init__(self, filename, analysis, project):
+        self.analysis = analysis
+        self.project = project
+        self.fd = open(filename, 'a')
+
+    def fileResult(self, file, results):
+        '''This method writes the results (dict) of the file <file>.'''
+        _writeRecord(self.fd, OrderedDict([("type", "file"), ("analysis", self.analysis),
+                ("project", self.project), ("file", file), ("results", results)]))
+
+    def projectResult(self, results):
+        '''This method writes the results (dict) of the whole project.'''
+        _writeRecord(self.fd, OrderedDict([("type", "project"), ("analysis", self.analysis),
+                ("project", self.project), ("results", results)]))
+
+    def close(self):
+        self.fd.close()
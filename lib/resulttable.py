@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+# cppstats is a suite of analyses for measuring C preprocessor-based
+# variability in software product lines.
+# Copyright (C) 2010-2015 University of Passau, Germany
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+
+import re
+import csv
+from collections import namedtuple
+from StringIO import StringIO
+
+
+##################################################
+# result files of the analyses
+
+# a result file: <header> is the list of column names (or None, if the file
+# has no header), <rows> are the lists of values (int, float, str, or None
+# for empty cells)
+ResultTable = namedtuple('ResultTable', ['filename', 'header', 'rows'])
+
+
+__separatorline = re.compile(r'^"?sep=(.)"?$')
+
+
+def _convertValue(value):
+    if value == '':
+        return None
+    for convert in (int, float):
+        try:
+            return convert(value)
+        except ValueError:
+            pass
+    return value
+
+
+def readResultTable(filename):
+    '''This function reads the result file <filename> written by an
+    analysis. The files start either with a line "sep=<delimiter>" and a
+    header, or they are separated by ',' or ';' with an optional header.'''
+    with open(filename, 'rb') as resultsfile:
+        data = resultsfile.read()
+
+    lines = data.splitlines(True)
+    match = __separatorline.match(lines[0].strip()) if lines else None
+    if match:
+        data = ''.join(lines[1:])
+        rows = list(csv.reader(StringIO(data), delimiter=match.group(1)))
+        hasheader = True
+    else:
+        sample = data[:4096]
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;')
+            hasheader = csv.Sniffer().has_header(sample)
+        except csv.Error:
+            dialect = csv.excel
+            hasheader = False
+        rows = list(csv.reader(StringIO(data), dialect))
+
+    header = rows.pop(0) if (hasheader and rows) else None
+    rows = [map(_convertValue, row) for row in rows]
+    return ResultTable(filename, header, rows)
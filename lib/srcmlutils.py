@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+# cppstats is a suite of analyses for measuring C preprocessor-based
+# variability in software product lines.
+# Copyright (C) 2010-2015 University of Passau, Germany
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+
+##################################################
+# constants:
+# namespace-constant for src2srcml
+cppnscpp = 'http://www.srcML.org/srcML/cpp'
+cppnsdef = 'http://www.srcML.org/srcML/src'
+
+# all preprocessor directives of conditional compilation
+conditionals = ('if', 'ifdef', 'ifndef', 'elif', 'else', 'endif')
+##################################################
+
+
+# cache of already decoded tags; srcML uses only a few hundred distinct tags,
+# so this cache stays small
+__tagcache = {}
+
+def decodeTag(tag):
+    '''This function splits the given tag (in Clark notation, i.e.,
+    "{namespace}name") into the tuple (namespace, name). The result is
+    cached, so that each distinct tag is decoded only once.'''
+    try:
+        return __tagcache[tag]
+    except KeyError:
+        pass
+
+    if isinstance(tag, basestring) and tag.startswith('{'):
+        ns, _, name = tag[1:].partition('}')
+    else:
+        # no namespace (or no element at all, e.g., xml comments)
+        ns, name = '', tag
+    __tagcache[tag] = (ns, name)
+    return (ns, name)
+
+
+# cache of qualified tag lists for iterConditionals
+__qualifiedcache = {}
+
+def iterConditionals(root, tags=conditionals, ns=cppnscpp):
+    '''This function returns an iterator over all elements below (and
+    including) root that are in namespace <ns> and have one of the given
+    tags; by default these are all cpp conditionals. The elements are
+    returned in document order. The filtering is done by libxml2 itself,
+    so the (large) rest of the tree is never turned into python objects.'''
+    key = (ns, tuple(tags))
+    qualified = __qualifiedcache.get(key)
+    if qualified is None:
+        qualified = ['{%s}%s' % (ns, tag) for tag in tags]
+        __qualifiedcache[key] = qualified
+    return root.iter(*qualified)
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# cppstats is a suite of analyses for measuring C preprocessor-based
+# variability in software product lines.
+# Copyright (C) 2014-2015 University of Passau, Germany
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+'''
+Thread-local state that is passed on to worker threads: a thread that
+starts a worker by startThread passes the attributes of all InheritedLocal
+objects on to the worker, e.g., the output buffer of a request of
+cppstats/server.py or the external tools of a preparation run:
+
+    _current = InheritedLocal()
+    _current.tools = tools
+    startThread(worker)  # the worker sees _current.tools
+'''
+
+import threading
+import weakref
+
+
+_locals = weakref.WeakSet()
+_localslock = threading.Lock()
+
+
+class InheritedLocal(threading.local):
+    '''A threading.local whose attributes are passed on to the threads
+    started by startThread.'''
+
+    def __init__(self):
+        # (called once per thread using this object)
+        with _localslock:
+            _locals.add(self)
+
+
+def startThread(target, *args):
+    '''Starts a daemon thread running <target>(*<args>) with the state of
+    all InheritedLocal objects of the current thread and returns it.'''
+    with _localslock:
+        inheritedlocals = list(_locals)
+    states = [(local, dict(local.__dict__)) for local in inheritedlocals]
+
+    def run():
+        for (local, state) in states:
+            local.__dict__.update(state)
+        target(*args)
+
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+    return thread
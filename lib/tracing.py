@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+# cppstats is a suite of analyses for measuring C preprocessor-based
+# variability in software product lines.
+# Copyright (C) 2014-2015 University of Passau, Germany
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+'''
+Timing spans of the stages of a run (preparation steps, external tools,
+files of an analysis, ...), written as Chrome trace events (see --trace),
+e.g., for chrome://tracing or https://ui.perfetto.dev:
+
+    with tracing.traceTo("trace.json"):
+        with tracing.span("parse", file=file):
+            ...
+
+Spans nest by time, and each thread gets a track of its own. A trace holds
+the spans of the thread that records it and of the worker threads this
+thread starts (see lib/threadlocal.py), so that runs at the same time (e.g.,
+requests of cppstats/server.py) are traced each on their own. Spans are only
+created while a trace is recorded; otherwise span() returns a shared object
+that does nothing, so the instrumentation costs next to nothing.
+'''
+
+import os
+import json
+import time
+import functools
+import threading
+from contextlib import contextmanager
+
+from lib.threadlocal import InheritedLocal
+
+
+##################################################
+# recordings
+
+# the recorders of the spans of all threads of the process (see addRecorder)
+_recorders = []
+
+# the traces recorded at the moment (see traceTo); the ones of the current
+# thread are kept in _traces.recorders
+_recordings = []
+_traces = InheritedLocal()
+
+
+def addRecorder(recorder):
+    '''Adds <recorder> to the running recordings: the method
+    add(name, category, start, end, args, thread) of <recorder> is called
+    at the end of each span of all threads (see _Recorder).'''
+    _recorders.append(recorder)
+
+
+def removeRecorder(recorder):
+    _recorders.remove(recorder)
+
+
+class _Recorder(object):
+    '''This class collects the trace events of one recording.'''
+
+    def __init__(self):
+        self.start = time.time()
+        self.lock = threading.Lock()
+        self.events = []
+        self.tracks = {}  # {<thread ident>: <track number>}
+
+    def add(self, name, category, start, end, args, thread):
+        event = {"name": name, "cat": category, "ph": "X",
+                 "ts": (start - self.start) * 1e6, "dur": (end - start) * 1e6,
+                 "pid": os.getpid()}
+        if args:
+            event["args"] = args
+        with self.lock:
+            track = self.tracks.get(thread.ident)
+            if track is None:
+                track = self.tracks[thread.ident] = len(self.tracks) + 1
+                self.events.append({"name": "thread_name", "ph": "M", "pid": event["pid"],
+                                    "tid": track, "args": {"name": thread.name}})
+            event["tid"] = track
+            self.events.append(event)
+
+    def write(self, filename):
+        with self.lock:
+            events = list(self.events)
+        with open(filename, 'w') as fd:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, fd, default=str)
+        return len(events)
+
+
+@contextmanager
+def traceTo(filename):
+    '''Records the spans of the current thread and of its worker threads
+    while the block runs and writes them to <filename>; does nothing if
+    <filename> is None.'''
+    if not filename:
+        yield
+        return
+
+    recorder = _Recorder()
+    previous = getattr(_traces, 'recorders', ())
+    _traces.recorders = previous + (recorder,)
+    _recordings.append(recorder)
+    try:
+        yield
+    finally:
+        _recordings.remove(recorder)
+        _traces.recorders = previous
+        count = recorder.write(filename)
+        print "# wrote " + str(count) + " trace events to " + filename
+
+
+def isTracing():
+    return bool(_recorders or _recordings)
+
+
+##################################################
+# spans
+
+class _Span(object):
+    __slots__ = ('name', 'category', 'args', 'start')
+
+    def __init__(self, name, category, args):
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exctype, value, traceback):
+        end = time.time()
+        if exctype is not None:
+            self.args["error"] = exctype.__name__
+        thread = threading.current_thread()
+        for recorder in list(_recorders) + list(getattr(_traces, 'recorders', ())):
+            recorder.add(self.name, self.category, self.start, end, self.args, thread)
+        return False
+
+
+class _NullSpan(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exctype, value, traceback):
+        return False
+
+_nullspan = _NullSpan()
+
+
+def span(name, category="cppstats", **args):
+    '''Returns a context manager that times its block as span <name>; the
+    keyword arguments are shown with the span.'''
+    if not (_recorders or _recordings):
+        return _nullspan
+    return _Span(name, category, args)
+
+
+def _iterSpans(items, name, category, key):
+    for item in items:
+        with _Span(name, category, {key: item}):
+            yield item
+
+
+def spans(items, name, category="cppstats", key="file"):
+    '''Returns the <items>, each one timed as span <name> from the moment it
+    is taken until the next one is taken, i.e., a span per iteration of a
+    loop over the items; the item is shown as argument <key>.'''
+    if not (_recorders or _recordings):
+        return items
+    return _iterSpans(items, name, category, key)
+
+
+def traced(name=None, category="cppstats"):
+    '''Decorator that times each call of a function as span <name> (the
+    name of the function by default).'''
+    def decorate(function):
+        spanname = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not (_recorders or _recordings):
+                return function(*args, **kwargs)
+            with _Span(spanname, category, {}):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
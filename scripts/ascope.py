@@ -39,33 +39,10 @@ except ImportError:
 	print("programm terminating ...!")
 	sys.exit(-1)
 
-
-def returnFileNames(folder, extfilt = ['.xml']):
-	'''This function returns all files of the input folder <folder>
-	and its subfolders.'''
-	filesfound = list()
-
-	if os.path.isdir(folder):
-		wqueue = [os.path.abspath(folder)]
-
-		while wqueue:
-			currentfolder = wqueue[0]
-			wqueue = wqueue[1:]
-			foldercontent = os.listdir(currentfolder)
-			tmpfiles = filter(lambda n: os.path.isfile(
-					os.path.join(currentfolder, n)), foldercontent)
-			tmpfiles = filter(lambda n: os.path.splitext(n)[1] in extfilt,
-					tmpfiles)
-			tmpfiles = map(lambda n: os.path.join(currentfolder, n),
-					tmpfiles)
-			filesfound += tmpfiles
-			tmpfolders = filter(lambda n: os.path.isdir(
-					os.path.join(currentfolder, n)), foldercontent)
-			tmpfolders = map(lambda n: os.path.join(currentfolder, n),
-					tmpfolders)
-			wqueue += tmpfolders
-
-	return filesfound
+# path adjustments, so that the lib folder of cppstats can be found
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from lib.manifest import returnFileNames
+from lib.srcmlutils import decodeTag, iterConditionals
 
 
 class Ascope:
@@ -73,7 +50,6 @@ class Ascope:
 	# constants:
 	__cppnscpp = 'http://www.srcML.org/srcML/cpp'
 	__cppnsdef = 'http://www.srcML.org/srcML/src'
-	__cpprens = re.compile('{(.+)}(.+)')
 	__conditionals = ['if', 'ifdef', 'ifndef', 'else', 'elif', 'endif']
 	__conditions   = ['if', 'ifdef', 'ifndef']
 	__screensize = 50
@@ -84,29 +60,32 @@ class Ascope:
 		oparser = OptionParser()
 		oparser.add_option('-d', '--dir', dest='dir',
 				help='input directory (mandatory)')
+		oparser.add_option('-s', '--screensize', dest='screensizes',
+				default=str(Ascope.__screensize),
+				help='comma-separated list of screen sizes (in lines) to compute '
+				'statistics for in one pass [default: %default]')
 		(self.opts, self.args) = oparser.parse_args()
 
 		if not self.opts.dir:
 			oparser.print_help()
 			sys.exit(-1)
 
+		try:
+			self.screensizes = [int(size) for size in self.opts.screensizes.split(',')]
+		except ValueError:
+			self.screensizes = []
+		if not self.screensizes or min(self.screensizes) < 2:
+			print('ERROR: screen sizes must be integers of at least 2!')
+			sys.exit(-1)
+
 		self.loc=0
 		self.checkFiles()
 
 	def __getIfdefAnnotations__(self, root):
 		'''This method returns all nodes of the xml which are ifdef
 		annotations in the source code.'''
-		treeifdefs = list()
-
-		for _, elem in etree.iterwalk(root):
-			ns, tag = Ascope.__cpprens.match(elem.tag).\
-					groups()
-
-			if ns == Ascope.__cppnscpp \
-					and tag in Ascope.__conditionals:
-				treeifdefs.append(elem)
-
-		return treeifdefs
+		return list(iterConditionals(root, Ascope.__conditionals,
+				Ascope.__cppnscpp))
 
 	def __createListFromTreeifdefs__(self, treeifdefs):
 	  '''This method returns a list representation for the input treeifdefs
@@ -117,7 +96,7 @@ class Ascope:
 		listifdefs = list()
 		workerlist = list()
 		for nifdef in treeifdefs:
-			tag = nifdef.tag.split('}')[1]
+			tag = decodeTag(nifdef.tag)[1]
 			if tag in ['if', 'ifdef', 'ifndef']:
 				workerlist.append(list())
 				workerlist[-1].append(nifdef)
@@ -136,10 +115,10 @@ class Ascope:
 
 	def __getParentTag__(self, tag):
 		parent = tag.getparent()
-		return parent.tag.split('}')[1]
+		return decodeTag(parent.tag)[1]
 
 
-	def __checkDiscipline__(self, treeifdefs, loc, stats, statsU):
+	def __checkDiscipline__(self, treeifdefs, loc, histograms):
 		listundisciplined = self.__createListFromTreeifdefs__(treeifdefs)
 		# print('INFO: %s annotations to check' % len(listundisciplined))
 
@@ -148,31 +127,23 @@ class Ascope:
 			for i in range(len(ifdef)-1):
 				allannotations.append([ifdef[i].sourceline,ifdef[i+1].sourceline,self.__findFeatures__(ifdef,i)]);
 
-		for screen in range(0, max(1,min(65000,loc-Ascope.__screensize/2)), Ascope.__screensize/2):
-			screenend=min(loc, screen+Ascope.__screensize)
-			annotationsOnScreen=set()
-			annotationsOnScreenCount=0
-			for annotation in allannotations:
-				  if annotation[0]<=screenend:
-				  	 if annotation[1]>screen:
-				  		annotationsOnScreen.add(annotation[2])
-				  		annotationsOnScreenCount=annotationsOnScreenCount+1
-			try:
-				stats[annotationsOnScreenCount]=stats[annotationsOnScreenCount]+1
-				statsU[len(annotationsOnScreen)]=statsU[len(annotationsOnScreen)]+1
-			except IndexError:
-				print(annotationsOnScreenCount)
-				sys.exit(-1)
+		for screensize in self.screensizes:
+			(stats, statsU) = histograms[screensize]
+			(counts, countsU) = _getScreenCounts(allannotations, loc, screensize)
+			for count in counts:
+				_addToHistogram(stats, count)
+			for count in countsU:
+				_addToHistogram(statsU, count)
 
 		# print(stats)
 		# print(statsU)
 
 	def __findFeatures__(self, ifdef, idx):
 		result=""
-		if ifdef[idx].tag.split('}')[1]=='else':
+		if decodeTag(ifdef[idx].tag)[1]=='else':
 			idx=0
 	                result="!"
-		if ifdef[idx].tag.split('}')[1]=='ifndef':
+		if decodeTag(ifdef[idx].tag)[1]=='ifndef':
 			if (result=="!"):
 		        	result=""
 			else:
@@ -181,46 +152,119 @@ class Ascope:
 		context = etree.iterwalk(ifdef[idx])
 		for action, elem in context:
 			if action=="end":
-				if elem.tag.split('}')[1]=="name":
+				if decodeTag(elem.tag)[1]=="name":
 					result=result+elem.text
 	        # print result;
 		return result
 
-	def checkFile(self, file, stats, statsU):
+	def checkFile(self, file, histograms):
 		# print('INFO: processing (%s)' % file)
 
 		try:
 			tree = etree.parse(file)
-
-			f = open(file, 'r')
 		except etree.XMLSyntaxError:
 			print('ERROR: file (%s) is not valid. Skipping it.' % file)
 			return
 
 		#get LOC
-		thisloc=len(f.readlines())-2
-		if (thisloc > 65000):
-			print('INFO: file (%s) not fully processed!' % file)
+		with open(file, 'r') as f:
+			thisloc=sum(1 for _ in f)-2
 
 		# get root of the xml and iterate over it
 		root = tree.getroot()
 		treeifdefs = self.__getIfdefAnnotations__(root)
-		self.__checkDiscipline__(treeifdefs, thisloc, stats, statsU)
+		self.__checkDiscipline__(treeifdefs, thisloc, histograms)
 
 
 	def checkFiles(self):
 		xmlfiles = returnFileNames(self.opts.dir, ['.xml'])
-		stats=[0]*Ascope.__depthannotation
-		statsU=[0]*Ascope.__depthannotation
+		# {screen size: (stats, statsU)}; the histograms grow as needed
+		histograms = dict((screensize, ([0]*Ascope.__depthannotation, [0]*Ascope.__depthannotation))
+				for screensize in self.screensizes)
 		for xmlfile in  xmlfiles:
-			self.checkFile(xmlfile, stats, statsU)
+			self.checkFile(xmlfile, histograms)
 		f = open("count.csv","a")
-		f.write(self.opts.dir+";"+str(Ascope.__screensize)+";")
-		for i in stats:
-		      f.write(str(i)+";")
-		for i in statsU:
-		      f.write(str(i)+";")
-		f.write("\n")
+		for screensize in self.screensizes:
+			(stats, statsU) = histograms[screensize]
+			# both histograms need the same length to keep the columns aligned
+			depth = max(len(stats), len(statsU))
+			stats += [0]*(depth-len(stats))
+			statsU += [0]*(depth-len(statsU))
+			f.write(self.opts.dir+";"+str(screensize)+";")
+			for i in stats:
+				f.write(str(i)+";")
+			for i in statsU:
+				f.write(str(i)+";")
+			f.write("\n")
+		f.close()
+
+
+def _getScreenCounts(annotations, loc, screensize):
+	'''This function slides a screen of <screensize> lines over a file with
+	<loc> lines in steps of half a screen and returns two lists with one
+	entry per screen: the number of annotations on the screen and the number
+	of distinct features on the screen. An annotation [start, end, feature]
+	is on the screen [first, last], if start <= last and end > first.
+	Instead of checking each annotation for each screen, the range of
+	screens of each annotation is computed directly and added to a
+	difference array; so the runtime is linear in the number of screens
+	and annotations.'''
+	step = screensize/2
+	numscreens = (max(1, loc-step) + step - 1)/step
+
+	def _getScreenRange(start, end):
+		'''returns the range [first, last) of screens showing the given lines'''
+		if start > loc:
+			return (0, 0)
+		# start <= first+screensize and end > first
+		first = max(0, -((screensize - start) // step))
+		last = min(numscreens, (end + step - 1) // step)
+		return (first, last)
+
+	def _getCounts(ranges):
+		diff = [0]*(numscreens+1)
+		for (first, last) in ranges:
+			if first < last:
+				diff[first] += 1
+				diff[last] -= 1
+		counts = []
+		current = 0
+		for delta in diff[:-1]:
+			current += delta
+			counts.append(current)
+		return counts
+
+	# all annotations
+	ranges = []
+	# ranges per feature; overlapping ranges of a feature are merged,
+	# so that each feature is counted once per screen
+	featureranges = dict()
+	for (start, end, feature) in annotations:
+		screens = _getScreenRange(start, end)
+		ranges.append(screens)
+		featureranges.setdefault(feature, []).append(screens)
+
+	unique = []
+	for screens in featureranges.itervalues():
+		screens.sort()
+		(first, last) = screens[0]
+		for (nfirst, nlast) in screens[1:]:
+			if nfirst <= last:
+				last = max(last, nlast)
+			else:
+				unique.append((first, last))
+				(first, last) = (nfirst, nlast)
+		unique.append((first, last))
+
+	return (_getCounts(ranges), _getCounts(unique))
+
+
+def _addToHistogram(histogram, value):
+	'''This function increments the entry <value> of the given histogram;
+	the histogram grows, if necessary.'''
+	if value >= len(histogram):
+		histogram.extend([0]*(value+1-len(histogram)))
+	histogram[value] += 1
 
 
 ##################################################
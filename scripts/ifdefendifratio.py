@@ -29,7 +29,7 @@
 
 
 # modules from the std-library
-import os, re, sys
+import os, sys
 
 try:
 	from lxml import etree
@@ -39,13 +39,16 @@ except ImportError:
 	print("programm terminating ...!")
 	sys.exit(-1)
 
+# path adjustments, so that the lib folder of cppstats can be found
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from lib.srcmlutils import decodeTag, iterConditionals
+
 
 ##################################################
 # constants:
 # namespace-constant for src2srcml
 __cppnscpp = 'http://www.srcML.org/srcML/cpp'
 __cppnsdef = 'http://www.srcML.org/srcML/src'
-__cpprens = re.compile('{(.+)}(.+)')
 
 __conditionals = ['if', 'ifdef', 'ifndef']
 __conditionals_endif = ['endif']
@@ -57,11 +60,12 @@ def _getIfdefEndifRatio(root):
 	ifdef = 0
 	endif = 0
 
-	# get all nodes
-	allnodes = [node for node in root.iterdescendants()]
+	# get only the conditional nodes
+	allnodes = iterConditionals(root, __conditionals + __conditionals_endif,
+			__cppnscpp)
 
 	for node in allnodes:
-		ns, tag = __cpprens.match(node.tag).groups()
+		ns, tag = decodeTag(node.tag)
 
 		if ((tag in __conditionals) \
 				and (ns == __cppnscpp)):
@@ -47,6 +47,10 @@ import tempfile
 from cpplib import _collectIfdefExpressions, _parseIfDefExpression
 from optparse import OptionParser
 
+# path adjustments, so that the lib folder of cppstats can be found
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from lib.manifest import returnFileNames
+
 ############################################################
 # config
 cpptool = '/usr/bin/cpp'
@@ -57,35 +61,7 @@ srcml2src = os.path.join(os.path.expanduser('~'), 'bin', 'srcml2src2009')
 ############################################################
 
 class Util:
-    @classmethod
-    def returnFileNames(folder, extfilt = ['.xml']):
-        '''
-        This function returns all files of the input folder <folder>
-        and its subfolders.
-        '''
-        filesfound = list()
-
-        if os.path.isdir(folder):
-            wqueue = [os.path.abspath(folder)]
-
-            while wqueue:
-                currentfolder = wqueue[0]
-                wqueue = wqueue[1:]
-                foldercontent = os.listdir(currentfolder)
-                tmpfiles = filter(lambda n: os.path.isfile(
-                        os.path.join(currentfolder, n)), foldercontent)
-                tmpfiles = filter(lambda n: os.path.splitext(n)[1] in extfilt,
-                        tmpfiles)
-                tmpfiles = map(lambda n: os.path.join(currentfolder, n),
-                        tmpfiles)
-                filesfound += tmpfiles
-                tmpfolders = filter(lambda n: os.path.isdir(
-                        os.path.join(currentfolder, n)), foldercontent)
-                tmpfolders = map(lambda n: os.path.join(currentfolder, n),
-                        tmpfolders)
-                wqueue += tmpfolders
-
-            return filesfound
+    returnFileNames = staticmethod(returnFileNames)
 
 
 class ReverseCPP:
@@ -46,6 +46,11 @@ setup(
         'lxml>=3.4'
     ],
 
+    extras_require={
+        # faster file discovery on Python 2.7 (os.scandir backport)
+        'scandir': ['scandir']
+    },
+
     dependency_links=[
         'https://github.com/clhunsen/python-statlib/archive/release-1.2.tar.gz#egg=statlib-1.2'
     ],
@@ -53,6 +58,7 @@ setup(
     entry_points={'console_scripts': [
         'cppstats = cppstats.cppstats:main',
         'cppstats.analysis = cppstats.analysis:main',
-        'cppstats.preparation = cppstats.preparation:main'
+        'cppstats.preparation = cppstats.preparation:main',
+        'cppstats.server = cppstats.server:main'
     ]}
 )